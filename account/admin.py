@@ -1,5 +1,6 @@
 from django.contrib import admin
-from account.models import EmailVerify
+from django.utils import timezone
+from account.models import EmailVerify, EmailOutbox
 from project1.admin import my_admin_site
 
 
@@ -10,3 +11,25 @@ class CommentAdmin(admin.ModelAdmin):
         "user",
         "token",
     )
+
+
+@admin.register(EmailOutbox, site=my_admin_site)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        "subject",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "created_date",
+        "sent_date",
+    )
+    list_filter = ("status",)
+    readonly_fields = ("last_error",)
+
+    @admin.action(description="Retry selected emails")
+    def retry(self, request, queryset):
+        queryset.exclude(status="s").update(
+            status="p", attempts=0, next_attempt_at=timezone.now()
+        )
+
+    actions = [retry]
@@ -1,13 +1,316 @@
+import html
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
 from django.core.mail import BadHeaderError, send_mail
 from django.http import HttpResponse
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
 from project1 import settings
-from django.template.loader import render_to_string
+from django.template.loader import get_template
+from django.utils.html import strip_tags
+from account.models import EmailOutbox
 
+logger = logging.getLogger(__name__)
 
-def send_mail_custom(subject, to, text_content, template, **kwargs):
-    text_content = "This is an important message."
-    msg_html = render_to_string(template, {"params": kwargs})
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = timedelta(minutes=1)
+OUTBOX_LEASE = timedelta(minutes=5)
+
+MAIL_POOL_SIZE = 4
+MAIL_IDLE_TIMEOUT = 60
+MAIL_HEALTH_CHECK_AFTER = 5
+MAIL_ACQUIRE_TIMEOUT = 30
+
+HIDDEN_BLOCKS_RE = re.compile(r"<(head|style|script)\b.*?</\1>", re.S | re.I)
+LINK_RE = re.compile(r"<a\s[^>]*href=\"([^\"]*)\"[^>]*>(.*?)</a>", re.S | re.I)
+BLOCK_END_RE = re.compile(r"<(br|/p|/div|/h\d|/li|/tr)\b[^>]*>", re.I)
+
+
+def html_to_text(msg_html):
+    text = HIDDEN_BLOCKS_RE.sub("", msg_html)
+    text = LINK_RE.sub(lambda m: "%s (%s)" % (m.group(2), m.group(1)), text)
+    text = BLOCK_END_RE.sub("\n", text)
+    text = html.unescape(strip_tags(text))
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def render_mail(template, **kwargs):
+    # The cached template loader keeps the compiled template between calls.
+    msg_html = get_template(template).render({"params": kwargs})
+    return msg_html, html_to_text(msg_html)
+
+
+class MailConnectionPool:
+    """Keeps opened mail connections of this process for reuse."""
+
+    def __init__(
+        self,
+        size,
+        idle_timeout,
+        health_check_after,
+        acquire_timeout=MAIL_ACQUIRE_TIMEOUT,
+    ):
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._reaper = None
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(
+                "No mail connection free after %s seconds" % self.acquire_timeout
+            )
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    mail_connection = get_connection()
+                    mail_connection.open()
+                    return mail_connection
+                mail_connection, last_used = item
+                idle = time.monotonic() - last_used
+                if idle > self.idle_timeout or (
+                    idle > self.health_check_after
+                    and not self.is_alive(mail_connection)
+                ):
+                    self.discard(mail_connection)
+                    continue
+                return mail_connection
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, mail_connection, broken=False):
+        if broken:
+            self.discard(mail_connection)
+        else:
+            with self._lock:
+                self._idle.append((mail_connection, time.monotonic()))
+                self._schedule_reap(self.idle_timeout)
+        self._slots.release()
+
+    def _schedule_reap(self, delay):
+        # Called with the lock held. A daemon timer closes the connections
+        # that stay idle, even if no one acquires from the pool again.
+        if self._reaper is None:
+            self._reaper = threading.Timer(delay, self.reap)
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            self._reaper = None
+            expired = [
+                mail_connection
+                for mail_connection, last_used in self._idle
+                if now - last_used >= self.idle_timeout
+            ]
+            self._idle = [
+                item for item in self._idle if now - item[1] < self.idle_timeout
+            ]
+            if self._idle:
+                oldest = min(last_used for _, last_used in self._idle)
+                self._schedule_reap(oldest + self.idle_timeout - now)
+        for mail_connection in expired:
+            self.discard(mail_connection)
+
+    @contextmanager
+    def connection(self):
+        mail_connection = self.acquire()
+        try:
+            yield mail_connection
+        except Exception:
+            self.release(mail_connection, broken=True)
+            raise
+        else:
+            self.release(mail_connection)
+
+    def is_alive(self, mail_connection):
+        smtp = getattr(mail_connection, "connection", None)
+        if smtp is None:
+            return True
+        try:
+            return smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def discard(self, mail_connection):
+        try:
+            mail_connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+        for mail_connection, _ in idle:
+            self.discard(mail_connection)
+
+
+mail_pool = MailConnectionPool(
+    MAIL_POOL_SIZE, MAIL_IDLE_TIMEOUT, MAIL_HEALTH_CHECK_AFTER
+)
+
+
+def send_many(messages, pool=None):
+    with (pool or mail_pool).connection() as mail_connection:
+        return mail_connection.send_messages(messages)
+
+
+def build_message(subject, to, text_content, msg_html):
     msg = EmailMultiAlternatives(subject, text_content, settings.DEFAULT_FROM_EMAIL, to)
     msg.attach_alternative(msg_html, "text/html")
-    msg.send()
+    return msg
+
+
+def send_mail_custom(subject, to, text_content, template, **kwargs):
+    msg_html, text = render_mail(template, **kwargs)
+    send_many([build_message(subject, to, text_content or text, msg_html)])
+
+
+def send_mass_mail_custom(subject, recipients, text_content, template, **kwargs):
+    # The content is shared, so it is rendered once for the whole batch and
+    # every recipient gets a message of their own.
+    msg_html, text = render_mail(template, **kwargs)
+    return send_many(
+        [
+            build_message(subject, [recipient], text_content or text, msg_html)
+            for recipient in recipients
+        ]
+    )
+
+
+def queue_mail_custom(subject, to, text_content, template, **kwargs):
+    msg_html, text = render_mail(template, **kwargs)
+    return EmailOutbox.objects.create(
+        subject=str(subject),
+        to=list(to),
+        text_content=text_content or text,
+        html_content=msg_html,
+    )
+
+
+def queue_mass_mail_custom(subject, recipients, text_content, template, **kwargs):
+    msg_html, text = render_mail(template, **kwargs)
+    return EmailOutbox.objects.bulk_create(
+        [
+            EmailOutbox(
+                subject=str(subject),
+                to=[recipient],
+                text_content=text_content or text,
+                html_content=msg_html,
+            )
+            for recipient in recipients
+        ]
+    )
+
+
+def claim_outbox(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        # Pushing next_attempt_at forward leases the rows to this dispatcher;
+        # a crashed dispatcher's rows become due again once the lease ends.
+        ids = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status="p", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        EmailOutbox.objects.filter(id__in=ids).update(
+            next_attempt_at=now + OUTBOX_LEASE
+        )
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by("id"))
+
+
+def record_failure(entry, error):
+    attempts = entry.attempts + 1
+    logger.warning("Email outbox %s attempt %d: %s", entry.pk, attempts, error)
+    EmailOutbox.objects.filter(pk=entry.pk).update(
+        attempts=attempts,
+        status="x" if attempts >= OUTBOX_MAX_ATTEMPTS else "p",
+        next_attempt_at=timezone.now() + OUTBOX_RETRY_DELAY * 2 ** (attempts - 1),
+        last_error=str(error),
+    )
+
+
+def deliver_outbox(entries):
+    sent = failed = 0
+    mail_connection = None
+    try:
+        for position, entry in enumerate(entries):
+            if mail_connection is None:
+                try:
+                    mail_connection = mail_pool.acquire()
+                except Exception as e:
+                    # Without a connection none of the claimed entries can go
+                    # out; they all back off instead of waiting for the lease.
+                    for pending in entries[position:]:
+                        record_failure(pending, e)
+                    return sent, failed + len(entries) - position
+            msg = EmailMultiAlternatives(
+                entry.subject,
+                entry.text_content,
+                settings.DEFAULT_FROM_EMAIL,
+                entry.to,
+                connection=mail_connection,
+            )
+            msg.attach_alternative(entry.html_content, "text/html")
+            try:
+                msg.send()
+            except Exception as e:
+                failed += 1
+                record_failure(entry, e)
+                # The server may have dropped us; continue on a fresh connection.
+                mail_pool.release(mail_connection, broken=True)
+                mail_connection = None
+            else:
+                sent += 1
+                EmailOutbox.objects.filter(pk=entry.pk).update(
+                    status="s",
+                    attempts=entry.attempts + 1,
+                    sent_date=timezone.now(),
+                    last_error="",
+                )
+    except Exception:
+        if mail_connection is not None:
+            mail_pool.release(mail_connection, broken=True)
+        raise
+    if mail_connection is not None:
+        mail_pool.release(mail_connection)
+    return sent, failed
+
+
+def deliver_outbox_in_thread(entries):
+    try:
+        return deliver_outbox(entries)
+    finally:
+        db_connection.close()
+
+
+def dispatch_outbox(workers=4, batch_size=100):
+    entries = claim_outbox(batch_size)
+    if not entries:
+        return 0, 0
+    workers = max(1, min(workers, len(entries)))
+    if workers == 1:
+        return deliver_outbox(entries)
+    # One SMTP connection per worker, reused for every message in its chunk.
+    chunks = [entries[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(deliver_outbox_in_thread, chunks))
+    return sum(r[0] for r in results), sum(r[1] for r in results)
@@ -0,0 +1,100 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from account.mail import MailConnectionPool, send_many
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Answers just enough SMTP to accept and drop messages."""
+
+    def handle(self):
+        time.sleep(self.server.handshake_delay)
+        self.reply("220 localhost sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 localhost")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.reply("250 OK")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b"\r\n")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Command(BaseCommand):
+    help = "Compare per-message and pooled SMTP sending against a local sink"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--handshake-ms",
+            type=float,
+            default=50,
+            help="Delay the sink adds to every new connection",
+        )
+
+    def handle(self, *args, **options):
+        server = SMTPSink(("127.0.0.1", 0), SMTPSinkHandler)
+        server.handshake_delay = options["handshake_ms"] / 1000
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        messages = [
+            EmailMultiAlternatives(
+                "Bench %d" % i, "Bench", "bench@localhost", ["user@localhost"]
+            )
+            for i in range(options["messages"])
+        ]
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        ):
+            tick = time.perf_counter()
+            for msg in messages:
+                msg.connection = get_connection()
+                msg.send()
+            self.report("per message", len(messages), time.perf_counter() - tick)
+
+            pool = MailConnectionPool(1, 60, 5)
+            tick = time.perf_counter()
+            for i in range(0, len(messages), options["batch_size"]):
+                batch = messages[i : i + options["batch_size"]]
+                for msg in batch:
+                    msg.connection = None
+                send_many(batch, pool=pool)
+            self.report("pooled", len(messages), time.perf_counter() - tick)
+            pool.close_all()
+
+        server.shutdown()
+        server.server_close()
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(
+            "%-12s %d messages in %.2f s (%.1f messages/s)"
+            % (label, count, elapsed, count / elapsed)
+        )
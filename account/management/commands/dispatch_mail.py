@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.mail import dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = "Send the pending emails of the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling the outbox"
+        )
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = dispatch_outbox(options["workers"], options["batch_size"])
+            if sent or failed:
+                self.stdout.write("Sent %d emails, %d failed" % (sent, failed))
+            if sent + failed >= options["batch_size"]:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
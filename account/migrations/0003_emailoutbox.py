@@ -0,0 +1,57 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0002_alter_emailverify_type"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("subject", models.CharField(max_length=255)),
+                ("to", models.JSONField(default=list)),
+                ("text_content", models.TextField(blank=True)),
+                ("html_content", models.TextField(blank=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("p", "Pending"), ("s", "Sent"), ("x", "Dead")],
+                        default="p",
+                        help_text="Delivery status of the email",
+                        max_length=1,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("sent_date", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "email_outbox",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"],
+                        name="email_outbox_status_next_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 
-from pitch.constant import TYPE_TOKEN
+from pitch.constant import TYPE_TOKEN, STATUS_OUTBOX
 
 
 # Create your models here.
@@ -21,3 +22,33 @@ class EmailVerify(models.Model):
 
     def get_url_verify_email(self):
         return
+
+
+class EmailOutbox(models.Model):
+    subject = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    text_content = models.TextField(blank=True)
+    html_content = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=1,
+        choices=STATUS_OUTBOX,
+        default="p",
+        help_text="Delivery status of the email",
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    sent_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "email_outbox"
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="email_outbox_status_next_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"EmailOutbox {self.pk} - {self.subject}"
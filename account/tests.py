@@ -1 +1,221 @@
+import time
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.template import engines
+from django.template.loaders.filesystem import Loader as FilesystemLoader
 from django.test import TestCase
+from django.utils import timezone
+
+from account.mail import (
+    OUTBOX_MAX_ATTEMPTS,
+    MailConnectionPool,
+    dispatch_outbox,
+    html_to_text,
+    queue_mail_custom,
+    queue_mass_mail_custom,
+    render_mail,
+    send_many,
+    send_mass_mail_custom,
+)
+from account.models import EmailOutbox
+
+
+class EmailOutboxTest(TestCase):
+    def queue(self):
+        return queue_mail_custom(
+            "Subject",
+            ["user@company.com"],
+            None,
+            "email/change_info.html",
+            link="http://localhost:8000",
+            username="user",
+        )
+
+    def test_queue_does_not_send(self):
+        entry = self.queue()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(entry.status, "p")
+        self.assertIn("http://localhost:8000", entry.html_content)
+
+    def test_dispatch_sends_pending(self):
+        entry = self.queue()
+        self.assertEqual(dispatch_outbox(workers=1), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["user@company.com"])
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "s")
+        self.assertIsNotNone(entry.sent_date)
+        self.assertEqual(dispatch_outbox(workers=1), (0, 0))
+
+    def test_dispatch_command(self):
+        self.queue()
+        self.queue()
+        call_command("dispatch_mail", workers=1, stdout=mock.MagicMock())
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_send_is_retried_later(self):
+        entry = self.queue()
+        with mock.patch(
+            "django.core.mail.EmailMultiAlternatives.send",
+            side_effect=OSError("Connection refused"),
+        ):
+            self.assertEqual(dispatch_outbox(workers=1), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "p")
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        self.assertEqual(entry.last_error, "Connection refused")
+
+    def test_failed_send_goes_dead(self):
+        entry = self.queue()
+        EmailOutbox.objects.filter(pk=entry.pk).update(attempts=OUTBOX_MAX_ATTEMPTS - 1)
+        with mock.patch(
+            "django.core.mail.EmailMultiAlternatives.send",
+            side_effect=OSError("Connection refused"),
+        ):
+            dispatch_outbox(workers=1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "x")
+
+    def test_connection_failure_is_an_attempt(self):
+        entries = [self.queue(), self.queue()]
+        with mock.patch(
+            "account.mail.mail_pool.acquire",
+            side_effect=OSError("Connection refused"),
+        ):
+            self.assertEqual(dispatch_outbox(workers=1), (0, 2))
+        for entry in entries:
+            entry.refresh_from_db()
+            self.assertEqual((entry.status, entry.attempts), ("p", 1))
+            self.assertEqual(entry.last_error, "Connection refused")
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_reconnect_failure_is_recorded(self):
+        entries = [self.queue(), self.queue()]
+        with mock.patch(
+            "django.core.mail.EmailMultiAlternatives.send",
+            side_effect=OSError("Connection lost"),
+        ), mock.patch(
+            "account.mail.mail_pool.acquire",
+            side_effect=[mock.MagicMock(), OSError("Connection refused")],
+        ), mock.patch(
+            "account.mail.mail_pool.release"
+        ):
+            self.assertEqual(dispatch_outbox(workers=1), (0, 2))
+        entries[1].refresh_from_db()
+        self.assertEqual(entries[1].attempts, 1)
+        self.assertEqual(entries[1].last_error, "Connection refused")
+
+
+class MailConnectionPoolTest(TestCase):
+    def test_connection_is_reused(self):
+        pool = MailConnectionPool(1, 60, 5)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+
+    def test_idle_connection_is_replaced(self):
+        pool = MailConnectionPool(1, 0, 0)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        self.assertIsNot(first, second)
+
+    def test_broken_connection_is_replaced(self):
+        pool = MailConnectionPool(1, 60, 5)
+        with self.assertRaises(OSError):
+            with pool.connection() as first:
+                raise OSError("Connection lost")
+        with pool.connection() as second:
+            pass
+        self.assertIsNot(first, second)
+
+    def test_acquire_times_out_when_the_pool_is_busy(self):
+        pool = MailConnectionPool(1, 60, 5, acquire_timeout=0.01)
+        with pool.connection():
+            with self.assertRaises(TimeoutError):
+                pool.acquire()
+        with pool.connection():
+            pass
+
+    def test_idle_connections_are_closed(self):
+        pool = MailConnectionPool(2, 60, 5)
+        with pool.connection() as first:
+            pass
+        self.addCleanup(pool.close_all)
+        with mock.patch.object(first, "close") as close, mock.patch(
+            "account.mail.time.monotonic", return_value=time.monotonic() + 61
+        ):
+            pool.reap()
+        close.assert_called_once_with()
+        self.assertEqual(pool._idle, [])
+        self.assertIsNone(pool._reaper)
+
+    def test_send_many(self):
+        messages = [
+            EmailMessage("Subject %d" % i, "Body", None, ["user@company.com"])
+            for i in range(3)
+        ]
+        self.assertEqual(send_many(messages, pool=MailConnectionPool(1, 60, 5)), 3)
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class RenderMailTest(TestCase):
+    def test_html_to_text(self):
+        text = html_to_text(
+            "<html><head><style>p { color: red; }</style></head>"
+            '<body><h1>Hello &amp; welcome</h1><p>Click <a href="http://x/1">'
+            "here</a></p></body></html>"
+        )
+        self.assertEqual(text, "Hello & welcome\nClick here (http://x/1)")
+
+    def test_render_mail(self):
+        msg_html, text = render_mail(
+            "email/change_info.html", link="http://x/1", username="user"
+        )
+        self.assertIn('href="http://x/1"', msg_html)
+        self.assertNotIn("<", text)
+        self.assertIn("http://x/1", text)
+
+    def test_template_is_compiled_once(self):
+        engines["django"].engine.template_loaders[0].reset()
+        with mock.patch(
+            "django.template.loaders.filesystem.Loader.get_contents",
+            autospec=True,
+            side_effect=FilesystemLoader.get_contents,
+        ) as get_contents:
+            render_mail("email/change_info.html", link="http://x/1", username="a")
+            read = get_contents.call_count
+            render_mail("email/change_info.html", link="http://x/2", username="b")
+        self.assertGreater(read, 0)
+        self.assertEqual(get_contents.call_count, read)
+
+    def test_send_mass_mail(self):
+        recipients = ["a@company.com", "b@company.com"]
+        send_mass_mail_custom(
+            "Subject",
+            recipients,
+            None,
+            "email/change_info.html",
+            link="http://x/1",
+            username="user",
+        )
+        self.assertEqual([msg.to for msg in mail.outbox], [[r] for r in recipients])
+        self.assertEqual(mail.outbox[0].alternatives, mail.outbox[1].alternatives)
+
+    def test_queue_mass_mail(self):
+        queue_mass_mail_custom(
+            "Subject",
+            ["a@company.com", "b@company.com"],
+            None,
+            "email/change_info.html",
+            link="http://x/1",
+            username="user",
+        )
+        self.assertEqual(EmailOutbox.objects.count(), 2)
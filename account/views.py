@@ -6,7 +6,7 @@ from django.contrib.auth.models import User
 from django.http import HttpResponse, HttpResponseRedirect
 import uuid
 from .models import EmailVerify
-from account.mail import send_mail_custom
+from account.mail import queue_mail_custom
 from project1.settings import HOST
 from django.utils.translation import gettext
 from django.views.decorators.csrf import csrf_protect
@@ -33,7 +33,7 @@ def sign_up(request):
                     user = User.objects.create_user(username, email, password)
                     user.is_active = False
                     user.save()
-                    send_mail_custom(
+                    queue_mail_custom(
                         gettext("Verify your email from Pitch App"),
                         [email],
                         None,
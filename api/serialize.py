@@ -87,6 +87,22 @@ class RevenueStatisticSerializer(ModelSerializer):
         fields = ["id", "title", "revenue", "size", "surface", "price", "count_order"]
 
 
+class PitchSerializer(ModelSerializer):
+    class Meta:
+        model = Pitch
+        fields = [
+            "id",
+            "title",
+            "address",
+            "description",
+            "size",
+            "surface",
+            "price",
+            "latitude",
+            "longitude",
+        ]
+
+
 class OrderRateStatisticSerializer(ModelSerializer):
     rate = DecimalField(
         max_digits=2,
@@ -1,9 +1,11 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from pitch.factory import OrderFactory, PitchFactory, UserFactory, CommentFactory
 from django.test import Client
 from django.urls import reverse
 from django.core import mail
-from account.models import EmailVerify
+from account.models import EmailVerify, EmailOutbox
 from rest_framework.test import APIClient
 from rest_framework import status
 from api.serialize import FavoritePitchSerializer
@@ -11,6 +13,7 @@ from django.contrib.sessions.models import Session
 from django.contrib.auth.models import User
 import datetime
 from django.utils import timezone
+from pitch import suggest
 from pitch.models import Favorite, Comment, Order
 
 
@@ -143,7 +146,7 @@ class ChangePasswordApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Password change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="1")
         response2 = self.client.put(
             reverse("verify-change-password", kwargs={"token": token[0].token}),
@@ -193,7 +196,7 @@ class ChangePasswordApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Password change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="1")
         response2 = self.client.put(
             reverse("verify-change-password", kwargs={"token": token[0].token}),
@@ -214,7 +217,7 @@ class ChangePasswordApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Password change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="1")
         response2 = self.client.put(
             reverse("verify-change-password", kwargs={"token": token[0].token}),
@@ -236,7 +239,7 @@ class ChangePasswordApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Password change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="1")
         response2 = self.client.put(
             reverse("verify-change-password", kwargs={"token": token[0].token}),
@@ -372,7 +375,7 @@ class ChangeInfoApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Info change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="2")
         response2 = self.client.put(
             reverse("verify-change-info", kwargs={"token": token[0].token}),
@@ -399,7 +402,7 @@ class ChangeInfoApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Info change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="2")
         response2 = self.client.put(
             reverse("verify-change-info", kwargs={"token": token[0].token}),
@@ -422,7 +425,7 @@ class ChangeInfoApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Info change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="2")
         response2 = self.client.put(
             reverse("verify-change-info", kwargs={"token": token[0].token}),
@@ -441,7 +444,7 @@ class ChangeInfoApiTest(TestCase):
         self.assertEqual(
             response.data["message"], "Info change link has been sent to your email"
         )
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         token = EmailVerify.objects.filter(user=self.user, type="2")
         response2 = self.client.put(
             reverse("verify-change-info", kwargs={"token": token[0].token}),
@@ -549,6 +552,24 @@ class RevenueStatisticApiTest(TestCase):
         self.assertEqual(len(response.data["data"]), 1)
         self.assertEqual(response.data["data"][0]["revenue"], 10)
 
+    def test_filter_order_by_status_and_day(self):
+        query = "order__status=c&order__time_start__date__lte=%s" % (
+            timezone.localdate() + datetime.timedelta(days=10)
+        )
+        self.client.login(username=self.admin.username, password="admin@123")
+        response = self.client.get(reverse("api-revenue-statistic"), QUERY_STRING=query)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["data"]), 2)
+        self.assertEqual(response.data["data"][0]["revenue"], 10)
+        self.assertEqual(response.data["data"][0]["count_order"], 10)
+
+        response = self.client.get(
+            reverse("api-revenue-statistic"), QUERY_STRING="order__status=o"
+        )
+        self.assertEqual(response.data["data"][0]["revenue"], None)
+        self.assertEqual(response.data["data"][0]["count_order"], 0)
+
 
 class OrderRateStatisticApiTest(TestCase):
     @classmethod
@@ -821,3 +842,277 @@ class ListCommentsPitchViewTestCase(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["message"], "There are no comments.")
+
+
+class PitchAvailabilityApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.pitch = PitchFactory()
+        cls.day = timezone.localdate() + datetime.timedelta(days=2)
+        start = timezone.make_aware(
+            datetime.datetime.combine(cls.day, datetime.time(18, 0))
+        )
+        cls.order = OrderFactory(
+            renter=cls.user,
+            pitch=cls.pitch,
+            time_start=start,
+            time_end=start + datetime.timedelta(minutes=90),
+        )
+
+    def test_booked_slots(self):
+        url = reverse("pitch-availability", args=[self.pitch.id])
+        response = self.client.get(
+            url, QUERY_STRING="from=%s&to=%s" % (self.day, self.day)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        days = response.data["data"]["days"]
+        self.assertEqual(len(days), 1)
+        self.assertEqual(days[0]["booked"][36:39], "111")
+        self.assertEqual(days[0]["booked"].count("1"), 3)
+
+    def test_default_range_is_one_week(self):
+        url = reverse("pitch-availability", args=[self.pitch.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["data"]["days"]), 7)
+        self.assertEqual(response.data["data"]["days"][2]["booked"].count("1"), 3)
+
+    def test_cancelled_order_frees_slots(self):
+        self.order.status = "d"
+        self.order.save()
+        url = reverse("pitch-availability", args=[self.pitch.id])
+        response = self.client.get(
+            url, QUERY_STRING="from=%s&to=%s" % (self.day, self.day)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["days"][0]["slots"], 0)
+
+    def test_invalid_range(self):
+        url = reverse("pitch-availability", args=[self.pitch.id])
+        response = self.client.get(
+            url,
+            QUERY_STRING="from=%s&to=%s"
+            % (self.day, self.day - datetime.timedelta(days=1)),
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for query in ("from=tomorrow", "to=next+week", "from=2024-02-30"):
+            response = self.client.get(url, QUERY_STRING=query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pitch_not_found(self):
+        url = reverse("pitch-availability", args=[self.pitch.id + 100])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SearchPitchesApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.pitches = [PitchFactory(size="1") for x in range(0, 3)]
+        cls.start = timezone.localtime() + datetime.timedelta(days=3)
+        OrderFactory(
+            renter=cls.user,
+            pitch=cls.pitches[0],
+            time_start=cls.start - datetime.timedelta(minutes=30),
+        )
+        OrderFactory(
+            renter=cls.user,
+            pitch=cls.pitches[1],
+            time_start=cls.start,
+            status="d",
+        )
+
+    def test_search_without_window(self):
+        response = self.client.get(reverse("api-search-pitches"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+
+    def test_search_excludes_booked_pitches(self):
+        response = self.client.get(
+            reverse("api-search-pitches"),
+            data={
+                "time_start": self.start.strftime("%Y-%m-%d %H:%M:%S"),
+                "time_end": (self.start + datetime.timedelta(hours=1)).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                ),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [pitch["id"] for pitch in response.data["results"]]
+        self.assertNotIn(self.pitches[0].id, ids)
+        self.assertIn(self.pitches[1].id, ids)
+        self.assertIn(self.pitches[2].id, ids)
+
+    def test_search_invalid_window(self):
+        response = self.client.get(
+            reverse("api-search-pitches"),
+            data={"time_start": self.start.strftime("%Y-%m-%d %H:%M:%S")},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RevenueSeriesApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=False, is_staff=False)
+        cls.admin = UserFactory(is_superuser=True, is_staff=True)
+        cls.pitch = PitchFactory(price=100)
+        cls.other_pitch = PitchFactory(price=100)
+        for pitch, day, hour in (
+            (cls.pitch, datetime.date(2024, 1, 10), 9),
+            (cls.pitch, datetime.date(2024, 2, 1), 0),
+            (cls.other_pitch, datetime.date(2024, 2, 14), 18),
+        ):
+            OrderFactory(
+                renter=cls.user,
+                pitch=pitch,
+                time_start=timezone.make_aware(
+                    datetime.datetime.combine(day, datetime.time(hour, 30))
+                ),
+            )
+
+    def get_series(self, query):
+        self.client.login(username=self.admin.username, password="admin@123")
+        return self.client.get(reverse("api-revenue-series"), QUERY_STRING=query)
+
+    def test_login_is_user(self):
+        self.client.login(username=self.user.username, password="admin@123")
+        response = self.client.get(reverse("api-revenue-series"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_month_buckets_use_local_time(self):
+        response = self.get_series("from=2024-01-05&to=2024-02-20&granularity=month")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        points = response.data["data"]["points"]
+        self.assertEqual(
+            [(p["start"], p["end"], p["revenue"]) for p in points],
+            [
+                (datetime.date(2024, 1, 5), datetime.date(2024, 1, 31), 100),
+                (datetime.date(2024, 2, 1), datetime.date(2024, 2, 20), 200),
+            ],
+        )
+        self.assertEqual(response.data["data"]["revenue"], 300)
+        self.assertEqual(response.data["data"]["count_order"], 3)
+
+    def test_week_buckets_for_one_pitch(self):
+        response = self.get_series(
+            "from=2024-01-01&to=2024-02-29&granularity=week&pitch=%d" % self.pitch.id
+        )
+        points = response.data["data"]["points"]
+        self.assertEqual(len(points), 9)
+        self.assertEqual(points[0]["start"], datetime.date(2024, 1, 1))
+        self.assertEqual(points[1]["revenue"], 100)
+        self.assertEqual(points[4]["start"], datetime.date(2024, 1, 29))
+        self.assertEqual(points[4]["revenue"], 100)
+        self.assertEqual(response.data["data"]["revenue"], 200)
+
+    def test_cancelled_orders_are_left_out(self):
+        OrderFactory(
+            renter=self.user,
+            pitch=self.pitch,
+            status="d",
+            time_start=timezone.make_aware(datetime.datetime(2024, 1, 20, 9, 30)),
+        )
+        response = self.get_series("from=2024-01-01&to=2024-02-29")
+        self.assertEqual(response.data["data"]["revenue"], 300)
+        response = self.get_series("from=2024-01-01&to=2024-02-29&status=d")
+        self.assertEqual(response.data["data"]["revenue"], 100)
+
+    def test_long_range_is_decimated(self):
+        response = self.get_series("from=2024-01-01&to=2024-12-31&max_points=12")
+        points = response.data["data"]["points"]
+        self.assertEqual(len(points), 12)
+        self.assertEqual(points[-1]["end"], datetime.date(2024, 12, 31))
+        self.assertEqual(sum(p["revenue"] for p in points), 300)
+
+    def test_invalid_params(self):
+        for query in (
+            "granularity=year",
+            "from=2024-02-01&to=2024-01-01",
+            "from=2000-01-01&to=2024-01-01",
+            "from=2024-13-01",
+            "to=yesterday",
+            "pitch=abc",
+        ):
+            response = self.get_series(query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SuggestPitchesApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.my_dinh = PitchFactory(title="Sân bóng Mỹ Đình", address="Nam Từ Liêm")
+        cls.cau_giay = PitchFactory(title="Sân Cầu Giấy", address="Nam Từ Liêm")
+
+    def setUp(self):
+        suggest.rebuild_suggest_index()
+        self.addCleanup(setattr, suggest, "_index", None)
+
+    def suggest(self, q):
+        response = self.client.get(reverse("api-suggest-pitches"), {"q": q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item["field"], item["label"]) for item in response.data["results"]]
+
+    def test_suggests_titles_and_addresses_by_prefix(self):
+        self.assertEqual(
+            self.suggest("san "),
+            [("title", "Sân bóng Mỹ Đình"), ("title", "Sân Cầu Giấy")],
+        )
+        self.assertEqual(self.suggest("MY DI"), [("title", "Sân bóng Mỹ Đình")])
+        # Both pitches share the address, which is suggested once.
+        self.assertEqual(self.suggest("tu l"), [("address", "Nam Từ Liêm")])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_lookups_skip_the_database(self):
+        self.suggest("s")
+        with self.assertNumQueries(0):
+            self.suggest("sa")
+
+    def test_follows_pitch_changes(self):
+        self.suggest("s")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cau_giay.title = "Sân Hoàng Mai"
+            self.cau_giay.save()
+            PitchFactory(title="Sân Long Biên", address="Long Biên")
+        self.assertEqual(
+            self.suggest("san"),
+            [
+                ("title", "Sân bóng Mỹ Đình"),
+                ("title", "Sân Hoàng Mai"),
+                ("title", "Sân Long Biên"),
+            ],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.my_dinh.delete()
+        self.assertEqual(self.suggest("my"), [])
+
+    def test_shared_label_is_stored_once(self):
+        index = suggest._index
+        self.assertEqual(
+            index.label_pitches["address", "Nam Từ Liêm"],
+            {self.my_dinh.pk, self.cau_giay.pk},
+        )
+        self.assertEqual(
+            len([entry for entry in index.entries if entry[2] == "Nam Từ Liêm"]), 3
+        )
+        index.remove(self.my_dinh.pk)
+        self.assertEqual(self.suggest("nam"), [("address", "Nam Từ Liêm")])
+
+    @override_settings(PITCH_SUGGEST_MAX_AGE=0)
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        self.addCleanup(setattr, suggest, "_rebuilding", False)
+        old = suggest._index
+        with mock.patch("pitch.suggest.threading.Thread") as thread:
+            with self.assertNumQueries(0):
+                self.assertIs(suggest.suggest_index(), old)
+                suggest.suggest_index()
+        thread.assert_called_once_with(
+            target=suggest.rebuild_in_background, daemon=True
+        )
+        thread.return_value.start.assert_called_once_with()
+
+        suggest._rebuilding, suggest._index = False, None
+        with mock.patch("pitch.suggest.threading.Thread"):
+            self.assertEqual(suggest.suggest_index().lookup("san"), [])
@@ -28,6 +28,11 @@ urlpatterns = [
         views.RevenueStatisticView.as_view(),
         name="api-revenue-statistic",
     ),
+    path(
+        "statistic/revenue/series",
+        views.RevenueSeriesView.as_view(),
+        name="api-revenue-series",
+    ),
     path(
         "statistic/order_rate/",
         views.OrderRateStatisticView.as_view(),
@@ -41,4 +46,11 @@ urlpatterns = [
         views.list_comments_pitch_view,
         name="list-pitch-comments",
     ),
+    path("pitches/search", views.search_pitches_view, name="api-search-pitches"),
+    path("pitches/suggest", views.suggest_pitches_view, name="api-suggest-pitches"),
+    path(
+        "pitches/<int:pitch_id>/availability",
+        views.pitch_availability_view,
+        name="pitch-availability",
+    ),
 ]
@@ -2,7 +2,7 @@ import uuid
 from django.http import BadHeaderError
 from rest_framework.response import Response
 from django.contrib.auth.models import User
-from account.mail import send_mail_custom
+from account.mail import queue_mail_custom
 from account.models import EmailVerify
 from pitch.models import Order, Pitch
 from project1.settings import HOST
@@ -14,6 +14,7 @@ from .serialize import (
     VerifyChangeInfoSerializer,
     CommentSerializer,
     NestedCommentSerializer,
+    PitchSerializer,
 )
 from django.contrib.auth import login
 from rest_framework import status, permissions
@@ -34,7 +35,37 @@ from rest_framework.decorators import api_view, authentication_classes
 from django.contrib.sessions.models import Session
 from django.db.models import Sum, Count
 from django.db.models import Q
+from django.db.models.functions import Coalesce
 from rest_framework.pagination import PageNumberPagination
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from pitch.availability import day_slots
+from pitch.constant import SLOT_MINUTES, SLOTS_PER_DAY
+from pitch.forms import SearchForm
+from pitch.revenue import decimate, revenue_series, rollup_filters
+from pitch.search import filter_pitches
+from pitch.suggest import suggest_index
+
+MAX_AVAILABILITY_DAYS = 62
+MAX_SERIES_DAYS = 3660
+MAX_SERIES_POINTS = 1000
+MAX_SUGGESTIONS = 10
+SERIES_GRANULARITIES = ("day", "week", "month")
+
+
+def date_param(params, name):
+    """The date in query parameter ``name``, or None when it is left out.
+
+    Raises ValueError for a value that is not a YYYY-MM-DD date.
+    """
+    value = params.get(name, "")
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError("%s is not a date" % value)
+    return day
 
 
 @api_view(["POST"])
@@ -127,15 +158,16 @@ def user_change_password(request):
         token = uuid.uuid4()
         link = HOST + reverse("verify-change-password", kwargs={"token": token})
         user = User.objects.get(username=username, email=email, is_active=True)
-        send_mail_custom(
-            _("Link to change password from Pitch App"),
-            [email],
-            None,
-            "email/change_password.html",
-            link=link,
-            username=username,
-        )
-        EmailVerify.objects.create(token=token, user=user, type="1")
+        with transaction.atomic():
+            queue_mail_custom(
+                _("Link to change password from Pitch App"),
+                [email],
+                None,
+                "email/change_password.html",
+                link=link,
+                username=username,
+            )
+            EmailVerify.objects.create(token=token, user=user, type="1")
     except User.DoesNotExist:
         return Response(
             {"message": _("Username or Email is incorrect")},
@@ -218,15 +250,16 @@ class ChangeInfoView(APIView):
         try:
             token = uuid.uuid4()
             link = HOST + reverse("verify-change-info", kwargs={"token": token})
-            send_mail_custom(
-                _("Link to change info from Pitch App"),
-                [user.email],
-                None,
-                "email/change_info.html",
-                link=link,
-                username=user.username,
-            )
-            EmailVerify.objects.create(token=token, user=user, type="2")
+            with transaction.atomic():
+                queue_mail_custom(
+                    _("Link to change info from Pitch App"),
+                    [user.email],
+                    None,
+                    "email/change_info.html",
+                    link=link,
+                    username=user.username,
+                )
+                EmailVerify.objects.create(token=token, user=user, type="2")
 
         except BadHeaderError:
             return Response(
@@ -297,15 +330,16 @@ class ChangeInfoView(APIView):
         try:
             token = uuid.uuid4()
             link = HOST + reverse("verify-change-info", kwargs={"token": token})
-            send_mail_custom(
-                _("Link to change info from Pitch App"),
-                [user.email],
-                None,
-                "email/change_info.html",
-                link=link,
-                username=user.username,
-            )
-            EmailVerify.objects.create(token=token, user=user, type="2")
+            with transaction.atomic():
+                queue_mail_custom(
+                    _("Link to change info from Pitch App"),
+                    [user.email],
+                    None,
+                    "email/change_info.html",
+                    link=link,
+                    username=user.username,
+                )
+                EmailVerify.objects.create(token=token, user=user, type="2")
 
         except BadHeaderError:
             return Response(
@@ -435,10 +469,19 @@ class RevenueStatisticView(APIView):
         query = dict((x, y) for x, y in params_list)
         query_pitch = dict((x, y) for x, y in param_pitch)
 
-        revenues = Pitch.objects.annotate(
-            revenue=Sum("order__cost", filter=Q(**query)),
-            count_order=Count("order", filter=Q(**query)),
-        ).filter(**query_pitch)
+        rollup = rollup_filters(query)
+        if rollup is not None:
+            revenues = Pitch.objects.annotate(
+                revenue=Sum("daily_revenues__revenue", filter=Q(**rollup)),
+                count_order=Coalesce(
+                    Sum("daily_revenues__count_order", filter=Q(**rollup)), 0
+                ),
+            ).filter(**query_pitch)
+        else:
+            revenues = Pitch.objects.annotate(
+                revenue=Sum("order__cost", filter=Q(**query)),
+                count_order=Count("order", filter=Q(**query)),
+            ).filter(**query_pitch)
 
         serializer = RevenueStatisticSerializer(revenues, many=True)
 
@@ -452,6 +495,76 @@ class RevenueStatisticView(APIView):
         )
 
 
+class RevenueSeriesView(APIView):
+    permission_classes = [
+        IsAdminUser,
+    ]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        try:
+            date_to = date_param(params, "to") or timezone.localdate()
+            date_from = date_param(params, "from") or date_to - timedelta(days=29)
+        except ValueError:
+            return Response(
+                {"message": _("Dates must use the YYYY-MM-DD format.")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if date_to < date_from:
+            return Response(
+                {"message": _("The end date must not be before the start date.")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if (date_to - date_from).days >= MAX_SERIES_DAYS:
+            return Response(
+                {
+                    "message": _("The range cannot exceed %(days)d days.")
+                    % {"days": MAX_SERIES_DAYS}
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        granularity = params.get("granularity") or "day"
+        if granularity not in SERIES_GRANULARITIES:
+            return Response(
+                {"message": _("Granularity must be day, week or month.")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        filters = {}
+        try:
+            max_points = int(params.get("max_points") or MAX_SERIES_POINTS)
+            if params.get("pitch"):
+                filters["pitch_id"] = int(params["pitch"])
+        except ValueError:
+            return Response(
+                {"message": _("pitch and max_points must be integers.")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if params.get("status"):
+            filters["status"] = params["status"]
+        max_points = min(max(max_points, 1), MAX_SERIES_POINTS)
+
+        points = revenue_series(date_from, date_to, granularity, **filters)
+
+        return Response(
+            {
+                "status": "success",
+                "code": status.HTTP_200_OK,
+                "data": {
+                    "from": date_from,
+                    "to": date_to,
+                    "granularity": granularity,
+                    "pitch": filters.get("pitch_id"),
+                    "revenue": sum(point["revenue"] for point in points),
+                    "count_order": sum(point["count_order"] for point in points),
+                    "points": decimate(points, max_points),
+                },
+                "message": "Revenue Series!",
+            }
+        )
+
+
 class OrderRateStatisticView(APIView):
     permission_classes = [
         IsAdminUser,
@@ -539,3 +652,87 @@ def list_comments_pitch_view(request, pitch_id):
     serializer = NestedCommentSerializer(result_page, many=True)
 
     return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(["GET"])
+def pitch_availability_view(request, pitch_id):
+    try:
+        pitch = Pitch.objects.get(pk=pitch_id)
+    except Pitch.DoesNotExist:
+        return Response(
+            {"message": _("Pitch not found.")}, status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        date_from = date_param(request.query_params, "from")
+        date_to = date_param(request.query_params, "to")
+    except ValueError:
+        return Response(
+            {"message": _("Dates must use the YYYY-MM-DD format.")},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    date_from = date_from or timezone.localdate()
+    date_to = date_to or date_from + timedelta(days=6)
+
+    if date_to < date_from:
+        return Response(
+            {"message": _("The end date must not be before the start date.")},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if (date_to - date_from).days >= MAX_AVAILABILITY_DAYS:
+        return Response(
+            {
+                "message": _("The range cannot exceed %(days)d days.")
+                % {"days": MAX_AVAILABILITY_DAYS}
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    days = [
+        {
+            "date": day,
+            "slots": slots,
+            "booked": format(slots, "0%db" % SLOTS_PER_DAY)[::-1],
+        }
+        for day, slots in day_slots(pitch, date_from, date_to)
+    ]
+
+    return Response(
+        {
+            "status": "success",
+            "code": status.HTTP_200_OK,
+            "data": {
+                "pitch": pitch.id,
+                "slot_minutes": SLOT_MINUTES,
+                "days": days,
+            },
+            "message": "Pitch availability!",
+        }
+    )
+
+
+@api_view(["GET"])
+def search_pitches_view(request):
+    form = SearchForm(request.query_params)
+    if not form.is_valid():
+        return Response(
+            {"status": "error", "errors": form.errors},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    pitches = filter_pitches(form.cleaned_data)
+    if not form.cleaned_data["near"]:
+        pitches = pitches.order_by("price", "id")
+    paginator = PageNumberPagination()
+    paginator.page_size = 10
+    result_page = paginator.paginate_queryset(pitches, request)
+    serializer = PitchSerializer(result_page, many=True)
+
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(["GET"])
+def suggest_pitches_view(request):
+    # Served from memory; typing a letter costs no database round-trip.
+    results = suggest_index().lookup(request.query_params.get("q", ""), MAX_SUGGESTIONS)
+    return Response({"results": results})
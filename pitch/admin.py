@@ -1,5 +1,6 @@
 from django.contrib import admin, messages
-from django.http import HttpResponse
+from django.contrib.admin import helpers
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from .models import (
     Voucher,
     Pitch,
@@ -9,21 +10,23 @@ from .models import (
     PitchRating,
     AccessComment,
     Favorite,
+    ExportJob,
+    ImportJob,
 )
 from .models import Pitch
-from account.mail import send_mail_custom
+from account.mail import send_mail_custom, queue_mail_custom
 from django.utils.translation import gettext
 from project1.settings import HOST
 from django.urls import reverse_lazy
 from datetime import datetime, timedelta
 from django.db.models import Q
+from pitch.export import EXPORT_FILTERS, order_rows, queue_export, stream_csv
 from pitch.forms import FormCustomSearchAdminSite
-import xlwt
 from project1.admin import my_admin_site
 from django.contrib.auth.models import Group
 from django.contrib.auth.models import User
 
-from django.urls import reverse
+from django.urls import path, reverse
 from django.shortcuts import redirect
 from django.utils.html import format_html
 
@@ -105,59 +108,45 @@ admin.site.register(AccessComment, AccessCommentAdmin)
 
 @admin.register(Order, site=my_admin_site)
 class OrderAdmin(admin.ModelAdmin):
-    @admin.action(description=gettext("Export as excel"))
-    def export_as_excel(self, request, queryset):
-        response = HttpResponse(content_type="application/ms-excel")
+    @admin.action(description=gettext("Export as CSV"))
+    def export_as_csv(self, request, queryset):
+        response = StreamingHttpResponse(
+            stream_csv(order_rows(queryset)), content_type="text/csv; charset=utf-8"
+        )
         name = "OrderList" + datetime.now().strftime("%Y%m%d%H%M%s")
-        response["Content-Disposition"] = 'attachment; filename="%s.xls"' % name
-
-        wb = xlwt.Workbook(encoding="utf-8")
-        ws = wb.add_sheet("Sheet1")
-
-        row_num = 0
-
-        font_style = xlwt.XFStyle()
-        font_style.font.bold = True
-
-        columns = [
-            "id",
-            "renter",
-            "price",
-            "pitch",
-            "time_start",
-            "time_end",
-            "cost",
-        ]
-
-        for col_num in range(len(columns)):
-            ws.write(row_num, col_num, columns[col_num], font_style)
-
-        font_style = xlwt.XFStyle()
-
-        for row in queryset:
-            row_num += 1
-            pitch = row.pitch.title + "(%s%s)" % (HOST, row.pitch.get_absolute_url())
-            renter = row.renter.username
-            for col_num in range(len(columns)):
-                if columns[col_num] == "time_start" or columns[col_num] == "time_end":
-                    time = getattr(row, columns[col_num])
-                    ws.write(
-                        row_num, col_num, time.strftime("%Y-%m-%d %H:%M"), font_style
-                    )
-                elif columns[col_num] == "pitch":
-                    ws.write(row_num, col_num, pitch, font_style)
-                elif columns[col_num] == "renter":
-                    ws.write(row_num, col_num, renter, font_style)
-                else:
-                    ws.write(
-                        row_num, col_num, getattr(row, columns[col_num]), font_style
-                    )
-
-        wb.save(response)
-
+        response["Content-Disposition"] = 'attachment; filename="%s.csv"' % name
         return response
 
-    actions = [export_as_excel]
+    @admin.action(description=gettext("Export in background"))
+    def export_in_background(self, request, queryset):
+        job, created = queue_export(self.export_params(request), request.user)
+        link = reverse("admin:pitch_exportjob_change", args=[job.pk])
+        if created:
+            message = gettext("Export job #%(id)d has been queued.")
+        else:
+            message = gettext("The same export is already job #%(id)d.")
+        messages.info(
+            request,
+            format_html('{} <a href="{}">{}</a>', message % {"id": job.pk}, link, link),
+        )
+
+    def export_params(self, request):
+        # The worker rebuilds the queryset from these, so only plain values
+        # are stored with the job.
+        if request.POST.get("select_across") != "1":
+            pks = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+            return {"pks": sorted(int(pk) for pk in pks)}
+        filters = {}
+        for name in EXPORT_FILTERS:
+            value = (
+                request.GET.get(name)
+                or (self.advanced_search_fields.get(name) or [None])[0]
+            )
+            if value:
+                filters[name] = value
+        return {"filters": filters}
+
+    actions = [export_as_csv, export_in_background]
     list_display = (
         "status",
         "renter",
@@ -254,7 +243,7 @@ class OrderAdmin(admin.ModelAdmin):
             email = obj.renter.email
             if old_status == "o" and new_status == "c":
                 try:
-                    send_mail_custom(
+                    queue_mail_custom(
                         gettext("Notice to order a pitch from Pitch App"),
                         [email],
                         None,
@@ -267,17 +256,17 @@ class OrderAdmin(admin.ModelAdmin):
                         cost=obj.cost,
                     )
                     messages.success(
-                        request, "Confirmation email has been sent successfully."
+                        request, "Confirmation email has been queued successfully."
                     )
                 except Exception as e:
                     messages.error(
-                        request, f"Failed to send confirmation email: {str(e)}"
+                        request, f"Failed to queue confirmation email: {str(e)}"
                     )
 
             elif old_status == "o" and new_status == "d":
                 # Send cancellation email
                 try:
-                    send_mail_custom(
+                    queue_mail_custom(
                         gettext("Notice to order a pitch from Pitch App"),
                         [email],
                         None,
@@ -290,14 +279,129 @@ class OrderAdmin(admin.ModelAdmin):
                         cost=obj.cost,
                     )
                     messages.success(
-                        request, "Cancellation email has been sent successfully."
+                        request, "Cancellation email has been queued successfully."
                     )
                 except Exception as e:
                     messages.error(
-                        request, f"Failed to send cancellation email: {str(e)}"
+                        request, f"Failed to queue cancellation email: {str(e)}"
                     )
         super().save_model(request, obj, form, change)
 
 
+@admin.register(ExportJob, site=my_admin_site)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "requested_by",
+        "status",
+        "progress",
+        "created_date",
+        "finished_date",
+        "download_link",
+    )
+    list_filter = ("status",)
+    readonly_fields = (
+        "requested_by",
+        "fingerprint",
+        "params",
+        "status",
+        "total",
+        "processed",
+        "file",
+        "error",
+        "created_date",
+        "finished_date",
+    )
+    exclude = ("lease_until",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress(self, obj):
+        return "%d%%" % obj.percent
+
+    def download_link(self, obj):
+        if obj.status != "d":
+            return ""
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse("admin:pitch_exportjob_download", args=[obj.pk]),
+            gettext("Download"),
+        )
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/progress/",
+                self.admin_site.admin_view(self.progress_view),
+                name="pitch_exportjob_progress",
+            ),
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="pitch_exportjob_download",
+            ),
+        ] + super().get_urls()
+
+    def progress_view(self, request, pk):
+        job = self.get_object(request, pk)
+        if job is None or not self.has_view_permission(request, job):
+            raise Http404
+        return JsonResponse(
+            {
+                "id": job.pk,
+                "status": job.status,
+                "total": job.total,
+                "processed": job.processed,
+                "percent": job.percent,
+                "error": job.error,
+                "download": (
+                    reverse("admin:pitch_exportjob_download", args=[job.pk])
+                    if job.status == "d"
+                    else None
+                ),
+            }
+        )
+
+    def download_view(self, request, pk):
+        job = self.get_object(request, pk)
+        if (
+            job is None
+            or job.status != "d"
+            or not self.has_view_permission(request, job)
+        ):
+            raise Http404
+        return FileResponse(
+            job.file.open("rb"),
+            as_attachment=True,
+            filename="OrderList%d.csv" % job.pk,
+        )
+
+
+@admin.register(ImportJob, site=my_admin_site)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "requested_by",
+        "status",
+        "progress",
+        "pitches",
+        "failed_pitches",
+        "created_date",
+        "finished_date",
+    )
+    list_filter = ("status",)
+    exclude = ("lease_until",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def progress(self, obj):
+        return "%d%%" % obj.percent
+
+
 my_admin_site.register(Group)
 my_admin_site.register(User)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PitchConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "pitch"
+
+    def ready(self):
+        from pitch import signals  # noqa: F401
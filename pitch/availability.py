@@ -0,0 +1,112 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from pitch.constant import SLOT_MINUTES, SLOTS_PER_DAY
+from pitch.models import Order, PitchDaySlots
+
+SLOT = timedelta(minutes=SLOT_MINUTES)
+
+
+def live_orders(pitch):
+    return Order.objects.filter(pitch=pitch).exclude(status="d")
+
+
+def overlapping_orders(pitch, start, end):
+    # Half-open intervals [start, end) overlap when each one starts before the
+    # other ends. Served by the (pitch, status, time_start, time_end) index.
+    return live_orders(pitch).filter(time_start__lt=end, time_end__gt=start)
+
+
+def is_available(pitch, start, end):
+    return not overlapping_orders(pitch, start, end).exists()
+
+
+def exclude_booked(pitches, start, end):
+    # One correlated anti-join over all pitches instead of a probe per pitch.
+    booked = Order.objects.filter(
+        pitch=OuterRef("pk"), time_start__lt=end, time_end__gt=start
+    ).exclude(status="d")
+    return pitches.filter(~Exists(booked))
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def as_datetime(value):
+    value = Order._meta.get_field("time_start").to_python(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def days_between(start, end):
+    start, end = as_datetime(start), as_datetime(end)
+    day = timezone.localtime(start).date()
+    last = timezone.localtime(end - timedelta(microseconds=1)).date()
+    days = []
+    while day <= last:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def slots_mask(day_start, start, end):
+    first = max(int((start - day_start) / SLOT), 0)
+    last = min(-int(-(end - day_start) / SLOT), SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def compute_day_slots(pitch_id, day):
+    day_start, day_end = day_bounds(day)
+    bitmap = 0
+    orders = overlapping_orders(pitch_id, day_start, day_end).values_list(
+        "time_start", "time_end"
+    )
+    for start, end in orders:
+        bitmap |= slots_mask(day_start, start, end)
+    return bitmap
+
+
+def refresh_day_slots(pitch_id, days):
+    for day in days:
+        bitmap = compute_day_slots(pitch_id, day)
+        if bitmap:
+            PitchDaySlots.objects.update_or_create(
+                pitch_id=pitch_id, day=day, defaults={"slots": bitmap}
+            )
+        else:
+            PitchDaySlots.objects.filter(pitch_id=pitch_id, day=day).delete()
+
+
+def refresh_order_slots(order, previous=None):
+    touched = {
+        (order.pitch_id, day) for day in days_between(order.time_start, order.time_end)
+    }
+    if previous and {"pitch_id", "time_start", "time_end"} <= previous.keys():
+        touched |= {
+            (previous["pitch_id"], day)
+            for day in days_between(previous["time_start"], previous["time_end"])
+        }
+    for pitch_id, day in sorted(touched):
+        refresh_day_slots(pitch_id, [day])
+
+
+def day_slots(pitch, date_from, date_to):
+    booked = dict(
+        PitchDaySlots.objects.filter(
+            pitch=pitch, day__gte=date_from, day__lte=date_to
+        ).values_list("day", "slots")
+    )
+    result = []
+    day = date_from
+    while day <= date_to:
+        result.append((day, booked.get(day, 0)))
+        day += timedelta(days=1)
+    return result
@@ -0,0 +1,76 @@
+import logging
+import random
+import time
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from pitch.availability import is_available
+from pitch.custom_fnc import convert_timedelta
+from pitch.models import AccessComment, Order, Pitch
+
+logger = logging.getLogger(__name__)
+
+# MySQL lock wait timeout and deadlock; SQLite reports a locked database.
+RETRYABLE_ERROR_CODES = (1205, 1213)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 0.05
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def order_cost(pitch, time_start, time_end, voucher=None):
+    cost = convert_timedelta(time_end - time_start) * (pitch.price)
+    if voucher:
+        cost -= voucher.discount
+    return cost
+
+
+def is_retryable(error):
+    if error.args and error.args[0] in RETRYABLE_ERROR_CODES:
+        return True
+    return "database is locked" in str(error)
+
+
+def book_pitch(pitch, renter, time_start, time_end, voucher=None, on_booked=None):
+    cost = order_cost(pitch, time_start, time_end, voucher)
+    attempt = 1
+    while True:
+        try:
+            with transaction.atomic():
+                # The pitch row is the per-pitch lock: concurrent bookings of
+                # the same pitch queue here, other pitches are not blocked.
+                Pitch.objects.select_for_update().only("id").get(pk=pitch.pk)
+                if not is_available(pitch, time_start, time_end):
+                    raise SlotUnavailable()
+                order = Order.objects.create(
+                    pitch=pitch,
+                    time_start=time_start,
+                    time_end=time_end,
+                    renter=renter,
+                    price=pitch.price,
+                    cost=cost,
+                    voucher=voucher,
+                )
+                AccessComment.objects.get_or_create(renter=renter, pitch=pitch)
+                AccessComment.objects.filter(renter=renter, pitch=pitch).update(
+                    count_comment_created=F("count_comment_created") + 1
+                )
+                if on_booked:
+                    on_booked(order)
+                return order
+        except OperationalError as e:
+            # A retry is only safe when this block owns the whole transaction.
+            if (
+                attempt >= MAX_ATTEMPTS
+                or connection.in_atomic_block
+                or not is_retryable(e)
+            ):
+                raise
+            logger.warning(
+                "Retry booking pitch %s (attempt %d): %s", pitch.pk, attempt, e
+            )
+            time.sleep(RETRY_DELAY * attempt * (1 + random.random()))
+            attempt += 1
@@ -0,0 +1,165 @@
+from django.db import transaction
+from django.db.models import Count, F, Min
+
+from pitch.constant import DEFAULT_BANNER, SIZE, SURFACE_GRASS
+from pitch.models import Image, Order, Pitch, PitchCard, PitchRating
+
+SIZE_LABELS = dict(SIZE)
+SURFACE_LABELS = dict(SURFACE_GRASS)
+CARD_BATCH_SIZE = 1000
+
+
+def banner_url(path):
+    if not path:
+        return DEFAULT_BANNER
+    return Image(image=path).image.url
+
+
+def first_images(pitch_ids):
+    # The banner is the pitch's oldest image, as the listing pages showed.
+    first = (
+        Image.objects.filter(pitch_id__in=pitch_ids)
+        .values("pitch_id")
+        .annotate(first=Min("pk"))
+        .order_by()
+        .values_list("first", flat=True)
+    )
+    return dict(Image.objects.filter(pk__in=first).values_list("pitch_id", "image"))
+
+
+def refresh_pitch_labels(pitch):
+    PitchCard.objects.update_or_create(
+        pitch_id=pitch.pk,
+        defaults={
+            "size_label": SIZE_LABELS.get(pitch.size, ""),
+            "surface_label": SURFACE_LABELS.get(pitch.surface, ""),
+        },
+    )
+
+
+def refresh_banner(pitch_id):
+    url = banner_url(first_images([pitch_id]).get(pitch_id))
+    PitchCard.objects.filter(pitch_id=pitch_id).update(banner_url=url)
+
+
+def refresh_rating(rating):
+    PitchCard.objects.filter(pitch_id=rating.pitch_id).update(
+        avg_rating=rating.avg_rating, count_comment=rating.count_comment
+    )
+
+
+def confirmed_orders(pitch_ids):
+    return dict(
+        Order.objects.filter(pitch_id__in=pitch_ids, status="c")
+        .values("pitch_id")
+        .annotate(count=Count("id"))
+        .order_by()
+        .values_list("pitch_id", "count")
+    )
+
+
+def add_popularity(pitch_id, delta):
+    cards = PitchCard.objects.filter(pitch_id=pitch_id)
+    if delta < 0:
+        # Never below zero, whatever drift the reconcile job has yet to fix.
+        cards = cards.filter(popularity__gte=-delta)
+    cards.update(popularity=F("popularity") + delta)
+
+
+def recompute_popularity(pitch_id):
+    PitchCard.objects.filter(pitch_id=pitch_id).update(
+        popularity=confirmed_orders([pitch_id]).get(pitch_id, 0)
+    )
+
+
+def refresh_order_popularity(order, previous=None, created=False, deleted=False):
+    confirmed = order.status == "c"
+    if created or deleted:
+        if confirmed:
+            add_popularity(order.pitch_id, -1 if deleted else 1)
+        return
+    if not previous or not {"pitch_id", "status"} <= previous.keys():
+        recompute_popularity(order.pitch_id)
+        return
+    was_confirmed = previous["status"] == "c"
+    moved = previous["pitch_id"] != order.pitch_id
+    if was_confirmed and (moved or not confirmed):
+        add_popularity(previous["pitch_id"], -1)
+    if confirmed and (moved or not was_confirmed):
+        add_popularity(order.pitch_id, 1)
+
+
+def build_cards(pitch_ids):
+    pitches = Pitch.objects.filter(pk__in=pitch_ids).values_list(
+        "pk", "size", "surface"
+    )
+    images = first_images(pitch_ids)
+    ratings = {
+        rating.pitch_id: rating
+        for rating in PitchRating.objects.filter(pitch_id__in=pitch_ids)
+    }
+    popularity = confirmed_orders(pitch_ids)
+    cards = []
+    for pk, size, surface in pitches:
+        rating = ratings.get(pk)
+        cards.append(
+            PitchCard(
+                pitch_id=pk,
+                banner_url=banner_url(images.get(pk)),
+                size_label=SIZE_LABELS.get(size, ""),
+                surface_label=SURFACE_LABELS.get(surface, ""),
+                avg_rating=rating.avg_rating if rating else 0,
+                count_comment=rating.count_comment if rating else 0,
+                popularity=popularity.get(pk, 0),
+            )
+        )
+    return cards
+
+
+def rebuild_pitch_cards(pitch_ids=None, batch_size=CARD_BATCH_SIZE):
+    """Recompute the cards of ``pitch_ids``, or of every pitch.
+
+    For writes that skip the model signals, such as bulk imports.
+    """
+    if pitch_ids is None:
+        pitch_ids = Pitch.objects.order_by("pk").values_list("pk", flat=True)
+    pitch_ids = list(pitch_ids)
+    for start in range(0, len(pitch_ids), batch_size):
+        batch = pitch_ids[start : start + batch_size]
+        cards = build_cards(batch)
+        with transaction.atomic():
+            PitchCard.objects.filter(pitch_id__in=batch).delete()
+            PitchCard.objects.bulk_create(cards)
+    return len(pitch_ids)
+
+
+def reconcile_popularity(batch_size=CARD_BATCH_SIZE):
+    """Reset the popularity counters that drifted from the confirmed orders
+    and create missing cards. Returns the number of cards fixed.
+    """
+    fixed = 0
+    pitch_ids = list(
+        PitchCard.objects.order_by("pitch_id").values_list("pitch_id", flat=True)
+    )
+    for start in range(0, len(pitch_ids), batch_size):
+        batch = pitch_ids[start : start + batch_size]
+        with transaction.atomic():
+            # Order saves touching these cards wait for the lock, so their
+            # increments land on top of the recounted values.
+            cards = list(
+                PitchCard.objects.select_for_update()
+                .filter(pitch_id__in=batch)
+                .only("pitch_id", "popularity")
+            )
+            counts = confirmed_orders(batch)
+            drifted = [
+                card
+                for card in cards
+                if card.popularity != counts.get(card.pitch_id, 0)
+            ]
+            for card in drifted:
+                card.popularity = counts.get(card.pitch_id, 0)
+            PitchCard.objects.bulk_update(drifted, ["popularity"])
+        fixed += len(drifted)
+    missing = Pitch.objects.filter(card__isnull=True).values_list("pk", flat=True)
+    return fixed + rebuild_pitch_cards(missing, batch_size)
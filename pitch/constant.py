@@ -21,3 +21,26 @@ TYPE_TOKEN = (
     ("1", "Change Password"),
     ("2", "Change Information"),
 )
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+STATUS_OUTBOX = (
+    ("p", "Pending"),
+    ("s", "Sent"),
+    ("x", "Dead"),
+)
+
+STATUS_JOB = (
+    ("p", "Pending"),
+    ("r", "Running"),
+    ("d", "Done"),
+    ("f", "Failed"),
+)
+
+IMPORT_MODE = (
+    ("i", "Insert"),
+    ("u", "Upsert"),
+)
+
+DEFAULT_BANNER = "/media/uploads/default-image.jpg"
@@ -1,21 +1,20 @@
-from datetime import date
 import logging
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import User
-from account.mail import send_mail_custom
+from account.mail import send_mass_mail_custom
 from project1.settings import HOST
-from pitch.custom_fnc import query_statistic
+from pitch.custom_fnc import last_month_range, query_statistic
 
 logger = logging.getLogger(__name__)
 
 
 def mail_schedule_job():
     try:
-        last_month = date.today().month - 1
+        last_month = last_month_range()[0].month
         pitches = query_statistic()[:10]
         admins = User.objects.filter(is_superuser=1)
         emails = list(map(lambda x: x.email, admins))
-        send_mail_custom(
+        send_mass_mail_custom(
             _("Monthly revenue statistics from Pitch App"),
             emails,
             None,
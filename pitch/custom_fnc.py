@@ -1,5 +1,5 @@
 from datetime import date, timedelta
-from pitch.models import Pitch
+from pitch.revenue import pitch_revenues
 
 
 def convert_timedelta(duration):
@@ -12,19 +12,8 @@ def convert_timedelta(duration):
 
 
 def query_statistic():
-    last_month = date.today().month - 1
-    year = date.today().year
-    pitches = Pitch.objects.raw(
-        """
-        SELECT p.id, p.title,sum(o.cost) as revenues, count(o.id) as count FROM orders as o
-        join pitches as p on p.id = o.pitch_id
-        where month(o.time_start) = %d and year(o.time_start) = %d
-        group by o.pitch_id
-        order by revenues desc, count desc;  
-        """
-        % (last_month, year)
-    )
-    return pitches
+    first_day, last_day = last_month_range()
+    return pitch_revenues(first_day, last_day)
 
 
 def last_day_of_month(any_day):
@@ -32,13 +21,17 @@ def last_day_of_month(any_day):
     return next_month - timedelta(days=next_month.day)
 
 
+def last_month_range(today=None):
+    first_of_this_month = (today or date.today()).replace(day=1)
+    last_day = first_of_this_month - timedelta(days=1)
+    return last_day.replace(day=1), last_day
+
+
 def create_day_of_month():
-    last_month = date.today().month - 1
-    day_of_last_month = last_day_of_month(date(date.today().year, last_month, 1)).day
+    day_of_last_month = last_month_range()[1].day
     return [x + 1 for x in range(day_of_last_month)]
 
 
 def create_empty_day_of_month():
-    last_month = date.today().month - 1
-    day_of_last_month = last_day_of_month(date(date.today().year, last_month, 1)).day
+    day_of_last_month = last_month_range()[1].day
     return [0 for x in range(day_of_last_month)]
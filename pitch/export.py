@@ -0,0 +1,236 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from pitch.models import ExportJob, Order
+from project1.settings import HOST
+
+logger = logging.getLogger(__name__)
+
+ORDER_EXPORT_COLUMNS = [
+    "id",
+    "renter",
+    "price",
+    "pitch",
+    "time_start",
+    "time_end",
+    "cost",
+]
+EXPORT_CHUNK_SIZE = 2000
+# A running job refreshes its lease after every chunk; a job whose worker
+# died is picked up again once the lease ends.
+EXPORT_JOB_LEASE = timedelta(minutes=5)
+# Finished files and their jobs are purged after this long.
+EXPORT_FILE_RETENTION = timedelta(days=7)
+# Changelist filters an export may carry, mapped to the lookups they apply.
+EXPORT_FILTERS = {
+    "pitch__id__exact": "pitch_id",
+    "pitch__surface__exact": "pitch__surface",
+    "pitch__size__exact": "pitch__size",
+    "time_start": "time_start__gte",
+    "time_end": "time_start__lte",
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def order_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    orders = (
+        queryset.select_related("pitch", "renter")
+        .only(
+            "id",
+            "price",
+            "cost",
+            "time_start",
+            "time_end",
+            "pitch__id",
+            "pitch__title",
+            "renter__username",
+        )
+        .order_by("pk")
+    )
+    # Page by primary key: mysqlclient buffers a whole result set on the
+    # client, so iterator() alone would not keep the memory flat.
+    chunk = list(orders[:chunk_size])
+    while chunk:
+        for order in chunk:
+            yield [
+                order.id,
+                order.renter.username,
+                order.price,
+                "%s(%s%s)" % (order.pitch.title, HOST, order.pitch.get_absolute_url()),
+                timezone.localtime(order.time_start).strftime("%Y-%m-%d %H:%M"),
+                timezone.localtime(order.time_end).strftime("%Y-%m-%d %H:%M"),
+                order.cost,
+            ]
+        if len(chunk) < chunk_size:
+            return
+        chunk = list(orders.filter(pk__gt=chunk[-1].pk)[:chunk_size])
+
+
+def stream_csv(rows, header=ORDER_EXPORT_COLUMNS):
+    writer = csv.writer(Echo())
+    # The byte order mark makes Excel read the file as UTF-8.
+    yield "\ufeff" + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_fingerprint(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def queue_export(params, user):
+    """Queue an export of the orders ``params`` describe, or return the job
+    already pending or running for the same export.
+    """
+    fingerprint = export_fingerprint(params)
+    while True:
+        try:
+            with transaction.atomic():
+                job = ExportJob.objects.create(
+                    requested_by=user,
+                    fingerprint=fingerprint,
+                    active_fingerprint=fingerprint,
+                    params=params,
+                )
+            return job, True
+        except IntegrityError:
+            job = ExportJob.objects.filter(active_fingerprint=fingerprint).first()
+            # Otherwise the job finished in between and a new one is needed.
+            if job is not None:
+                return job, False
+
+
+def export_queryset(params):
+    """The orders of an export: either the selected ids or every order
+    matching the changelist filters.
+    """
+    queryset = Order.objects.all()
+    if "pks" in params:
+        return queryset.filter(pk__in=params["pks"])
+    filters = params.get("filters", {})
+    return queryset.filter(
+        **{
+            lookup: filters[name]
+            for name, lookup in EXPORT_FILTERS.items()
+            if filters.get(name) not in (None, "")
+        }
+    )
+
+
+def claim_export_job():
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["p", "r"], lease_until__lte=now)
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = "r"
+        job.processed = 0
+        job.lease_until = now + EXPORT_JOB_LEASE
+        job.save(update_fields=["status", "processed", "lease_until"])
+    return job
+
+
+def run_export_job(job, chunk_size=EXPORT_CHUNK_SIZE, pause=0):
+    name = "exports/orders-%d.csv" % job.pk
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        queryset = export_queryset(job.params)
+        job.total = queryset.count()
+        ExportJob.objects.filter(pk=job.pk).update(total=job.total)
+        with open(path + ".part", "w", encoding="utf-8", newline="") as output:
+            for count, line in enumerate(stream_csv(order_rows(queryset, chunk_size))):
+                output.write(line)
+                if count and count % chunk_size == 0:
+                    ExportJob.objects.filter(pk=job.pk).update(
+                        processed=count,
+                        lease_until=timezone.now() + EXPORT_JOB_LEASE,
+                    )
+                    # Leave room for the booking traffic between chunks.
+                    time.sleep(pause)
+        os.replace(path + ".part", path)
+    except Exception as e:
+        logger.error("Export job %s failed: %s", job.pk, e)
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+        ExportJob.objects.filter(pk=job.pk).update(
+            status="f",
+            active_fingerprint=None,
+            error=str(e),
+            finished_date=timezone.now(),
+        )
+        return False
+    ExportJob.objects.filter(pk=job.pk).update(
+        status="d",
+        active_fingerprint=None,
+        processed=job.total,
+        file=name,
+        finished_date=timezone.now(),
+    )
+    return True
+
+
+def purge_exports(retention=EXPORT_FILE_RETENTION):
+    """Delete the files and jobs of exports that finished before the
+    retention period. Returns the number of jobs deleted.
+    """
+    jobs = ExportJob.objects.filter(
+        status__in=["d", "f"], finished_date__lt=timezone.now() - retention
+    )
+    for name in jobs.exclude(file="").values_list("file", flat=True):
+        default_storage.delete(name)
+    return jobs.delete()[0]
+
+
+def drain_export_jobs(chunk_size=EXPORT_CHUNK_SIZE, pause=0):
+    done = failed = 0
+    while True:
+        job = claim_export_job()
+        if job is None:
+            return done, failed
+        if run_export_job(job, chunk_size, pause):
+            done += 1
+        else:
+            failed += 1
+
+
+def drain_export_jobs_in_thread(chunk_size, pause):
+    try:
+        return drain_export_jobs(chunk_size, pause)
+    finally:
+        connection.close()
+
+
+def run_export_jobs(workers=2, chunk_size=EXPORT_CHUNK_SIZE, pause=0):
+    if workers == 1:
+        return drain_export_jobs(chunk_size, pause)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                drain_export_jobs_in_thread,
+                [chunk_size] * workers,
+                [pause] * workers,
+            )
+        )
+    return sum(r[0] for r in results), sum(r[1] for r in results)
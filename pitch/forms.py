@@ -5,6 +5,7 @@ from pitch.models import Order, Comment
 from datetime import timedelta
 from django.utils import timezone
 from pitch.custom_fnc import convert_timedelta
+from pitch.availability import is_available
 from django.utils.translation import gettext as _
 from django import forms
 from django.utils.translation import gettext_lazy as _
@@ -30,17 +31,7 @@ class RentalPitchModelForm(ModelForm):
         except KeyError:
             raise ValidationError(_("Invalid time start values."))
         end = self.cleaned_data["time_end"]
-        ordered = (
-            Order.objects.filter(pitch=pitch, time_start__lt=end, time_end__gte=end)
-            | Order.objects.filter(
-                pitch=pitch, time_start__lte=start, time_end__gt=start
-            )
-            | Order.objects.filter(
-                pitch=pitch, time_start__gte=start, time_end__lte=end
-            )
-        )
-
-        if ordered.exists():
+        if not is_available(pitch, start, end):
             raise ValidationError(
                 _("This time someone ordered! Please choose another time.")
             )
@@ -107,6 +98,8 @@ SURFACE_CHOICES = [
     ("m", _("Mixed")),
 ]
 
+MAX_RADIUS_KM = 50
+
 SIZE_CHOICES = [
     ("", _("Size")),
     ("1", _("Pitch 5")),
@@ -153,6 +146,60 @@ class SearchForm(forms.Form):
             attrs={"class": "form-control", "placeholder": _("Enter price")}
         ),
     )
+    time_start = forms.DateTimeField(
+        label=_("Free from"),
+        required=False,
+        widget=forms.DateTimeInput(
+            attrs={"class": "form-control", "type": "datetime-local"}
+        ),
+    )
+    time_end = forms.DateTimeField(
+        label=_("Free until"),
+        required=False,
+        widget=forms.DateTimeInput(
+            attrs={"class": "form-control", "type": "datetime-local"}
+        ),
+    )
+
+    near = forms.CharField(
+        label=_("Near"),
+        max_length=50,
+        required=False,
+        widget=forms.TextInput(
+            attrs={"class": "form-control", "placeholder": _("Latitude, longitude")}
+        ),
+    )
+    radius = forms.FloatField(
+        label=_("Radius (km)"),
+        min_value=0.1,
+        max_value=MAX_RADIUS_KM,
+        required=False,
+        widget=forms.NumberInput(
+            attrs={"class": "form-control", "placeholder": _("Radius (km)")}
+        ),
+    )
+
+    def clean_near(self):
+        near = self.cleaned_data["near"]
+        if not near:
+            return None
+        try:
+            latitude, longitude = (float(part) for part in near.split(","))
+        except ValueError:
+            raise ValidationError(_("Enter a location as latitude,longitude."))
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError(_("The location is out of range."))
+        return latitude, longitude
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("time_start")
+        end = cleaned_data.get("time_end")
+        if bool(start) != bool(end):
+            raise ValidationError(_("Choose both a start and an end time."))
+        if start and end <= start:
+            raise ValidationError(_("The end time must be after the start time."))
+        return cleaned_data
 
 
 class CommentForm(forms.ModelForm):
@@ -0,0 +1,151 @@
+import csv
+import math
+import re
+
+from django.db.models import Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+from pitch.models import Pitch
+from pitch.textindex import fold
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# About 38 m x 19 m cells; coarser cells are prefixes of the stored hash.
+GEOHASH_PRECISION = 8
+GEOCODE_BATCH_SIZE = 1000
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Administrative words dropped when matching addresses to the table.
+ADMIN_WORDS = re.compile(r"^(quan|huyen|thi xa|phuong|xa|thi tran|tp|thanh pho) ")
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    cells, bits, bit, even = [], 0, 0, True
+    while len(cells) < precision:
+        # Bits alternate between longitude and latitude, longitude first.
+        if even:
+            middle = (west + east) / 2
+            bits = bits * 2 + (longitude >= middle)
+            west, east = (middle, east) if longitude >= middle else (west, middle)
+        else:
+            middle = (south + north) / 2
+            bits = bits * 2 + (latitude >= middle)
+            south, north = (middle, north) if latitude >= middle else (south, middle)
+        even = not even
+        bit += 1
+        if bit == 5:
+            cells.append(BASE32[bits])
+            bits, bit = 0, 0
+    return "".join(cells)
+
+
+def cell_size(precision):
+    """Height and width in degrees of the cells with ``precision`` chars."""
+    lat_bits = 5 * precision // 2
+    return 180 / 2**lat_bits, 360 / 2 ** (5 * precision - lat_bits)
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Geohash prefixes whose cells together cover the circle, or None when
+    it is too big to narrow down.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height >= dlat and width >= dlon:
+            break
+    else:
+        return None
+    # A cell is at least the radius each way, so the circle stays within the
+    # cell of its centre and the eight cells around it.
+    return sorted(
+        {
+            geohash(
+                min(max(latitude + row * height, -90.0), 90.0),
+                (longitude + column * width + 180.0) % 360.0 - 180.0,
+                precision,
+            )
+            for row in (-1, 0, 1)
+            for column in (-1, 0, 1)
+        }
+    )
+
+
+def in_cells(cells):
+    # Ranges instead of LIKE 'prefix%' so every backend uses the index.
+    condition = Q()
+    for cell in cells:
+        condition |= Q(geocell__gte=cell, geocell__lt=cell + "~")
+    return condition
+
+
+def distance_km(latitude, longitude):
+    """Haversine distance from the pitch to the point, as an expression."""
+    lat0, lon0 = math.radians(latitude), math.radians(longitude)
+    half_dlat = (Radians("latitude") - lat0) / 2
+    half_dlon = (Radians("longitude") - lon0) / 2
+    chord = Power(Sin(half_dlat), 2) + math.cos(lat0) * Cos(
+        Radians("latitude")
+    ) * Power(Sin(half_dlon), 2)
+    # Rounding can push the root a hair above 1, outside ASin's domain.
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(chord), Value(1.0)))
+
+
+def address_key(address):
+    parts = [part.strip() for part in fold(address or "").split(",")]
+    parts = [ADMIN_WORDS.sub("", re.sub(r"\s+", " ", part)) for part in parts]
+    return ", ".join(part for part in parts if part)
+
+
+def read_geocodes(path):
+    """Address -> (latitude, longitude) from a CSV with those three columns."""
+    with open(path, newline="", encoding="utf-8") as table:
+        return {
+            address_key(row["address"]): (
+                float(row["latitude"]),
+                float(row["longitude"]),
+            )
+            for row in csv.DictReader(table)
+        }
+
+
+def geocode(address, geocodes):
+    """Coordinates of the most specific table entry that ends ``address``.
+
+    "12 Xuân Thủy, Quận Cầu Giấy, Hà Nội" tries the whole address, then
+    "cau giay, ha noi", then "ha noi"; the shipped table has no entry for a
+    bare city, so an address without a known district stays unlocated.
+    """
+    parts = address_key(address).split(", ")
+    for start in range(len(parts)):
+        found = geocodes.get(", ".join(parts[start:]))
+        if found:
+            return found
+    return None
+
+
+def geocode_pitches(geocodes, overwrite=False, batch_size=GEOCODE_BATCH_SIZE):
+    """Fill the coordinates of the pitches from the table. Returns the number
+    of pitches located and the number the table had no entry for.
+    """
+    pitches = Pitch.objects.order_by("pk")
+    if not overwrite:
+        pitches = pitches.filter(latitude__isnull=True)
+    pitch_ids = list(pitches.values_list("pk", flat=True))
+    located = 0
+    for start in range(0, len(pitch_ids), batch_size):
+        batch = []
+        for pitch in Pitch.objects.filter(
+            pk__in=pitch_ids[start : start + batch_size]
+        ).only("address"):
+            found = geocode(pitch.address, geocodes)
+            if found is None:
+                continue
+            pitch.latitude, pitch.longitude = found
+            # bulk_update skips the pre_save signal that keeps the geohash.
+            pitch.geocell = geohash(*found)
+            batch.append(pitch)
+        Pitch.objects.bulk_update(batch, ["latitude", "longitude", "geocell"])
+        located += len(batch)
+    return located, len(pitch_ids) - located
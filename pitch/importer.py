@@ -0,0 +1,629 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import chain, islice
+
+import django
+import openpyxl
+import pandas as pd
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    InterfaceError,
+    OperationalError,
+    connection,
+    transaction,
+)
+from django.utils import timezone
+
+from pitch.cards import rebuild_pitch_cards
+from pitch.constant import SIZE, SURFACE_GRASS
+from pitch.models import Image, ImportJob, Pitch
+from pitch.textindex import fold
+
+logger = logging.getLogger(__name__)
+
+PITCH_COLUMNS = ["title", "description", "price", "address", "phone", "size", "surface"]
+REQUIRED_COLUMNS = ["title", "address", "size", "surface", "price"]
+IMAGE_COLUMNS = ["image1", "image2", "image3"]
+MAX_LENGTHS = {"title": 200, "address": 200, "phone": 100, "description": 1000}
+IMAGE_MAX_LENGTH = 100
+MAX_PRICE = 2000000000
+IMPORT_BATCH_SIZE = 1000
+IMPORT_SHEET = "PitchData"
+# Fields identifying a pitch in upsert mode; override with PITCH_IMPORT_KEY.
+DEFAULT_KEY = ("title", "address")
+# A running job refreshes its lease at every checkpoint; a job whose worker
+# died resumes from its checkpoint once the lease ends.
+IMPORT_JOB_LEASE = timedelta(minutes=5)
+# The same file posted again within this window returns the existing job.
+IMPORT_JOB_REUSE = timedelta(hours=1)
+MAX_JOB_ERRORS = 1000
+# Runs a job may lose to deadlocks or dropped connections before it fails.
+IMPORT_JOB_MAX_ATTEMPTS = 5
+# Spreadsheet row of the first record, below the header row.
+FIRST_ROW = 2
+
+
+class ImportResult:
+    def __init__(self):
+        self.pitches = 0
+        self.images = 0
+        self.failed_pitches = 0
+        self.failed_images = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed_images = 0
+        self.errors = []
+        self.image_errors = []
+
+
+def as_text(series):
+    # Excel hands numbers back for cells such as size "1"; read them as text.
+    text = series.astype("string").str.strip().fillna("")
+    return text.str.replace(r"\.0$", "", regex=True)
+
+
+def too_long(text, field, max_length):
+    lengths = text.str.len()
+    message = "%s: Ensure this value has at most %d characters (it has " % (
+        field.capitalize(),
+        max_length,
+    )
+    return (message + lengths.astype(str) + ").").where(lengths > max_length, "")
+
+
+def validate_pitch_frame(df):
+    """Check every row of ``df`` with column operations instead of full_clean().
+
+    Returns the cleaned rows that passed and a Series of error messages for
+    the rows that did not, both indexed like ``df``.
+    """
+    df = df.reindex(columns=PITCH_COLUMNS + IMAGE_COLUMNS)
+    clean = pd.DataFrame(
+        {column: as_text(df[column]) for column in PITCH_COLUMNS + IMAGE_COLUMNS},
+        index=df.index,
+    )
+    price = pd.to_numeric(clean["price"], errors="coerce")
+
+    missing = pd.Series("", index=df.index)
+    for column in REQUIRED_COLUMNS:
+        missing += (clean[column] == "").map({True: column + ", ", False: ""})
+    has_missing = missing != ""
+
+    checks = [
+        ("Required fields cannot be empty: " + missing.str[:-2]).where(has_missing, "")
+    ]
+    for column, choices in (("size", SIZE), ("surface", SURFACE_GRASS)):
+        invalid = ~clean[column].isin([key for key, _ in choices])
+        checks.append(
+            (
+                "%s: Value '" % column.capitalize()
+                + clean[column]
+                + "' is not a valid choice."
+            ).where(invalid, "")
+        )
+    invalid_price = price.isna() | (price < 0) | (price > MAX_PRICE) | (price % 1 != 0)
+    checks.append(
+        (
+            "Price: '"
+            + clean["price"]
+            + "' must be a whole number between 0 and %d." % MAX_PRICE
+        ).where(invalid_price, "")
+    )
+    for column, max_length in MAX_LENGTHS.items():
+        checks.append(too_long(clean[column], column, max_length))
+
+    checks = pd.concat(checks, axis=1)
+    # A row with missing fields only reports those, like full_clean() did.
+    checks.iloc[:, 1:] = checks.iloc[:, 1:].where(~has_missing, "")
+    rejected = (checks != "").any(axis=1)
+    errors = pd.Series(
+        [
+            "; ".join(message for message in row if message)
+            for row in checks[rejected].itertuples(index=False)
+        ],
+        index=checks.index[rejected],
+        dtype=object,
+    )
+    clean["price"] = price
+    return clean[~rejected], errors
+
+
+def assign_ids(pitches, token):
+    """Set the pks that bulk_create could not return on this backend.
+
+    ``pitches`` were inserted in one chunk tagged with ``token``, so their
+    rows are the ones carrying it, in insertion order, whatever other
+    imports insert at the same time.
+    """
+    pks = list(
+        Pitch.objects.filter(import_token=token)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    if len(pks) != len(pitches):
+        raise DatabaseError("Could not read back the ids of the inserted pitches.")
+    for pitch, pk in zip(pitches, pks):
+        pitch.pk = pk
+
+
+def natural_key(fields=None):
+    fields = tuple(fields or getattr(settings, "PITCH_IMPORT_KEY", DEFAULT_KEY))
+    unknown = set(fields) - set(PITCH_COLUMNS)
+    if not fields or unknown:
+        raise ValueError("Unknown natural key fields: %s" % ", ".join(sorted(unknown)))
+    return fields
+
+
+def key_value(value):
+    # MySQL's default collation ignores case and accents, so the sheet and the
+    # catalog are compared the same way.
+    return fold(value) if isinstance(value, str) else value
+
+
+def pitch_key(pitch, key):
+    return tuple(key_value(getattr(pitch, field)) for field in key)
+
+
+def repeated_keys(valid, key, first_row=FIRST_ROW):
+    """Split off the rows whose natural key comes again further down.
+
+    The last row of a key is imported; the earlier ones are returned as
+    errors, indexed like ``valid``.
+    """
+    last, errors = {}, {}
+    for index, values in zip(valid.index, valid[list(key)].itertuples(index=False)):
+        row_key = tuple(key_value(value) for value in values)
+        if row_key in last:
+            errors[last[row_key]] = "Repeated by row %d, which is imported instead." % (
+                index + first_row
+            )
+        last[row_key] = index
+    errors = pd.Series(errors, dtype=object)
+    return valid.drop(errors.index), errors
+
+
+def insert_pitches(pitches, paths, result):
+    token = uuid.uuid4().hex
+    for pitch in pitches:
+        pitch.import_token = token
+    Pitch.objects.bulk_create(pitches)
+    if pitches and pitches[0].pk is None:
+        assign_ids(pitches, token)
+    images = [
+        Image(image=path, pitch_id=pitch.pk)
+        for pitch, pitch_paths in zip(pitches, paths)
+        for path in pitch_paths
+    ]
+    Image.objects.bulk_create(images)
+    result.pitches += len(pitches)
+    result.images += len(images)
+
+
+def reconcile_images(wanted, result):
+    # wanted maps an existing pitch id to the image paths of its row. Only
+    # images that are missing or no longer listed are written; returns the
+    # ids of the pitches whose images changed.
+    kept = defaultdict(set)
+    stale = []
+    changed = set()
+    images = Image.objects.filter(pitch_id__in=wanted).values_list(
+        "pk", "pitch_id", "image"
+    )
+    for pk, pitch_id, path in images:
+        if path in wanted[pitch_id] and path not in kept[pitch_id]:
+            kept[pitch_id].add(path)
+        else:
+            stale.append(pk)
+            changed.add(pitch_id)
+    Image.objects.filter(pk__in=stale).delete()
+    missing = [
+        Image(image=path, pitch_id=pitch_id)
+        for pitch_id, paths in wanted.items()
+        for path in dict.fromkeys(paths)
+        if path not in kept[pitch_id]
+    ]
+    Image.objects.bulk_create(missing)
+    result.images += len(missing)
+    result.removed_images += len(stale)
+    return changed | {image.pitch_id for image in missing}
+
+
+def upsert_pitches(pitches, paths, key, result):
+    """Update the pitches whose natural key already exists and return the rest,
+    with the ids of the existing pitches that changed.
+
+    Existing rows are loaded with one query per chunk and only rows whose
+    values differ are written back.
+    """
+    existing = {}
+    lookups = {
+        "%s__in" % field: {getattr(pitch, field) for pitch in pitches} for field in key
+    }
+    # Descending so the oldest of any duplicated catalog rows wins.
+    for pitch in Pitch.objects.filter(**lookups).order_by("-pk"):
+        existing[pitch_key(pitch, key)] = pitch
+
+    new, new_paths, changed, matched, wanted = [], [], [], 0, {}
+    fields = list(PITCH_COLUMNS)
+    for pitch, pitch_paths in zip(pitches, paths):
+        current = existing.get(pitch_key(pitch, key))
+        if current is None:
+            new.append(pitch)
+            new_paths.append(pitch_paths)
+            continue
+        matched += 1
+        # Empty image columns leave the pitch's images as they are.
+        if pitch_paths:
+            wanted[current.pk] = pitch_paths
+        if any(
+            getattr(current, field) != getattr(pitch, field) for field in PITCH_COLUMNS
+        ):
+            if current.address != pitch.address:
+                # bulk_update skips the pre_save signal that drops coordinates
+                # of the old address; geocode_pitches locates it again.
+                current.latitude = current.longitude = current.geocell = None
+                fields = PITCH_COLUMNS + ["latitude", "longitude", "geocell"]
+            for field in PITCH_COLUMNS:
+                setattr(current, field, getattr(pitch, field))
+            changed.append(current)
+
+    Pitch.objects.bulk_update(changed, fields)
+    result.updated += len(changed)
+    result.unchanged += matched - len(changed)
+    touched = reconcile_images(wanted, result)
+    return new, new_paths, touched | {pitch.pk for pitch in changed}
+
+
+def image_errors(chunk, first_row=FIRST_ROW):
+    errors = []
+    for i, column in enumerate(IMAGE_COLUMNS, 1):
+        messages = too_long(chunk[column], "image", IMAGE_MAX_LENGTH)
+        for index, message in messages[messages != ""].items():
+            errors.append(
+                (index, f"Error at row {index + first_row}, image{i}: {message}")
+            )
+    return [message for _, message in sorted(errors)]
+
+
+def import_chunk(chunk, result, first_row=FIRST_ROW, key=None):
+    pitches = [
+        Pitch(
+            title=row.title,
+            description=row.description or None,
+            price=int(row.price),
+            address=row.address,
+            phone=row.phone or None,
+            size=row.size,
+            surface=row.surface,
+        )
+        for row in chunk.itertuples()
+    ]
+    paths = [
+        [path for path in row if path and len(path) <= IMAGE_MAX_LENGTH]
+        for row in chunk[IMAGE_COLUMNS].itertuples(index=False)
+    ]
+    errors = image_errors(chunk, first_row)
+
+    with transaction.atomic():
+        touched = set()
+        if key:
+            pitches, paths, touched = upsert_pitches(pitches, paths, key, result)
+        insert_pitches(pitches, paths, result)
+        # Bulk writes skip the signals that keep the listing cards current.
+        rebuild_pitch_cards(touched | {pitch.pk for pitch in pitches})
+
+    result.failed_images += len(errors)
+    result.image_errors += errors
+
+
+def import_pitch_frame(
+    df, result=None, batch_size=IMPORT_BATCH_SIZE, first_row=FIRST_ROW, key=None
+):
+    """Import the rows of ``df``, inserting them or, with a natural ``key``
+    such as ("title", "address"), updating the pitches that already exist.
+    """
+    result = result or ImportResult()
+    valid, errors = validate_pitch_frame(df)
+    if key:
+        valid, repeated = repeated_keys(valid, key, first_row)
+        errors = pd.concat([errors, repeated]).sort_index()
+    result.failed_pitches += len(errors)
+    result.errors += [
+        f"Error at row {index + first_row}: {message}"
+        for index, message in errors.items()
+    ]
+    for start in range(0, len(valid), batch_size):
+        chunk = valid.iloc[start : start + batch_size]
+        try:
+            import_chunk(chunk, result, first_row, key)
+        except OperationalError:
+            # Deadlocks and lost connections say nothing about the rows.
+            raise
+        except DatabaseError as e:
+            result.failed_pitches += len(chunk)
+            result.errors += [
+                f"Error at row {index + first_row}: {e}" for index in chunk.index
+            ]
+    return result
+
+
+def upload_source(uploaded_file):
+    # Uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are already spooled to disk;
+    # read them from there instead of through the file object.
+    if hasattr(uploaded_file, "temporary_file_path"):
+        return uploaded_file.temporary_file_path()
+    uploaded_file.seek(0)
+    return uploaded_file
+
+
+def read_xlsx_chunks(source, chunk_size=IMPORT_BATCH_SIZE, sheet_name=IMPORT_SHEET):
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = [str(name).strip() if name else "" for name in next(rows, ())]
+        chunk, indexes = [], []
+        for index, row in enumerate(rows):
+            if all(value is None for value in row):
+                continue
+            chunk.append(row[: len(header)])
+            # Index i is spreadsheet row i + FIRST_ROW, blank rows included.
+            indexes.append(index)
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=header, index=indexes)
+                chunk, indexes = [], []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, index=indexes)
+    finally:
+        workbook.close()
+
+
+def read_csv_chunks(source, chunk_size=IMPORT_BATCH_SIZE):
+    # dtype=str keeps values such as phone numbers exactly as written.
+    with pd.read_csv(
+        source, chunksize=chunk_size, dtype=str, encoding="utf-8-sig"
+    ) as reader:
+        for chunk in reader:
+            chunk.columns = [str(name).strip() for name in chunk.columns]
+            yield chunk
+
+
+def read_source_chunks(source, name, chunk_size=IMPORT_BATCH_SIZE):
+    if name.lower().endswith(".csv"):
+        return read_csv_chunks(source, chunk_size)
+    return read_xlsx_chunks(source, chunk_size)
+
+
+def read_pitch_chunks(uploaded_file, chunk_size=IMPORT_BATCH_SIZE):
+    """Yield the rows of an uploaded .xlsx or .csv file as DataFrames.
+
+    At most ``chunk_size`` rows are held at a time, whatever the file size.
+    """
+    return read_source_chunks(
+        upload_source(uploaded_file), uploaded_file.name, chunk_size
+    )
+
+
+def count_rows(path, name):
+    if name.lower().endswith(".csv"):
+        with open(path, "rb") as source:
+            return max(sum(1 for _ in source) - 1, 0)
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        # The sheet dimension is read from the file, not by walking the rows.
+        return max((workbook[IMPORT_SHEET].max_row or 1) - 1, 0)
+    finally:
+        workbook.close()
+
+
+def import_pitch_chunks(chunks, result=None, batch_size=IMPORT_BATCH_SIZE, key=None):
+    result = result or ImportResult()
+    for chunk in chunks:
+        import_pitch_frame(chunk, result, batch_size, key=key)
+    return result
+
+
+def validate_chunk(chunk, first_row=FIRST_ROW):
+    """Run the import validation on one chunk without touching the database.
+
+    Returns the number of valid rows and images and the error messages, so
+    only small results travel back from a worker process.
+    """
+    valid, errors = validate_pitch_frame(chunk)
+    images = sum(
+        1
+        for row in valid[IMAGE_COLUMNS].itertuples(index=False)
+        for path in row
+        if path and len(path) <= IMAGE_MAX_LENGTH
+    )
+    return (
+        len(valid),
+        images,
+        [
+            f"Error at row {index + first_row}: {message}"
+            for index, message in errors.items()
+        ],
+        image_errors(valid, first_row),
+    )
+
+
+def validate_in_pool(chunks, workers):
+    # Spawned workers do not inherit the parent's database connections.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    ) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(validate_chunk, chunk))
+            # Bound the chunks in flight so a large file is never read whole.
+            if len(pending) > workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def validate_pitch_chunks(chunks, workers=None):
+    """Dry run: validate every row of ``chunks`` and write nothing.
+
+    Chunks are spread over a process pool of ``workers`` processes, one per
+    core by default. The result counts the rows and images that would be
+    imported and lists every error in row order.
+    """
+    workers = workers or getattr(settings, "PITCH_VALIDATE_WORKERS", os.cpu_count())
+    chunks = iter(chunks)
+    head = list(islice(chunks, 2))
+    if workers > 1 and len(head) > 1:
+        reports = validate_in_pool(chain(head, chunks), workers)
+    else:
+        reports = map(validate_chunk, chain(head, chunks))
+
+    result = ImportResult()
+    for pitches, images, errors, failed_images in reports:
+        result.pitches += pitches
+        result.images += images
+        result.failed_pitches += len(errors)
+        result.failed_images += len(failed_images)
+        result.errors += errors
+        result.image_errors += failed_images
+    return result
+
+
+def upload_fingerprint(uploaded_file):
+    digest = hashlib.sha256()
+    for block in uploaded_file.chunks():
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def queue_import(uploaded_file, user, mode="i"):
+    fingerprint = upload_fingerprint(uploaded_file)
+    with transaction.atomic():
+        # Posting the same file again, e.g. after a proxy timeout, must not
+        # import its rows twice.
+        job = (
+            ImportJob.objects.select_for_update()
+            .filter(
+                requested_by=user,
+                fingerprint=fingerprint,
+                mode=mode,
+                status__in=["p", "r", "d"],
+                created_date__gte=timezone.now() - IMPORT_JOB_REUSE,
+            )
+            .order_by("-id")
+            .first()
+        )
+        if job:
+            return job, False
+        job = ImportJob.objects.create(
+            requested_by=user, file=uploaded_file, fingerprint=fingerprint, mode=mode
+        )
+    return job, True
+
+
+def claim_import_job():
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["p", "r"], lease_until__lte=now)
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = "r"
+        job.lease_until = now + IMPORT_JOB_LEASE
+        job.save(update_fields=["status", "lease_until"])
+    return job
+
+
+def checkpoint(job, chunk, batch_size):
+    key = natural_key() if job.mode == "u" else None
+    result = import_pitch_frame(chunk, batch_size=batch_size, key=key)
+    job.next_row = int(chunk.index[-1]) + 1
+    job.pitches += result.pitches
+    job.images += result.images
+    job.failed_pitches += result.failed_pitches
+    job.failed_images += result.failed_images
+    job.updated_pitches += result.updated
+    job.unchanged_pitches += result.unchanged
+    job.removed_images += result.removed_images
+    errors = ["PitchData import: %s" % error for error in result.errors] + [
+        "PitchImages import: %s" % error for error in result.image_errors
+    ]
+    job.errors += errors[: max(MAX_JOB_ERRORS - len(job.errors), 0)]
+    job.lease_until = timezone.now() + IMPORT_JOB_LEASE
+    job.save(
+        update_fields=[
+            "next_row",
+            "pitches",
+            "images",
+            "failed_pitches",
+            "failed_images",
+            "updated_pitches",
+            "unchanged_pitches",
+            "removed_images",
+            "errors",
+            "lease_until",
+        ]
+    )
+
+
+def run_import_job(job, chunk_size=IMPORT_BATCH_SIZE):
+    try:
+        if not job.total_rows:
+            job.total_rows = count_rows(job.file.path, job.file.name)
+            job.save(update_fields=["total_rows"])
+        for chunk in read_source_chunks(job.file.path, job.file.name, chunk_size):
+            # Rows before the checkpoint were committed by an earlier run.
+            chunk = chunk[chunk.index >= job.next_row]
+            if chunk.empty:
+                continue
+            # The rows and the checkpoint commit together, so a crash
+            # between chunks neither loses nor repeats rows.
+            with transaction.atomic():
+                checkpoint(job, chunk, chunk_size)
+    except (OperationalError, InterfaceError) as e:
+        # Reconnect if the error dropped the connection.
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+        job.attempts += 1
+        if job.attempts < IMPORT_JOB_MAX_ATTEMPTS:
+            # Left pending: a later run resumes from the checkpoint once the
+            # lease ends.
+            logger.warning("Import job %s attempt %d: %s", job.pk, job.attempts, e)
+            job.status = "p"
+            job.save(update_fields=["status", "attempts"])
+            return False
+        logger.error("Import job %s failed: %s", job.pk, e)
+        job.errors.append("Database error: %s" % e)
+        job.status = "f"
+    except Exception as e:
+        logger.error("Import job %s failed: %s", job.pk, e)
+        job.errors.append("Error reading sheets: %s" % e)
+        job.status = "f"
+    else:
+        job.status = "d"
+    job.finished_date = timezone.now()
+    job.save(update_fields=["status", "errors", "attempts", "finished_date"])
+    return job.status == "d"
+
+
+def drain_import_jobs(chunk_size=IMPORT_BATCH_SIZE):
+    done = failed = 0
+    while True:
+        job = claim_import_job()
+        if job is None:
+            return done, failed
+        if run_import_job(job, chunk_size):
+            done += 1
+        elif job.status == "f":
+            failed += 1
@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from pitch.availability import is_available
+from pitch.models import Order, Pitch
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_is_available(pitch, start, end):
+    ordered = (
+        Order.objects.filter(pitch=pitch, time_start__lt=end, time_end__gte=end)
+        | Order.objects.filter(pitch=pitch, time_start__lte=start, time_end__gt=start)
+        | Order.objects.filter(pitch=pitch, time_start__gte=start, time_end__lte=end)
+    )
+    return not ordered.exists()
+
+
+class Command(BaseCommand):
+    help = "Compare the legacy and indexed order conflict checks on one pitch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100000)
+        parser.add_argument("--checks", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rnd = random.Random(options["seed"])
+        renter = User.objects.create_user("bench_availability", None, "bench")
+        pitch = Pitch.objects.create(
+            title="Bench availability", address="Bench", price=100000
+        )
+
+        begin = timezone.now() - timedelta(hours=options["orders"])
+        orders = []
+        for i in range(options["orders"]):
+            start = begin + timedelta(hours=i)
+            orders.append(
+                Order(
+                    pitch=pitch,
+                    renter=renter,
+                    time_start=start,
+                    time_end=start + timedelta(hours=1),
+                    status=rnd.choice("ocd"),
+                    price=pitch.price,
+                    cost=pitch.price,
+                )
+            )
+        Order.objects.bulk_create(orders, batch_size=5000)
+        self.stdout.write("Inserted %d orders" % len(orders))
+
+        windows = []
+        for _ in range(options["checks"]):
+            start = begin + timedelta(minutes=rnd.randrange(options["orders"] * 60))
+            windows.append(
+                (start, start + timedelta(minutes=rnd.choice([60, 90, 120])))
+            )
+
+        for label, check in (
+            ("legacy", legacy_is_available),
+            ("indexed", is_available),
+        ):
+            timings = []
+            for start, end in windows:
+                tick = time.perf_counter()
+                check(pitch, start, end)
+                timings.append((time.perf_counter() - tick) * 1000)
+            timings.sort()
+            self.stdout.write(
+                "%-8s mean %.3f ms  p50 %.3f ms  p95 %.3f ms"
+                % (
+                    label,
+                    statistics.mean(timings),
+                    timings[len(timings) // 2],
+                    timings[int(len(timings) * 0.95)],
+                )
+            )
@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from pitch.booking import SlotUnavailable, book_pitch
+from pitch.models import Order, Pitch
+
+
+class Command(BaseCommand):
+    help = "Book overlapping slots of one pitch from many threads at once"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--attempts", type=int, default=50)
+        parser.add_argument("--slots", type=int, default=40)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        pitch = Pitch.objects.create(
+            title="Bench booking", address="Bench", price=100000
+        )
+        renters = [
+            User.objects.create_user("bench_booking_%d" % i, None, "bench")
+            for i in range(options["threads"])
+        ]
+        begin = timezone.now().replace(minute=0, second=0, microsecond=0)
+        begin += timedelta(days=1)
+        stats = {"booked": 0, "unavailable": 0, "failed": 0}
+        lock = threading.Lock()
+
+        def worker(index, renter):
+            rnd = random.Random(options["seed"] + index)
+            try:
+                for _ in range(options["attempts"]):
+                    start = begin + timedelta(
+                        minutes=30 * rnd.randrange(options["slots"])
+                    )
+                    end = start + timedelta(minutes=rnd.choice([60, 90, 120]))
+                    try:
+                        book_pitch(pitch, renter, start, end)
+                        result = "booked"
+                    except SlotUnavailable:
+                        result = "unavailable"
+                    except Exception:
+                        result = "failed"
+                    with lock:
+                        stats[result] += 1
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(index, renter))
+            for index, renter in enumerate(renters)
+        ]
+        tick = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - tick
+
+        live = Order.objects.filter(pitch=pitch).exclude(status="d")
+        double_booked = live.filter(
+            Exists(
+                live.filter(
+                    time_start__lt=OuterRef("time_end"),
+                    time_end__gt=OuterRef("time_start"),
+                ).exclude(pk=OuterRef("pk"))
+            )
+        ).count()
+
+        attempts = sum(stats.values())
+        self.stdout.write(
+            "%d attempts in %.2f s (%.1f/s): %d booked, %d unavailable, %d failed"
+            % (
+                attempts,
+                elapsed,
+                attempts / elapsed,
+                stats["booked"],
+                stats["unavailable"],
+                stats["failed"],
+            )
+        )
+        self.stdout.write("Double booked orders: %d" % double_booked)
+
+        Pitch.objects.filter(pk=pitch.pk).delete()
+        User.objects.filter(pk__in=[renter.pk for renter in renters]).delete()
+
+        if double_booked:
+            raise CommandError("Found %d double booked orders" % double_booked)
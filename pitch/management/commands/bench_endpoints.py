@@ -0,0 +1,326 @@
+import json
+import os
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from account.models import EmailVerify
+from pitch.models import Comment, Favorite, Pitch
+from pitch.suggest import rebuild_suggest_index
+
+# method, path and payload are called with the bench context on every run.
+Endpoint = namedtuple("Endpoint", "name method path payload status anonymous")
+BENCH_PASSWORD = "Bench-pass-2023"
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def endpoint(name, path, method="get", payload=None, status=200, anonymous=False):
+    return Endpoint(
+        name, method, path, payload or (lambda ctx: None), status, anonymous
+    )
+
+
+def verify_token(ctx, type):
+    return EmailVerify.objects.create(
+        token=uuid.uuid4(), user=ctx["user"], type=type
+    ).token
+
+
+ENDPOINTS = [
+    endpoint("index", lambda ctx: reverse("index")),
+    endpoint("index_anonymous", lambda ctx: reverse("index"), anonymous=True),
+    endpoint(
+        "pitch_detail", lambda ctx: reverse("pitch-detail", args=[ctx["pitch"].pk])
+    ),
+    endpoint(
+        "search_view",
+        lambda ctx: reverse("search") + "?size=1&surface=a&price=1000000",
+    ),
+    endpoint(
+        "search_view_near",
+        lambda ctx: reverse("search") + "?near=21.03,105.85&radius=3&size=1",
+    ),
+    endpoint("my_ordered", lambda ctx: reverse("my-ordered")),
+    endpoint("favorite_pitches", lambda ctx: reverse("favorite_pitches")),
+    endpoint("admin_statistics", lambda ctx: reverse("admin:statistics")),
+    endpoint(
+        "admin_statistic_pitch",
+        lambda ctx: reverse("admin:statistic-pitch", args=[ctx["pitch"].pk]),
+    ),
+    endpoint(
+        "api_users_login",
+        lambda ctx: reverse("users_login"),
+        "post",
+        lambda ctx: {"username": ctx["user"].username, "password": BENCH_PASSWORD},
+        status=201,
+        anonymous=True,
+    ),
+    endpoint(
+        "api_user_change_password",
+        lambda ctx: reverse("user-change-password"),
+        "post",
+        lambda ctx: {"username": ctx["user"].username, "email": ctx["user"].email},
+    ),
+    endpoint(
+        "api_verify_change_password",
+        lambda ctx: reverse("verify-change-password", args=[verify_token(ctx, "1")]),
+        "put",
+        lambda ctx: {"password": BENCH_PASSWORD, "password_confirm": BENCH_PASSWORD},
+    ),
+    endpoint("api_change_info", lambda ctx: reverse("user-change-info"), "post"),
+    endpoint(
+        "api_verify_change_info",
+        lambda ctx: reverse("verify-change-info", args=[verify_token(ctx, "2")]),
+        "put",
+        lambda ctx: {"first_name": "Bench"},
+    ),
+    endpoint("api_user_favorite_list", lambda ctx: reverse("user_favorite_list")),
+    endpoint(
+        "api_toggle_favorite_pitch",
+        lambda ctx: reverse("toggle-favorite-pitch", args=[ctx["pitch"].pk]),
+        "post",
+    ),
+    endpoint(
+        "api_revenue_statistic",
+        lambda ctx: reverse("api-revenue-statistic") + "?status=c",
+    ),
+    endpoint(
+        "api_revenue_series",
+        lambda ctx: reverse("api-revenue-series")
+        + "?from=%s&to=%s&granularity=week" % ctx["year"],
+    ),
+    endpoint("api_order_rate", lambda ctx: reverse("api-statistic-order-rate")),
+    endpoint(
+        "api_create_reply",
+        lambda ctx: reverse("create-reply", args=[ctx["comment"].pk]),
+        "post",
+        lambda ctx: {"comment": "Bench reply"},
+        status=201,
+    ),
+    endpoint(
+        "api_list_comments",
+        lambda ctx: reverse("list-pitch-comments", args=[ctx["pitch"].pk]),
+    ),
+    endpoint(
+        "api_search_pitches",
+        lambda ctx: reverse("api-search-pitches") + "?size=1&price=1000000",
+    ),
+    endpoint(
+        "api_suggest_pitches",
+        lambda ctx: reverse("api-suggest-pitches") + "?q=seed pitch 1",
+        anonymous=True,
+    ),
+    endpoint(
+        "api_pitch_availability",
+        lambda ctx: reverse("pitch-availability", args=[ctx["pitch"].pk]),
+    ),
+]
+
+
+def percentile(timings, share):
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+class Command(BaseCommand):
+    help = "Measure endpoint latency and query counts against the budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budgets",
+            default=os.path.join(settings.BASE_DIR, "bench_budgets.json"),
+            help="JSON file mapping endpoint names to queries and p95_ms",
+        )
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--only", nargs="+", help="Endpoint names to run")
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Write the measured values to the budgets file",
+        )
+        parser.add_argument(
+            "--timing",
+            action="store_true",
+            help="Also fail when p95 exceeds p95_ms; timings vary between "
+            "machines, so only query counts are checked by default",
+        )
+        parser.add_argument(
+            "--headroom",
+            type=float,
+            default=2.0,
+            help="Latency budget written by --update, as a multiple of p95",
+        )
+
+    def handle(self, *args, **options):
+        endpoints = [
+            endpoint
+            for endpoint in ENDPOINTS
+            if not options["only"] or endpoint.name in options["only"]
+        ]
+        budgets = {}
+        if os.path.exists(options["budgets"]):
+            with open(options["budgets"]) as budgets_file:
+                budgets = json.load(budgets_file)
+
+        # Requests run on this thread's connection, so everything they write
+        # is rolled back with the bench data.
+        try:
+            with transaction.atomic():
+                results = self.run(endpoints, options["runs"])
+                raise Rollback()
+        except Rollback:
+            pass
+
+        if options["update"]:
+            for name, result in results.items():
+                budgets[name] = {
+                    "queries": result["queries"],
+                    "p95_ms": round(result["p95"] * options["headroom"], 1),
+                }
+            with open(options["budgets"], "w") as budgets_file:
+                json.dump(budgets, budgets_file, indent=2, sort_keys=True)
+                budgets_file.write("\n")
+            self.stdout.write(
+                "Wrote %d budgets to %s" % (len(results), options["budgets"])
+            )
+            return
+
+        failures = []
+        for name, result in results.items():
+            problems = self.check_budget(result, budgets.get(name), options["timing"])
+            failures += ["%s: %s" % (name, problem) for problem in problems]
+            self.stdout.write(
+                "%-28s p50 %8.1f ms  p95 %8.1f ms  %4d queries  %s"
+                % (
+                    name,
+                    result["p50"],
+                    result["p95"],
+                    result["queries"],
+                    "; ".join(problems) or ("ok" if name in budgets else "no budget"),
+                )
+            )
+        if failures:
+            raise CommandError(
+                "%d budget(s) exceeded:\n%s" % (len(failures), "\n".join(failures))
+            )
+
+    def check_budget(self, result, budget, timing=False):
+        problems = []
+        if result["status"] != result["expected"]:
+            problems.append(
+                "status %d, expected %d" % (result["status"], result["expected"])
+            )
+        if budget is None:
+            return problems
+        if result["queries"] > budget["queries"]:
+            problems.append(
+                "%d queries, budget %d" % (result["queries"], budget["queries"])
+            )
+        if timing and result["p95"] > budget["p95_ms"]:
+            problems.append(
+                "p95 %.1f ms, budget %.1f ms" % (result["p95"], budget["p95_ms"])
+            )
+        return problems
+
+    def context(self):
+        user = (
+            User.objects.annotate(orders=Count("order"))
+            .order_by("-orders", "pk")
+            .first()
+        )
+        pitch = (
+            Pitch.objects.annotate(orders=Count("order"))
+            .order_by("-orders", "pk")
+            .first()
+        )
+        if user is None or pitch is None:
+            raise CommandError(
+                "Nothing to measure; load a dataset first, "
+                "e.g. python manage.py seed --users 10000"
+            )
+        # The busiest renter browses as an admin, so every page is reachable.
+        user.is_staff = user.is_superuser = True
+        user.set_password(BENCH_PASSWORD)
+        user.save()
+        Favorite.objects.get_or_create(renter=user, pitch=pitch)
+        comment = Comment.objects.filter(
+            pitch=pitch, parent__isnull=True
+        ).first() or Comment.objects.create(
+            renter=user, pitch=pitch, rating=5, comment="Bench comment"
+        )
+        today = timezone.localdate()
+        return {
+            "user": user,
+            "pitch": pitch,
+            "comment": comment,
+            "year": (today - timedelta(days=365), today),
+        }
+
+    def request(self, client, endpoint, ctx):
+        return getattr(client, endpoint.method)(
+            endpoint.path(ctx),
+            endpoint.payload(ctx),
+            content_type="application/json",
+        )
+
+    def run(self, endpoints, runs):
+        ctx = self.context()
+        # Requests only start the rebuild in a background thread; build it
+        # here so it does not run alongside the timed requests.
+        rebuild_suggest_index()
+        clients = {
+            False: Client(raise_request_exception=False),
+            True: Client(raise_request_exception=False),
+        }
+        results = {}
+        for endpoint in endpoints:
+            client = clients[endpoint.anonymous]
+            if endpoint.anonymous:
+                # The login endpoint leaves a session behind.
+                client.logout()
+            else:
+                # Changing the password ends the session it was made from.
+                ctx["user"].refresh_from_db()
+                client.force_login(ctx["user"])
+            # The first request warms the caches and counts the queries.
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                response = self.request(client, endpoint, ctx)
+            timings = []
+            for _ in range(runs):
+                if endpoint.anonymous:
+                    # Undo the login endpoint's session between runs.
+                    client.logout()
+                tick = time.perf_counter()
+                self.request(client, endpoint, ctx)
+                timings.append((time.perf_counter() - tick) * 1000)
+            timings.sort()
+            results[endpoint.name] = {
+                "status": response.status_code,
+                "expected": endpoint.status,
+                "queries": queries.count,
+                "p50": percentile(timings, 0.5),
+                "p95": percentile(timings, 0.95),
+            }
+        return results
@@ -0,0 +1,139 @@
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from pitch.importer import import_pitch_chunks, import_pitch_frame, read_xlsx_chunks
+from pitch.models import Image, Pitch
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def legacy_import(df):
+    for _, row in df.iterrows():
+        pitch = Pitch(
+            title=row["title"],
+            description=row["description"],
+            price=row["price"],
+            address=row["address"],
+            phone=row["phone"],
+            size=row["size"],
+            surface=row["surface"],
+        )
+        pitch.full_clean()
+        pitch.save()
+        for i in range(1, 4):
+            image = Image(image=row[f"image{i}"], pitch=pitch)
+            image.full_clean()
+            image.save()
+
+
+class Command(BaseCommand):
+    help = "Measure the pitch import pipeline on a generated workbook"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--legacy-rows",
+            type=int,
+            default=500,
+            help="Rows to run through the old per-row path for comparison",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        df = pd.DataFrame(
+            [
+                {
+                    "address": "Bench address %d" % i,
+                    "title": "Bench pitch %d" % i,
+                    "description": "Generated by bench_import",
+                    "phone": "09%08d" % rnd.randrange(10**8),
+                    "size": rnd.choice("123"),
+                    # About one row in a hundred is rejected.
+                    "surface": rnd.choice("anm") if rnd.random() > 0.01 else "x",
+                    "price": rnd.randrange(1000, 10000) * 100,
+                    "image1": "uploads/bench/%d_1.jpg" % i,
+                    "image2": "uploads/bench/%d_2.jpg" % i,
+                    "image3": "uploads/bench/%d_3.jpg" % i,
+                }
+                for i in range(options["rows"])
+            ]
+        )
+        path = os.path.join(tempfile.mkdtemp(), "bench_import.xlsx")
+        df.to_excel(path, sheet_name="PitchData", index=False)
+
+        tick = time.perf_counter()
+        df = pd.read_excel(path, sheet_name="PitchData")
+        self.report("read", len(df), time.perf_counter() - tick)
+
+        counter = QueryCounter()
+        try:
+            with transaction.atomic(), connection.execute_wrapper(counter):
+                tick = time.perf_counter()
+                result = import_pitch_frame(df, batch_size=options["batch_size"])
+                self.report("bulk", len(df), time.perf_counter() - tick, counter.count)
+                self.stdout.write(
+                    "%d pitches, %d images, %d rejected rows"
+                    % (result.pitches, result.images, result.failed_pitches)
+                )
+
+                counter.count = 0
+                tick = time.perf_counter()
+                # The path is what a spooled upload hands to the reader.
+                result = import_pitch_chunks(
+                    read_xlsx_chunks(path, options["batch_size"]),
+                    batch_size=options["batch_size"],
+                )
+                self.report(
+                    "streamed",
+                    result.pitches + result.failed_pitches,
+                    time.perf_counter() - tick,
+                    counter.count,
+                )
+
+                sample = df[df["surface"] != "x"].head(options["legacy_rows"])
+                if len(sample):
+                    counter.count = 0
+                    tick = time.perf_counter()
+                    legacy_import(sample)
+                    self.report(
+                        "per row",
+                        len(sample),
+                        time.perf_counter() - tick,
+                        counter.count,
+                    )
+                raise Rollback()
+        except Rollback:
+            pass
+        finally:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+
+    def report(self, label, rows, elapsed, queries=None):
+        line = "%-8s %d rows in %.2f s (%.0f rows/s)" % (
+            label,
+            rows,
+            elapsed,
+            rows / elapsed,
+        )
+        if queries is not None:
+            line += ", %d queries" % queries
+        self.stdout.write(line)
@@ -0,0 +1,37 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pitch.geo import GEOCODE_BATCH_SIZE, geocode_pitches, read_geocodes
+
+
+class Command(BaseCommand):
+    help = "Fill pitch coordinates from an offline table of geocoded addresses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table",
+            default=getattr(
+                settings,
+                "PITCH_GEOCODE_TABLE",
+                os.path.join(settings.BASE_DIR, "pitch", "data", "geocodes.csv"),
+            ),
+            help="CSV file with address, latitude and longitude columns",
+        )
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Geocode pitches that already have coordinates too",
+        )
+        parser.add_argument("--batch-size", type=int, default=GEOCODE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        located, missing = geocode_pitches(
+            read_geocodes(options["table"]),
+            overwrite=options["overwrite"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(
+            "Located %d pitches, %d addresses not in the table" % (located, missing)
+        )
@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pitch.importer import (
+    IMPORT_BATCH_SIZE,
+    import_pitch_chunks,
+    natural_key,
+    read_source_chunks,
+    validate_pitch_chunks,
+)
+
+
+class Command(BaseCommand):
+    help = "Import or re-sync pitches from an .xlsx or .csv file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Update the pitches whose natural key already exists",
+        )
+        parser.add_argument(
+            "--key", help="Comma separated natural key, e.g. title,address"
+        )
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate every row and report the errors without writing",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Processes validating a dry run, one per core by default",
+        )
+
+    def handle(self, *args, **options):
+        key = None
+        if options["upsert"]:
+            fields = options["key"].split(",") if options["key"] else None
+            try:
+                key = natural_key(fields)
+            except ValueError as e:
+                raise CommandError(e)
+
+        tick = time.perf_counter()
+        if options["dry_run"]:
+            result = validate_pitch_chunks(
+                read_source_chunks(
+                    options["path"], options["path"], options["chunk_size"]
+                ),
+                workers=options["workers"],
+            )
+            for error in result.errors + result.image_errors:
+                self.stderr.write(error)
+            self.stdout.write(
+                "Dry run: %d valid, %d failed pitches; %d valid, %d failed images "
+                "in %.2f s"
+                % (
+                    result.pitches,
+                    result.failed_pitches,
+                    result.images,
+                    result.failed_images,
+                    time.perf_counter() - tick,
+                )
+            )
+            return
+
+        result = import_pitch_chunks(
+            read_source_chunks(options["path"], options["path"], options["chunk_size"]),
+            batch_size=options["chunk_size"],
+            key=key,
+        )
+        for error in result.errors + result.image_errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            "%d created, %d updated, %d unchanged, %d failed pitches; "
+            "%d images added, %d removed in %.2f s"
+            % (
+                result.pitches,
+                result.updated,
+                result.unchanged,
+                result.failed_pitches,
+                result.images,
+                result.removed_images,
+                time.perf_counter() - tick,
+            )
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pitch.cards import CARD_BATCH_SIZE, rebuild_pitch_cards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pitch cards shown on the listing pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=CARD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = rebuild_pitch_cards(batch_size=options["batch_size"])
+        self.stdout.write("Rebuilt %d pitch cards" % count)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from pitch.availability import days_between, day_bounds, slots_mask
+from pitch.models import Order, PitchDaySlots
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-day slot bitmaps from live orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        calendar = {}
+        orders = (
+            Order.objects.exclude(status="d")
+            .order_by()
+            .values_list("pitch_id", "time_start", "time_end")
+        )
+        for pitch_id, start, end in orders.iterator(chunk_size=options["batch_size"]):
+            for day in days_between(start, end):
+                key = (pitch_id, day)
+                calendar[key] = calendar.get(key, 0) | slots_mask(
+                    day_bounds(day)[0], start, end
+                )
+
+        with transaction.atomic():
+            PitchDaySlots.objects.all().delete()
+            PitchDaySlots.objects.bulk_create(
+                [
+                    PitchDaySlots(pitch_id=pitch_id, day=day, slots=slots)
+                    for (pitch_id, day), slots in calendar.items()
+                ],
+                batch_size=options["batch_size"],
+            )
+        self.stdout.write("Rebuilt %d pitch day slots" % len(calendar))
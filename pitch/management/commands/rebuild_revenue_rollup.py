@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from pitch.models import Order, PitchDailyRevenue
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-day pitch revenue rollup from the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        totals = (
+            Order.objects.order_by()
+            .annotate(
+                day=TruncDate("time_start", tzinfo=timezone.get_current_timezone())
+            )
+            .values("pitch_id", "day", "status")
+            .annotate(revenue=Sum("cost"), count_order=Count("id"))
+        )
+        with transaction.atomic():
+            PitchDailyRevenue.objects.all().delete()
+            rows = PitchDailyRevenue.objects.bulk_create(
+                (PitchDailyRevenue(**row) for row in totals.iterator()),
+                batch_size=options["batch_size"],
+            )
+        self.stdout.write("Rebuilt %d pitch daily revenues" % len(rows))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pitch.textindex import index_path, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Write a fresh snapshot of the pitch keyword search index"
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write("Indexed %d pitches into %s" % (count, index_path()))
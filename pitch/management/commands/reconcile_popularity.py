@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pitch.cards import CARD_BATCH_SIZE, reconcile_popularity
+
+
+class Command(BaseCommand):
+    help = "Reset the pitch popularity counters that drifted from the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=CARD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fixed = reconcile_popularity(options["batch_size"])
+        self.stdout.write("Fixed %d pitch cards" % fixed)
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pitch.export import EXPORT_CHUNK_SIZE, purge_exports, run_export_jobs
+
+
+class Command(BaseCommand):
+    help = "Write the files of the queued export jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument(
+            "--pause-ms",
+            type=float,
+            default=20,
+            help="Sleep between chunks to leave database time for bookings",
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep polling jobs")
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_exports()
+            if purged:
+                self.stdout.write("Purged %d old exports" % purged)
+            done, failed = run_export_jobs(
+                options["workers"], options["chunk_size"], options["pause_ms"] / 1000
+            )
+            if done or failed:
+                self.stdout.write("Exported %d jobs, %d failed" % (done, failed))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pitch.importer import IMPORT_BATCH_SIZE, drain_import_jobs
+
+
+class Command(BaseCommand):
+    help = "Import the queued pitch spreadsheets, resuming from checkpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep polling jobs")
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = drain_import_jobs(options["chunk_size"])
+            if done or failed:
+                self.stdout.write("Imported %d jobs, %d failed" % (done, failed))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
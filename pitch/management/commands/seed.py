@@ -1,13 +1,27 @@
+import datetime
 import json
 import random,string
+import time
 import numpy as np
 import os
 import pandas as pd
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from pitch.models import Pitch
+from django.db import transaction
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+from pitch.cards import rebuild_pitch_cards
+from pitch.geo import geohash
+from pitch.models import Comment, Favorite, Image, Order, Pitch, PitchRating, Voucher
 from lorem_text import lorem
 from django.contrib.staticfiles import finders
 import xlwt
+
+SEED_CENTER = (21.0285, 105.8542)
+
+
 class Command(BaseCommand):
     help = 'Seed dữ liệu cho mô hình Pitch'
 
@@ -72,7 +86,270 @@ class Command(BaseCommand):
         return pitches_data
 
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="Generate a dataset in the database instead of the fixture files",
+        )
+        parser.add_argument("--pitches", type=int, default=100)
+        parser.add_argument("--images-per-pitch", type=int, default=3)
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--comments", type=int, default=1000)
+        parser.add_argument(
+            "--reply-ratio",
+            type=float,
+            default=0.3,
+            help="Share of the comments posted as replies",
+        )
+        parser.add_argument("--favorites", type=int, default=1000)
+        parser.add_argument("--vouchers", type=int, default=20)
+        parser.add_argument(
+            "--start",
+            type=datetime.date.fromisoformat,
+            default=datetime.date(2023, 1, 1),
+            help="First day of the generated orders (YYYY-MM-DD)",
+        )
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def bulk_load(self, model, rows, batch_size):
+        tick = time.perf_counter()
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                model.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        count += len(batch)
+        self.stdout.write(
+            "%-14s %d rows in %.2f s"
+            % (model._meta.db_table, count, time.perf_counter() - tick)
+        )
+
+    def next_pk(self, model):
+        # Explicit primary keys let the rows reference each other without
+        # reading the inserted ids back.
+        return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+    def generate_users(self, rnd, first, count):
+        # Hashing once keeps a million users cheap; every password is admin@123.
+        password = make_password("admin@123")
+        for pk in range(first, first + count):
+            yield User(
+                pk=pk,
+                username=f"seed{pk}",
+                email=f"seed{pk}@example.com",
+                password=password,
+                is_active=True,
+            )
+
+    def generate_pitches(self, rnd, first, count):
+        for pk in range(first, first + count):
+            # Spread over inner Hanoi, so "near" searches have work to do.
+            latitude = round(SEED_CENTER[0] + rnd.uniform(-0.1, 0.1), 6)
+            longitude = round(SEED_CENTER[1] + rnd.uniform(-0.1, 0.1), 6)
+            yield Pitch(
+                pk=pk,
+                address="%d Seed street, District %d"
+                % (rnd.randint(1, 500), rnd.randint(1, 12)),
+                title=f"Seed pitch {pk}",
+                description=lorem.words(15),
+                phone=self.generate_random_phone(),
+                size=rnd.choice(["1", "2", "3"]),
+                surface=rnd.choice(["a", "n", "m"]),
+                price=rnd.randint(10, 100) * 10000,
+                latitude=latitude,
+                longitude=longitude,
+                geocell=geohash(latitude, longitude),
+            )
+
+    def generate_images(self, first, pitch_ids, per_pitch):
+        pk = first
+        for pitch_id in pitch_ids:
+            for i in range(1, per_pitch + 1):
+                yield Image(
+                    pk=pk, image=f"uploads/seed/{pitch_id}_{i}.jpg", pitch_id=pitch_id
+                )
+                pk += 1
+
+    def generate_orders(self, rnd, first, count, pitches, user_ids, start, days):
+        # Hourly slots from 06:00 to 24:00; every pitch gets distinct slots,
+        # so the generated calendar has no double bookings.
+        opening, hours = 6, 18
+        capacity = days * hours
+        # Popularity follows a long tail so the rankings have a clear top.
+        weights = [1 / (rank + 1) for rank in range(len(pitches))]
+        per_pitch = [0] * len(pitches)
+        remaining = min(count, capacity * len(pitches))
+        while remaining:
+            # Orders beyond a full calendar go to the pitches with free slots.
+            free = [i for i, booked in enumerate(per_pitch) if booked < capacity]
+            for index in rnd.choices(free, [weights[i] for i in free], k=remaining):
+                if per_pitch[index] < capacity:
+                    per_pitch[index] += 1
+                    remaining -= 1
+        tz = timezone.get_current_timezone()
+        midnight = datetime.datetime.combine(start, datetime.time(), tzinfo=tz)
+        pk = first
+        for (pitch_id, price), booked in zip(pitches, per_pitch):
+            for slot in sorted(rnd.sample(range(capacity), booked)):
+                day, hour = divmod(slot, hours)
+                time_start = midnight + datetime.timedelta(
+                    days=day, hours=opening + hour
+                )
+                yield Order(
+                    pk=pk,
+                    time_start=time_start,
+                    time_end=time_start + datetime.timedelta(hours=1),
+                    status=rnd.choices(["c", "o", "d"], [70, 20, 10])[0],
+                    price=price,
+                    cost=price,
+                    renter_id=rnd.choice(user_ids),
+                    pitch_id=pitch_id,
+                )
+                pk += 1
+
+    def generate_comments(self, rnd, first, count, reply_ratio, user_ids, pitch_ids):
+        replies = int(count * reply_ratio)
+        top_level = min(count - replies, len(user_ids) * len(pitch_ids))
+        pk = first
+        threads = []
+        # One rated comment per renter and pitch, like the pitch page allows.
+        for pair in rnd.sample(range(len(user_ids) * len(pitch_ids)), top_level):
+            user_index, pitch_index = divmod(pair, len(pitch_ids))
+            threads.append((pk, pitch_ids[pitch_index]))
+            yield Comment(
+                pk=pk,
+                renter_id=user_ids[user_index],
+                pitch_id=pitch_ids[pitch_index],
+                rating=rnd.choices([1, 2, 3, 4, 5], [5, 5, 15, 35, 40])[0],
+                comment=lorem.words(rnd.randint(5, 20)),
+            )
+            pk += 1
+        for _ in range(replies if threads else 0):
+            # Replying to any earlier comment builds threads of varying depth.
+            parent_id, pitch_id = rnd.choice(threads)
+            threads.append((pk, pitch_id))
+            yield Comment(
+                pk=pk,
+                renter_id=rnd.choice(user_ids),
+                pitch_id=pitch_id,
+                parent_id=parent_id,
+                comment=lorem.words(rnd.randint(3, 10)),
+            )
+            pk += 1
+
+    def generate_favorites(self, rnd, count, user_ids, pitch_ids):
+        for pair in rnd.sample(
+            range(len(user_ids) * len(pitch_ids)),
+            min(count, len(user_ids) * len(pitch_ids)),
+        ):
+            user_index, pitch_index = divmod(pair, len(pitch_ids))
+            yield Favorite(
+                renter_id=user_ids[user_index], pitch_id=pitch_ids[pitch_index]
+            )
+
+    def generate_vouchers(self, rnd, count):
+        for i in range(1, count + 1):
+            yield Voucher(
+                name=f"Seed voucher {i}",
+                min_cost=rnd.randint(1, 20) * 100000,
+                discount=rnd.randint(1, 10) * 10000,
+                count=rnd.randint(1, 1000),
+            )
+
+    def rebuild_ratings(self, pitch_ids):
+        ratings = (
+            Comment.objects.filter(pitch_id__in=pitch_ids, parent__isnull=True)
+            .values("pitch_id")
+            .annotate(avg=Avg("rating"), count=Count("id"))
+            .order_by()
+        )
+        PitchRating.objects.filter(pitch_id__in=pitch_ids).delete()
+        PitchRating.objects.bulk_create(
+            PitchRating(
+                pitch_id=row["pitch_id"],
+                avg_rating=round(row["avg"], 1),
+                count_comment=row["count"],
+            )
+            for row in ratings
+        )
+
+    def generate_dataset(self, options):
+        rnd = random.Random(options["seed"])
+        # lorem_text draws from the global generator.
+        random.seed(options["seed"])
+        batch_size = options["batch_size"]
+        first_user = self.next_pk(User)
+        first_pitch = self.next_pk(Pitch)
+        user_ids = list(range(first_user, first_user + options["users"]))
+        pitch_ids = list(range(first_pitch, first_pitch + options["pitches"]))
+        with transaction.atomic():
+            self.bulk_load(
+                User, self.generate_users(rnd, first_user, options["users"]), batch_size
+            )
+            pitches = list(self.generate_pitches(rnd, first_pitch, options["pitches"]))
+            self.bulk_load(Pitch, pitches, batch_size)
+            self.bulk_load(
+                Image,
+                self.generate_images(
+                    self.next_pk(Image), pitch_ids, options["images_per_pitch"]
+                ),
+                batch_size,
+            )
+            self.bulk_load(
+                Voucher, self.generate_vouchers(rnd, options["vouchers"]), batch_size
+            )
+            if user_ids and pitch_ids:
+                self.bulk_load(
+                    Order,
+                    self.generate_orders(
+                        rnd,
+                        self.next_pk(Order),
+                        options["orders"],
+                        [(pitch.pk, pitch.price) for pitch in pitches],
+                        user_ids,
+                        options["start"],
+                        options["days"],
+                    ),
+                    batch_size,
+                )
+                self.bulk_load(
+                    Comment,
+                    self.generate_comments(
+                        rnd,
+                        self.next_pk(Comment),
+                        options["comments"],
+                        options["reply_ratio"],
+                        user_ids,
+                        pitch_ids,
+                    ),
+                    batch_size,
+                )
+                self.bulk_load(
+                    Favorite,
+                    self.generate_favorites(
+                        rnd, options["favorites"], user_ids, pitch_ids
+                    ),
+                    batch_size,
+                )
+            # bulk_create skips the signals that keep these tables in step.
+            self.rebuild_ratings(pitch_ids)
+            rebuild_pitch_cards(pitch_ids)
+        call_command("rebuild_pitch_slots", batch_size=batch_size, stdout=self.stdout)
+        call_command(
+            "rebuild_revenue_rollup", batch_size=batch_size, stdout=self.stdout
+        )
+
     def handle(self, *args, **kwargs):
+        if kwargs["users"] is not None:
+            self.generate_dataset(kwargs)
+            return
         pitches_data = self.seed_pitches()
         images_data = self.seed_images()
         all_data = pitches_data + images_data
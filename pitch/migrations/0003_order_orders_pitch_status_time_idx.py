@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0002_comment_parent_alter_order_time_end_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["pitch", "status", "time_start", "time_end"],
+                name="orders_pitch_status_time_idx",
+            ),
+        ),
+    ]
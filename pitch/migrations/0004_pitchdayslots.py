@@ -0,0 +1,47 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0003_order_orders_pitch_status_time_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PitchDaySlots",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "slots",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Bitmap of booked half-hour slots in the day",
+                    ),
+                ),
+                (
+                    "pitch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="day_slots",
+                        to="pitch.pitch",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "pitch_day_slots",
+                "unique_together": {("pitch", "day")},
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:24
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_revenues(apps, schema_editor):
+    Order = apps.get_model("pitch", "Order")
+    PitchDailyRevenue = apps.get_model("pitch", "PitchDailyRevenue")
+    totals = (
+        Order.objects.order_by()
+        .annotate(day=TruncDate("time_start", tzinfo=timezone.get_current_timezone()))
+        .values("pitch_id", "day", "status")
+        .annotate(revenue=Sum("cost"), count_order=Count("id"))
+    )
+    PitchDailyRevenue.objects.bulk_create(
+        (PitchDailyRevenue(**row) for row in totals.iterator()), batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0004_pitchdayslots"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PitchDailyRevenue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(help_text="Local date of the order start")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("o", "Ordered"),
+                            ("d", "Cancelled"),
+                            ("c", "Confirmed"),
+                        ],
+                        max_length=1,
+                    ),
+                ),
+                ("revenue", models.BigIntegerField(default=0)),
+                ("count_order", models.IntegerField(default=0)),
+                (
+                    "pitch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_revenues",
+                        to="pitch.pitch",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "pitch_daily_revenues",
+                "indexes": [
+                    models.Index(fields=["day", "pitch"], name="daily_revenues_day_idx")
+                ],
+                "unique_together": {("pitch", "day", "status")},
+            },
+        ),
+        migrations.RunPython(backfill_revenues, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("pitch", "0005_pitchdailyrevenue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        db_index=True,
+                        help_text="Hash of the exported query",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "query",
+                    models.BinaryField(
+                        help_text="Pickled query of the exported orders"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("p", "Pending"),
+                            ("r", "Running"),
+                            ("d", "Done"),
+                            ("f", "Failed"),
+                        ],
+                        default="p",
+                        max_length=1,
+                    ),
+                ),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("processed", models.PositiveIntegerField(default=0)),
+                ("file", models.FileField(blank=True, upload_to="exports")),
+                ("error", models.TextField(blank=True)),
+                (
+                    "lease_until",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("finished_date", models.DateTimeField(blank=True, null=True)),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "export_jobs",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "lease_until"], name="export_jobs_status_idx"
+                    )
+                ],
+            },
+        ),
+    ]
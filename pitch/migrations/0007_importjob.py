@@ -0,0 +1,86 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("pitch", "0006_exportjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file", models.FileField(upload_to="imports")),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        db_index=True,
+                        help_text="Hash of the uploaded file",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("p", "Pending"),
+                            ("r", "Running"),
+                            ("d", "Done"),
+                            ("f", "Failed"),
+                        ],
+                        default="p",
+                        max_length=1,
+                    ),
+                ),
+                ("total_rows", models.PositiveIntegerField(default=0)),
+                (
+                    "next_row",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Checkpoint: first data row not imported yet",
+                    ),
+                ),
+                ("pitches", models.PositiveIntegerField(default=0)),
+                ("images", models.PositiveIntegerField(default=0)),
+                ("failed_pitches", models.PositiveIntegerField(default=0)),
+                ("failed_images", models.PositiveIntegerField(default=0)),
+                ("errors", models.JSONField(blank=True, default=list)),
+                (
+                    "lease_until",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("finished_date", models.DateTimeField(blank=True, null=True)),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "import_jobs",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "lease_until"], name="import_jobs_status_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0007_importjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="mode",
+            field=models.CharField(
+                choices=[("i", "Insert"), ("u", "Upsert")],
+                default="i",
+                help_text="Upsert updates the pitches whose natural key already exists",
+                max_length=1,
+            ),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="removed_images",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="unchanged_pitches",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="updated_pitches",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
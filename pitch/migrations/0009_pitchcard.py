@@ -0,0 +1,100 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+SIZE_LABELS = {"1": "Pitch 5", "2": "Pitch 7", "3": "Pitch 12"}
+SURFACE_LABELS = {"a": "Artificial", "n": "Natural", "m": "Mixed"}
+DEFAULT_BANNER = "/media/uploads/default-image.jpg"
+
+
+def backfill_cards(apps, schema_editor):
+    Pitch = apps.get_model("pitch", "Pitch")
+    Image = apps.get_model("pitch", "Image")
+    Order = apps.get_model("pitch", "Order")
+    PitchRating = apps.get_model("pitch", "PitchRating")
+    PitchCard = apps.get_model("pitch", "PitchCard")
+    first = (
+        Image.objects.values("pitch_id")
+        .annotate(first=Min("pk"))
+        .order_by()
+        .values_list("first", flat=True)
+    )
+    banners = {
+        image.pitch_id: image.image.url for image in Image.objects.filter(pk__in=first)
+    }
+    ratings = {rating.pitch_id: rating for rating in PitchRating.objects.all()}
+    popularity = dict(
+        Order.objects.filter(status="c")
+        .values("pitch_id")
+        .annotate(count=Count("id"))
+        .order_by()
+        .values_list("pitch_id", "count")
+    )
+    PitchCard.objects.bulk_create(
+        (
+            PitchCard(
+                pitch_id=pitch.pk,
+                banner_url=banners.get(pitch.pk, DEFAULT_BANNER),
+                size_label=SIZE_LABELS.get(pitch.size, ""),
+                surface_label=SURFACE_LABELS.get(pitch.surface, ""),
+                avg_rating=ratings[pitch.pk].avg_rating if pitch.pk in ratings else 0,
+                count_comment=(
+                    ratings[pitch.pk].count_comment if pitch.pk in ratings else 0
+                ),
+                popularity=popularity.get(pitch.pk, 0),
+            )
+            for pitch in Pitch.objects.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0008_importjob_mode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PitchCard",
+            fields=[
+                (
+                    "pitch",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="pitch.pitch",
+                    ),
+                ),
+                (
+                    "banner_url",
+                    models.CharField(
+                        default="/media/uploads/default-image.jpg",
+                        help_text="URL of the first image of the pitch",
+                        max_length=255,
+                    ),
+                ),
+                ("size_label", models.CharField(blank=True, max_length=50)),
+                ("surface_label", models.CharField(blank=True, max_length=50)),
+                (
+                    "avg_rating",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=3),
+                ),
+                ("count_comment", models.PositiveIntegerField(default=0)),
+                (
+                    "popularity",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of confirmed orders"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "pitch_cards",
+            },
+        ),
+        migrations.RunPython(backfill_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0009_pitchcard"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pitchcard",
+            index=models.Index(
+                fields=["-popularity", "pitch"], name="pitch_cards_popularity_idx"
+            ),
+        ),
+    ]
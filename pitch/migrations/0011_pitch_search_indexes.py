@@ -0,0 +1,59 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+FULLTEXT_INDEX = "pitches_title_description_ft"
+
+
+def add_fulltext_index(apps, schema_editor):
+    # Only MySQL has FULLTEXT; other backends search with LIKE instead.
+    if schema_editor.connection.vendor != "mysql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        # Databases set up from the README already have an unnamed one.
+        cursor.execute(
+            "SELECT 1 FROM information_schema.statistics"
+            " WHERE table_schema = DATABASE() AND table_name = 'pitches'"
+            " AND index_type = 'FULLTEXT'"
+        )
+        if cursor.fetchone():
+            return
+    schema_editor.execute(
+        "ALTER TABLE pitches ADD FULLTEXT INDEX %s (title, description)"
+        % FULLTEXT_INDEX
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.statistics"
+            " WHERE table_schema = DATABASE() AND table_name = 'pitches'"
+            " AND index_name = %s",
+            [FULLTEXT_INDEX],
+        )
+        if not cursor.fetchone():
+            return
+    schema_editor.execute("ALTER TABLE pitches DROP INDEX %s" % FULLTEXT_INDEX)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0010_pitchcard_popularity_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pitch",
+            index=models.Index(
+                fields=["size", "surface", "price"], name="pitches_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pitch",
+            index=models.Index(fields=["surface", "price"], name="pitches_surface_idx"),
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:37
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0011_pitch_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pitch",
+            name="geocell",
+            field=models.CharField(
+                blank=True, editable=False, max_length=12, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="pitch",
+            name="latitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MaxValueValidator(90),
+                    django.core.validators.MinValueValidator(-90),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="pitch",
+            name="longitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MaxValueValidator(180),
+                    django.core.validators.MinValueValidator(-180),
+                ],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pitch",
+            index=models.Index(fields=["geocell"], name="pitches_geocell_idx"),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+def fail_queued_jobs(apps, schema_editor):
+    # Their pickled queries are dropped below, so they can no longer run.
+    ExportJob = apps.get_model("pitch", "ExportJob")
+    ExportJob.objects.filter(status__in=["p", "r"]).update(
+        status="f", error="Export format changed, please request it again."
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0012_pitch_location"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_queued_jobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="exportjob",
+            name="query",
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="active_fingerprint",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="params",
+            field=models.JSONField(
+                default=dict,
+                help_text="Order ids or changelist filters of the export",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0013_exportjob_params"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="attempts",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Runs cut short by a database error"
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0014_importjob_attempts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pitch",
+            index=models.Index(fields=["price", "id"], name="pitches_price_idx"),
+        ),
+    ]
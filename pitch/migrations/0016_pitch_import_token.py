@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pitch", "0015_pitch_price_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pitch",
+            name="import_token",
+            field=models.CharField(
+                blank=True, editable=False, max_length=32, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pitch",
+            index=models.Index(
+                fields=["import_token"], name="pitches_import_token_idx"
+            ),
+        ),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
-from pitch.constant import SIZE, SURFACE_GRASS, STATUS_ORDER
+from pitch.constant import (
+    DEFAULT_BANNER,
+    IMPORT_MODE,
+    SIZE,
+    SURFACE_GRASS,
+    STATUS_JOB,
+    STATUS_ORDER,
+)
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.urls import reverse
 from django.utils import timezone
@@ -54,10 +61,36 @@ class Pitch(models.Model):
     price = models.PositiveIntegerField(
         validators=[MaxValueValidator(2000000000), MinValueValidator(0)]
     )
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MaxValueValidator(90), MinValueValidator(-90)],
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MaxValueValidator(180), MinValueValidator(-180)],
+    )
+    # Geohash of the coordinates, kept by the pre_save signal.
+    geocell = models.CharField(max_length=12, null=True, blank=True, editable=False)
+    # Set by the spreadsheet import to read back the ids of the rows it inserted.
+    import_token = models.CharField(
+        max_length=32, null=True, blank=True, editable=False
+    )
 
     class Meta:
         ordering = ["price", "size"]
         db_table = "pitches"
+        indexes = [
+            models.Index(
+                fields=["size", "surface", "price"], name="pitches_search_idx"
+            ),
+            models.Index(fields=["surface", "price"], name="pitches_surface_idx"),
+            # Keyset pages of the default ("price", "pk") search ordering.
+            models.Index(fields=["price", "id"], name="pitches_price_idx"),
+            models.Index(fields=["geocell"], name="pitches_geocell_idx"),
+            models.Index(fields=["import_token"], name="pitches_import_token_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -77,6 +110,20 @@ class Pitch(models.Model):
                 return size[1]
         return ""
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            "address": self.address,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+        }
+
     def has_pending_or_future_orders(self):
         return self.order_set.filter(status__in=["o"]).exists()
 
@@ -114,10 +161,96 @@ class Order(models.Model):
     class Meta:
         db_table = "orders"
         ordering = ["created_date", "cost"]
+        indexes = [
+            models.Index(
+                fields=["pitch", "status", "time_start", "time_end"],
+                name="orders_pitch_status_time_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.pk} - {self.renter.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            "pitch_id": self.pitch_id,
+            "status": self.status,
+            "time_start": self.time_start,
+            "time_end": self.time_end,
+            "cost": self.cost,
+        }
+
+
+class PitchDaySlots(models.Model):
+    pitch = models.ForeignKey(Pitch, related_name="day_slots", on_delete=models.CASCADE)
+    day = models.DateField()
+    slots = models.BigIntegerField(
+        default=0, help_text="Bitmap of booked half-hour slots in the day"
+    )
+
+    class Meta:
+        db_table = "pitch_day_slots"
+        unique_together = ("pitch", "day")
+
+    def __str__(self):
+        return f"PitchDaySlots {self.pitch_id} - {self.day}"
+
+
+class PitchDailyRevenue(models.Model):
+    pitch = models.ForeignKey(
+        Pitch, related_name="daily_revenues", on_delete=models.CASCADE
+    )
+    day = models.DateField(help_text="Local date of the order start")
+    status = models.CharField(max_length=1, choices=STATUS_ORDER)
+    revenue = models.BigIntegerField(default=0)
+    count_order = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "pitch_daily_revenues"
+        unique_together = ("pitch", "day", "status")
+        indexes = [
+            models.Index(fields=["day", "pitch"], name="daily_revenues_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"PitchDailyRevenue {self.pitch_id} - {self.day} - {self.status}"
+
+
+class PitchCard(models.Model):
+    pitch = models.OneToOneField(
+        Pitch, primary_key=True, related_name="card", on_delete=models.CASCADE
+    )
+    banner_url = models.CharField(
+        max_length=255,
+        default=DEFAULT_BANNER,
+        help_text="URL of the first image of the pitch",
+    )
+    size_label = models.CharField(max_length=50, blank=True)
+    surface_label = models.CharField(max_length=50, blank=True)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=1, default=0)
+    count_comment = models.PositiveIntegerField(default=0)
+    popularity = models.PositiveIntegerField(
+        default=0, help_text="Number of confirmed orders"
+    )
+
+    class Meta:
+        db_table = "pitch_cards"
+        indexes = [
+            models.Index(
+                fields=["-popularity", "pitch"], name="pitch_cards_popularity_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"PitchCard {self.pitch_id}"
+
 
 class Comment(models.Model):
     renter = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -220,3 +353,97 @@ class Favorite(models.Model):
 
     class Meta:
         unique_together = ("renter", "pitch")
+
+
+class ExportJob(models.Model):
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    fingerprint = models.CharField(
+        max_length=64, db_index=True, help_text="Hash of the exported query"
+    )
+    # Equal to the fingerprint while the job is pending or running, so the
+    # unique index lets only one such job per export exist.
+    active_fingerprint = models.CharField(
+        max_length=64, null=True, blank=True, unique=True, editable=False
+    )
+    params = models.JSONField(
+        default=dict, help_text="Order ids or changelist filters of the export"
+    )
+    status = models.CharField(max_length=1, choices=STATUS_JOB, default="p")
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to="exports", blank=True)
+    error = models.TextField(blank=True)
+    lease_until = models.DateTimeField(default=timezone.now)
+    created_date = models.DateTimeField(auto_now_add=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "export_jobs"
+        indexes = [
+            models.Index(
+                fields=["status", "lease_until"], name="export_jobs_status_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"ExportJob {self.pk} - {self.get_status_display()}"
+
+    @property
+    def percent(self):
+        if self.status == "d":
+            return 100
+        if not self.total:
+            return 0
+        return min(100, self.processed * 100 // self.total)
+
+
+class ImportJob(models.Model):
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    file = models.FileField(upload_to="imports")
+    fingerprint = models.CharField(
+        max_length=64, db_index=True, help_text="Hash of the uploaded file"
+    )
+    status = models.CharField(max_length=1, choices=STATUS_JOB, default="p")
+    mode = models.CharField(
+        max_length=1,
+        choices=IMPORT_MODE,
+        default="i",
+        help_text="Upsert updates the pitches whose natural key already exists",
+    )
+    total_rows = models.PositiveIntegerField(default=0)
+    next_row = models.PositiveIntegerField(
+        default=0, help_text="Checkpoint: first data row not imported yet"
+    )
+    pitches = models.PositiveIntegerField(default=0)
+    images = models.PositiveIntegerField(default=0)
+    failed_pitches = models.PositiveIntegerField(default=0)
+    failed_images = models.PositiveIntegerField(default=0)
+    updated_pitches = models.PositiveIntegerField(default=0)
+    unchanged_pitches = models.PositiveIntegerField(default=0)
+    removed_images = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    attempts = models.PositiveIntegerField(
+        default=0, help_text="Runs cut short by a database error"
+    )
+    lease_until = models.DateTimeField(default=timezone.now)
+    created_date = models.DateTimeField(auto_now_add=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "import_jobs"
+        indexes = [
+            models.Index(
+                fields=["status", "lease_until"], name="import_jobs_status_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"ImportJob {self.pk} - {self.get_status_display()}"
+
+    @property
+    def percent(self):
+        if self.status == "d":
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, self.next_row * 100 // self.total_rows)
@@ -0,0 +1,211 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from pitch.availability import as_datetime, day_bounds
+from pitch.models import Order, Pitch, PitchDailyRevenue
+
+
+def order_day(time_start):
+    return timezone.localtime(as_datetime(time_start)).date()
+
+
+def add_revenue(pitch_id, day, status, revenue, count):
+    rows = PitchDailyRevenue.objects.filter(pitch_id=pitch_id, day=day, status=status)
+    changes = {
+        "revenue": F("revenue") + revenue,
+        "count_order": F("count_order") + count,
+    }
+    if rows.update(**changes):
+        if count < 0:
+            rows.filter(count_order__lte=0).delete()
+        return
+    try:
+        with transaction.atomic():
+            PitchDailyRevenue.objects.create(
+                pitch_id=pitch_id,
+                day=day,
+                status=status,
+                revenue=revenue,
+                count_order=count,
+            )
+    except IntegrityError:
+        # Another transaction created the row first; add to it instead.
+        rows.update(**changes)
+
+
+def contribution(values):
+    return (
+        values["pitch_id"],
+        order_day(values["time_start"]),
+        values["status"],
+        int(values["cost"]),
+    )
+
+
+def recompute_day_revenue(pitch_id, day):
+    start, end = day_bounds(day)
+    totals = (
+        Order.objects.filter(
+            pitch_id=pitch_id, time_start__gte=start, time_start__lt=end
+        )
+        .order_by()
+        .values("status")
+        .annotate(revenue=Sum("cost"), count_order=Count("id"))
+    )
+    with transaction.atomic():
+        PitchDailyRevenue.objects.filter(pitch_id=pitch_id, day=day).delete()
+        PitchDailyRevenue.objects.bulk_create(
+            [PitchDailyRevenue(pitch_id=pitch_id, day=day, **row) for row in totals]
+        )
+
+
+def refresh_order_revenue(order, previous=None, created=False, deleted=False):
+    current = contribution(
+        {
+            "pitch_id": order.pitch_id,
+            "time_start": order.time_start,
+            "status": order.status,
+            "cost": order.cost,
+        }
+    )
+    if deleted:
+        add_revenue(*current[:3], -current[3], -1)
+        return
+    if created:
+        add_revenue(*current[:3], current[3], 1)
+        return
+    if (
+        not previous
+        or not {"pitch_id", "time_start", "status", "cost"} <= previous.keys()
+    ):
+        # Without the stored values there is nothing to subtract from; count
+        # the order's day again from scratch.
+        recompute_day_revenue(order.pitch_id, current[1])
+        return
+    previous = contribution(previous)
+    if previous != current:
+        add_revenue(*previous[:3], -previous[3], -1)
+        add_revenue(*current[:3], current[3], 1)
+
+
+def pitch_revenues(date_from, date_to, **filters):
+    rollup = {
+        "daily_revenues__day__gte": date_from,
+        "daily_revenues__day__lte": date_to,
+    }
+    rollup.update(("daily_revenues__%s" % key, value) for key, value in filters.items())
+    return (
+        Pitch.objects.filter(**rollup)
+        .annotate(
+            revenues=Sum("daily_revenues__revenue"),
+            count=Sum("daily_revenues__count_order"),
+        )
+        .order_by("-revenues", "-count")
+    )
+
+
+def daily_revenue(pitch_id, date_from, date_to):
+    return dict(
+        PitchDailyRevenue.objects.filter(
+            pitch_id=pitch_id, day__gte=date_from, day__lte=date_to
+        )
+        .values("day")
+        .annotate(total=Sum("revenue"))
+        .values_list("day", "total")
+    )
+
+
+# Order lookups a day rollup answers exactly; anything else needs the orders.
+ROLLUP_LOOKUPS = {
+    "order__status": "status",
+    "order__time_start__date": "day",
+    "order__time_start__date__gte": "day__gte",
+    "order__time_start__date__gt": "day__gt",
+    "order__time_start__date__lte": "day__lte",
+    "order__time_start__date__lt": "day__lt",
+}
+
+
+def rollup_filters(order_filters):
+    if not order_filters.keys() <= ROLLUP_LOOKUPS.keys():
+        return None
+    return {
+        "daily_revenues__%s" % ROLLUP_LOOKUPS[key]: value
+        for key, value in order_filters.items()
+    }
+
+
+def bucket_start(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def revenue_series(date_from, date_to, granularity="day", **filters):
+    # Rollup days are already local dates, so buckets follow TIME_ZONE.
+    rows = PitchDailyRevenue.objects.filter(
+        day__gte=date_from, day__lte=date_to, **filters
+    )
+    if "status" not in filters:
+        # Cancelled orders earn nothing unless asked for explicitly.
+        rows = rows.exclude(status="d")
+    rows = (
+        rows.order_by()
+        .values("day")
+        .annotate(total=Sum("revenue"), orders=Sum("count_order"))
+        .values_list("day", "total", "orders")
+    )
+    totals = {}
+    for day, revenue, count in rows:
+        start = bucket_start(day, granularity)
+        bucket = totals.setdefault(start, [0, 0])
+        bucket[0] += revenue
+        bucket[1] += count
+
+    points = []
+    start = bucket_start(date_from, granularity)
+    while start <= date_to:
+        end = next_bucket(start, granularity)
+        revenue, count = totals.get(start, (0, 0))
+        points.append(
+            {
+                "start": max(start, date_from),
+                "end": min(end - timedelta(days=1), date_to),
+                "revenue": revenue,
+                "count_order": count,
+            }
+        )
+        start = end
+    return points
+
+
+def decimate(points, max_points):
+    # Merge runs of neighbouring buckets so totals are kept exactly.
+    if len(points) <= max_points:
+        return points
+    size = -(-len(points) // max_points)
+    merged = []
+    for i in range(0, len(points), size):
+        group = points[i : i + size]
+        merged.append(
+            {
+                "start": group[0]["start"],
+                "end": group[-1]["end"],
+                "revenue": sum(point["revenue"] for point in group),
+                "count_order": sum(point["count_order"] for point in group),
+            }
+        )
+    return merged
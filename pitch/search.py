@@ -0,0 +1,212 @@
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.db.models import Case, F, FloatField, Func, Q, Value, When
+
+from pitch.availability import exclude_booked
+from pitch.geo import covering_cells, distance_km, in_cells
+from pitch.models import Pitch
+from pitch.textindex import search_index
+
+# Same cut-off the raw MATCH ... AGAINST search used.
+MIN_RANK = 0.01
+CURSOR_SALT = "pitch.search.cursor"
+# Keyword hits ranked in SQL by the "bm25" engine.
+MAX_HITS = 500
+DEFAULT_RADIUS_KM = 5
+
+
+class SearchRank(Func):
+    """Relevance of ``query`` against the FULLTEXT(title, description) index.
+
+    MySQL only; the query is bound as a parameter, never spliced into the SQL.
+    """
+
+    output_field = FloatField()
+
+    def __init__(self, query):
+        super().__init__(F("title"), F("description"), Value(query))
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        *columns, query = self.get_source_expressions()
+        sql, params = [], []
+        for column in columns:
+            column_sql, column_params = compiler.compile(column)
+            sql.append(column_sql)
+            params += column_params
+        query_sql, query_params = compiler.compile(query)
+        return (
+            "MATCH (%s) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+            % (", ".join(sql), query_sql),
+            params + query_params,
+        )
+
+
+def match_keywords(pitches, q):
+    engine = getattr(settings, "PITCH_SEARCH_ENGINE", "database")
+    index = search_index() if engine == "bm25" else None
+    if index is not None:
+        # Rank only the pitches the other filters kept, so the cut to MAX_HITS
+        # never drops a match that would have passed them.
+        candidates = None
+        if pitches.query.has_filters():
+            candidates = set(pitches.values_list("pk", flat=True))
+        hits = index.search(q, MAX_HITS, candidates)
+        rank = Case(
+            *[When(pk=pitch_id, then=Value(score)) for pitch_id, score in hits],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return (
+            pitches.filter(pk__in=[pitch_id for pitch_id, _ in hits])
+            .annotate(rank=rank)
+            .order_by("-rank", "price", "pk")
+        )
+    # Without a snapshot yet the "bm25" engine searches the database too.
+    if connection.vendor == "mysql":
+        return (
+            pitches.annotate(rank=SearchRank(q))
+            .filter(rank__gt=MIN_RANK)
+            .order_by("-rank", "price", "pk")
+        )
+    # Backends without the FULLTEXT index, such as SQLite in tests.
+    return pitches.filter(Q(title__icontains=q) | Q(description__icontains=q))
+
+
+def near_pitches(pitches, latitude, longitude, radius_km):
+    """Pitches within ``radius_km`` of the point, nearest first.
+
+    The geohash cells around the point narrow the rows down through the
+    index before the exact distance is computed.
+    """
+    pitches = pitches.filter(latitude__isnull=False, longitude__isnull=False)
+    cells = covering_cells(latitude, longitude, radius_km)
+    if cells:
+        pitches = pitches.filter(in_cells(cells))
+    return (
+        pitches.annotate(distance=distance_km(latitude, longitude))
+        .filter(distance__lte=radius_km)
+        .order_by("distance", "price", "pk")
+    )
+
+
+def filter_pitches(data):
+    pitches = Pitch.objects.order_by("price", "pk")
+    if data.get("surface"):
+        pitches = pitches.filter(surface=data["surface"])
+    if data.get("size"):
+        pitches = pitches.filter(size=data["size"])
+    if data.get("price") is not None:
+        pitches = pitches.filter(price__lte=data["price"])
+    if data.get("address"):
+        pitches = pitches.filter(address=data["address"])
+    if data.get("near"):
+        pitches = near_pitches(
+            pitches, *data["near"], data.get("radius") or DEFAULT_RADIUS_KM
+        )
+    if data.get("time_start") and data.get("time_end"):
+        pitches = exclude_booked(pitches, data["time_start"], data["time_end"])
+    # Keywords go last so the "bm25" engine ranks the fully filtered pitches.
+    if data.get("q"):
+        pitches = match_keywords(pitches, data["q"])
+        if data.get("near"):
+            pitches = pitches.order_by("distance", "price", "pk")
+    return pitches
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset and the cursors around it."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def ordering(queryset):
+    # (name, descending) for each ordering term, e.g. "-rank" or "pk".
+    return [
+        (term.lstrip("-"), term.startswith("-")) for term in queryset.query.order_by
+    ]
+
+
+def after(keys, values, backwards=False):
+    """Rows strictly past ``values`` in the order given by ``keys``."""
+    condition = Q()
+    for index, (name, descending) in enumerate(keys):
+        lookup = "lt" if descending != backwards else "gt"
+        term = Q(**{"%s__%s" % (name, lookup): values[index]})
+        for (equal_name, _), value in zip(keys[:index], values):
+            term &= Q(**{equal_name: value})
+        condition |= term
+    # The redundant bound on the leading key lets the database seek into an
+    # index on the ordering instead of scanning it from the start.
+    name, descending = keys[0]
+    lookup = "lte" if descending != backwards else "gte"
+    return Q(**{"%s__%s" % (name, lookup): values[0]}) & condition
+
+
+def encode_cursor(row, keys, backwards=False):
+    return signing.dumps(
+        [[getattr(row, name) for name, _ in keys], backwards],
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def decode_cursor(cursor, keys):
+    try:
+        values, backwards = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None, False
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None, False
+    return values, bool(backwards)
+
+
+def keyset_page(queryset, cursor=None, per_page=10):
+    """Fetch the page of ``queryset`` that ``cursor`` points at.
+
+    The queryset must be ordered by unique keys, e.g. ("-rank", "price", "pk").
+    Each page is one query for ``per_page + 1`` rows past the cursor, with no
+    OFFSET or COUNT. Where an index matches the ordering, as
+    pitches_price_idx does ("price", "pk"), that query is a range read
+    however deep the page is; orderings on computed values such as rank or
+    distance still sort the filtered rows. An invalid cursor gives the first
+    page.
+    """
+    keys = ordering(queryset)
+    values, backwards = decode_cursor(cursor, keys) if cursor else (None, False)
+    rows = queryset
+    if values is not None:
+        rows = rows.filter(after(keys, values, backwards))
+    if backwards:
+        rows = rows.reverse()
+    rows = list(rows[: per_page + 1])
+    more = len(rows) > per_page
+    page = rows[:per_page]
+    if backwards:
+        page.reverse()
+    # Going forwards the cursor row lies behind the page, going backwards
+    # ahead of it; the extra row tells whether the other side goes on.
+    has_next = bool(page) and (backwards or more)
+    has_previous = bool(page) and (more if backwards else values is not None)
+    return KeysetPage(
+        page,
+        next_cursor=encode_cursor(page[-1], keys) if has_next else None,
+        previous_cursor=(
+            encode_cursor(page[0], keys, backwards=True) if has_previous else None
+        ),
+    )
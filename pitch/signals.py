@@ -0,0 +1,80 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from pitch.availability import refresh_order_slots
+from pitch.cards import (
+    refresh_banner,
+    refresh_order_popularity,
+    refresh_pitch_labels,
+    refresh_rating,
+)
+from pitch.geo import geohash
+from pitch.models import Image, Order, Pitch, PitchRating
+from pitch.revenue import refresh_order_revenue
+from pitch.suggest import refresh_pitch_suggestions
+from pitch.textindex import refresh_pitch_text
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, "_loaded_values", None)
+    refresh_order_slots(instance, previous)
+    refresh_order_revenue(instance, previous, created=created)
+    refresh_order_popularity(instance, previous, created=created)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    refresh_order_slots(instance)
+    refresh_order_revenue(instance, deleted=True)
+    refresh_order_popularity(instance, deleted=True)
+
+
+@receiver(pre_save, sender=Pitch)
+def pitch_saving(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_values", {})
+    if "address" in loaded and instance.address != loaded["address"]:
+        # The old coordinates are wrong for the new address unless new ones
+        # come with it; geocode_pitches locates it again.
+        coordinates = (instance.latitude, instance.longitude)
+        if coordinates == (
+            loaded.get("latitude", instance.latitude),
+            loaded.get("longitude", instance.longitude),
+        ):
+            instance.latitude = instance.longitude = None
+    located = instance.latitude is not None and instance.longitude is not None
+    instance.geocell = (
+        geohash(instance.latitude, instance.longitude) if located else None
+    )
+
+
+@receiver(post_save, sender=Pitch)
+def pitch_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_pitch_labels(instance)
+    refresh_pitch_text(instance)
+    refresh_pitch_suggestions(instance)
+
+
+@receiver(post_delete, sender=Pitch)
+def pitch_deleted(sender, instance, **kwargs):
+    refresh_pitch_text(instance, deleted=True)
+    refresh_pitch_suggestions(instance, deleted=True)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_banner(instance.pitch_id)
+
+
+@receiver(post_save, sender=PitchRating)
+def rating_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_rating(instance)
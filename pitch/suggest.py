@@ -0,0 +1,166 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from pitch.models import Pitch
+from pitch.textindex import fold
+
+logger = logging.getLogger(__name__)
+
+SPACES = re.compile(r"\s+")
+WORD_START = re.compile(r"\b\w")
+# Later words of a long address are rarely what people start typing.
+MAX_WORDS = 8
+FIELDS = ("title", "address")
+
+_index = None
+_index_lock = threading.Lock()
+_rebuilding = False
+
+
+def normalize(text):
+    return SPACES.sub(" ", fold(text or "")).strip()
+
+
+def label_keys(label):
+    # Every word start is a key, so "my dinh" finds "Sân bóng Mỹ Đình".
+    text = normalize(label)
+    starts = [match.start() for match in WORD_START.finditer(text)]
+    return [text[start:] for start in starts[:MAX_WORDS]]
+
+
+class SuggestIndex:
+    """Sorted (key, field, label) entries searched with bisect.
+
+    Each distinct label is stored once, however many pitches share it, with
+    the set of those pitches alongside.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.label_pitches = {}
+        self.pitch_labels = {}
+        self.built = time.monotonic()
+        self.lock = threading.Lock()
+
+    def labels_for(self, title, address):
+        return [
+            (field, label) for field, label in zip(FIELDS, (title, address)) if label
+        ]
+
+    def add(self, pitch_id, title, address):
+        labels = self.labels_for(title, address)
+        with self.lock:
+            self._remove(pitch_id)
+            for field, label in labels:
+                pitches = self.label_pitches.setdefault((field, label), set())
+                if not pitches:
+                    for key in label_keys(label):
+                        insort(self.entries, (key, field, label))
+                pitches.add(pitch_id)
+            self.pitch_labels[pitch_id] = labels
+
+    def remove(self, pitch_id):
+        with self.lock:
+            self._remove(pitch_id)
+
+    def _remove(self, pitch_id):
+        for field, label in self.pitch_labels.pop(pitch_id, ()):
+            pitches = self.label_pitches[field, label]
+            pitches.discard(pitch_id)
+            if pitches:
+                continue
+            del self.label_pitches[field, label]
+            for key in label_keys(label):
+                del self.entries[bisect_left(self.entries, (key, field, label))]
+
+    def lookup(self, query, limit=10):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self.lock:
+            position = bisect_left(self.entries, (prefix,))
+            for key, field, label in self.entries[position:]:
+                if not key.startswith(prefix):
+                    break
+                # Several words of one label can start with the prefix.
+                if (field, label) in seen:
+                    continue
+                seen.add((field, label))
+                pitch_id = min(self.label_pitches[field, label])
+                results.append({"id": pitch_id, "field": field, "label": label})
+                if len(results) == limit:
+                    break
+        return results
+
+    @classmethod
+    def build(cls, batch_size=2000):
+        index = cls()
+        pitches = Pitch.objects.order_by().values_list("pk", "title", "address")
+        for pitch_id, title, address in pitches.iterator(batch_size):
+            labels = index.labels_for(title, address)
+            for label in labels:
+                index.label_pitches.setdefault(label, set()).add(pitch_id)
+            index.pitch_labels[pitch_id] = labels
+        index.entries = sorted(
+            (key, field, label)
+            for field, label in index.label_pitches
+            for key in label_keys(label)
+        )
+        return index
+
+
+def rebuild_suggest_index():
+    """Build a fresh index and swap it in; lookups use the old one meanwhile.
+
+    Changes committed while it builds may be missing from the new index until
+    the next rebuild.
+    """
+    global _index
+    _index = SuggestIndex.build()
+    return _index
+
+
+def rebuild_in_background():
+    global _rebuilding
+    try:
+        rebuild_suggest_index()
+    except Exception as e:
+        logger.error("Rebuilding the suggestion index failed: %s", e)
+    finally:
+        with _index_lock:
+            _rebuilding = False
+        connection.close()
+
+
+def suggest_index():
+    """The worker's index. A missing one, or one older than
+    PITCH_SUGGEST_MAX_AGE seconds, is rebuilt in a background thread so no
+    request waits for it; until the first build ends lookups find nothing.
+    """
+    global _rebuilding
+    max_age = getattr(settings, "PITCH_SUGGEST_MAX_AGE", 300)
+    with _index_lock:
+        index = _index
+        stale = index is None or time.monotonic() - index.built > max_age
+        if stale and not _rebuilding:
+            _rebuilding = True
+            threading.Thread(target=rebuild_in_background, daemon=True).start()
+    return index or SuggestIndex()
+
+
+def refresh_pitch_suggestions(pitch, deleted=False):
+    if _index is None:
+        return
+    index, pitch_id = _index, pitch.pk
+    if deleted:
+        transaction.on_commit(lambda: index.remove(pitch_id))
+    else:
+        title, address = pitch.title, pitch.address
+        transaction.on_commit(lambda: index.add(pitch_id, title, address))
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from pitch.models import Order, Pitch
+
+
+class BenchEndpointsTest(TestCase):
+    def setUp(self):
+        call_command(
+            "seed",
+            users=10,
+            pitches=5,
+            orders=100,
+            comments=20,
+            favorites=10,
+            days=30,
+            stdout=StringIO(),
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.budgets = os.path.join(directory, "budgets.json")
+
+    def bench(self, **options):
+        output = StringIO()
+        call_command(
+            "bench_endpoints", budgets=self.budgets, runs=2, stdout=output, **options
+        )
+        return output.getvalue()
+
+    def test_budgets_round_trip(self):
+        self.bench(update=True, headroom=100)
+        with open(self.budgets) as budgets_file:
+            budgets = json.load(budgets_file)
+        self.assertIn("api_pitch_availability", budgets)
+        self.assertGreater(budgets["pitch_detail"]["queries"], 0)
+
+        output = self.bench()
+        self.assertNotIn("no budget", output)
+        self.assertNotIn("expected", output)
+        # The writes made by the endpoints are rolled back.
+        self.assertEqual(Order.objects.count(), 100)
+        self.assertFalse(Pitch.objects.filter(favorite__renter__is_superuser=True))
+
+    def test_query_regression_fails(self):
+        self.bench(update=True, headroom=100)
+        with open(self.budgets) as budgets_file:
+            budgets = json.load(budgets_file)
+        budgets["pitch_detail"]["queries"] -= 1
+        with open(self.budgets, "w") as budgets_file:
+            json.dump(budgets, budgets_file)
+        with self.assertRaisesMessage(CommandError, "pitch_detail: "):
+            self.bench(only=["pitch_detail", "index"])
+
+    def test_latency_is_only_checked_on_request(self):
+        self.bench(update=True, headroom=100)
+        with open(self.budgets) as budgets_file:
+            budgets = json.load(budgets_file)
+        budgets["index"]["p95_ms"] = 0
+        with open(self.budgets, "w") as budgets_file:
+            json.dump(budgets, budgets_file)
+        self.assertIn("ok", self.bench(only=["index"]))
+        with self.assertRaisesMessage(CommandError, "index: p95"):
+            self.bench(only=["index"], timing=True)
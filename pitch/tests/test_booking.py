@@ -0,0 +1,55 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from pitch.booking import SlotUnavailable, book_pitch
+from pitch.factory import OrderFactory, PitchFactory, UserFactory
+from pitch.models import AccessComment, Order
+
+
+class BookPitchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.pitch = PitchFactory(price=100)
+        cls.start = timezone.now() + datetime.timedelta(days=2)
+
+    def test_book_free_slot(self):
+        order = book_pitch(
+            self.pitch,
+            self.user,
+            self.start,
+            self.start + datetime.timedelta(hours=2),
+        )
+        self.assertEqual(order.cost, 200)
+        self.assertEqual(order.status, "o")
+        self.assertEqual(
+            AccessComment.objects.get(
+                renter=self.user, pitch=self.pitch
+            ).count_comment_created,
+            1,
+        )
+
+    def test_book_overlapping_slot(self):
+        OrderFactory(renter=self.user, pitch=self.pitch, time_start=self.start)
+        with self.assertRaises(SlotUnavailable):
+            book_pitch(
+                self.pitch,
+                self.user,
+                self.start + datetime.timedelta(minutes=30),
+                self.start + datetime.timedelta(hours=2),
+            )
+        self.assertEqual(Order.objects.filter(pitch=self.pitch).count(), 1)
+
+    def test_book_slot_of_cancelled_order(self):
+        OrderFactory(
+            renter=self.user, pitch=self.pitch, time_start=self.start, status="d"
+        )
+        order = book_pitch(
+            self.pitch,
+            self.user,
+            self.start,
+            self.start + datetime.timedelta(hours=1),
+        )
+        self.assertIsNotNone(order.pk)
@@ -0,0 +1,118 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from pitch.factory import OrderFactory, PitchFactory, UserFactory
+from pitch.models import Favorite, Image, PitchCard, PitchRating
+
+
+class PitchCardTest(TestCase):
+    def setUp(self):
+        self.pitch = PitchFactory(size="2", surface="a")
+
+    def card(self):
+        return PitchCard.objects.get(pitch=self.pitch)
+
+    def test_card_follows_the_pitch(self):
+        self.assertEqual(
+            (self.card().size_label, self.card().surface_label),
+            ("Pitch 7", "Artificial"),
+        )
+        self.assertEqual(self.card().banner_url, "/media/uploads/default-image.jpg")
+        self.pitch.surface = "m"
+        self.pitch.save()
+        self.assertEqual(self.card().surface_label, "Mixed")
+
+    def test_banner_is_the_first_image(self):
+        first = Image.objects.create(pitch=self.pitch, image="uploads/a.jpg")
+        Image.objects.create(pitch=self.pitch, image="uploads/b.jpg")
+        self.assertEqual(self.card().banner_url, "/media/uploads/a.jpg")
+        first.delete()
+        self.assertEqual(self.card().banner_url, "/media/uploads/b.jpg")
+
+    def test_rating_is_copied(self):
+        rating = PitchRating.objects.create(pitch=self.pitch)
+        rating.create_avg_rating(4)
+        self.assertEqual(self.card().avg_rating, 4)
+        self.assertEqual(self.card().count_comment, 1)
+
+    def test_rebuild(self):
+        Image.objects.create(pitch=self.pitch, image="uploads/a.jpg")
+        OrderFactory(renter=UserFactory(), pitch=self.pitch, status="c")
+        PitchCard.objects.all().delete()
+        call_command("rebuild_pitch_cards", stdout=StringIO())
+        card = self.card()
+        self.assertEqual(card.banner_url, "/media/uploads/a.jpg")
+        self.assertEqual((card.size_label, card.popularity), ("Pitch 7", 1))
+
+
+class ListingQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        for i in range(12):
+            pitch = PitchFactory()
+            Image.objects.create(pitch=pitch, image="uploads/%d.jpg" % i)
+            Favorite.objects.create(renter=cls.user, pitch=pitch)
+
+    def test_index_renders_cards_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "/media/uploads/0.jpg")
+
+    def test_favorite_page_does_not_query_per_pitch(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("favorite_pitches"))
+        self.assertContains(response, "Pitch 5", count=10)
+        with self.assertNumQueries(4):
+            # Session, user, count and the page of favorites with their cards.
+            self.client.get(reverse("favorite_pitches"))
+
+
+class PopularityTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.pitch = PitchFactory()
+        self.other = PitchFactory()
+
+    def popularity(self, pitch):
+        return PitchCard.objects.get(pitch=pitch).popularity
+
+    def test_counter_follows_confirmed_orders(self):
+        order = OrderFactory(renter=self.user, pitch=self.pitch, status="o")
+        self.assertEqual(self.popularity(self.pitch), 0)
+        order.status = "c"
+        order.save()
+        self.assertEqual(self.popularity(self.pitch), 1)
+        order.pitch = self.other
+        order.save()
+        self.assertEqual(
+            (self.popularity(self.pitch), self.popularity(self.other)), (0, 1)
+        )
+        order.status = "d"
+        order.save()
+        self.assertEqual(self.popularity(self.other), 0)
+        OrderFactory(renter=self.user, pitch=self.other, status="c").delete()
+        self.assertEqual(self.popularity(self.other), 0)
+
+    def test_reconcile_fixes_drift(self):
+        OrderFactory(renter=self.user, pitch=self.pitch, status="c")
+        PitchCard.objects.filter(pitch=self.pitch).update(popularity=7)
+        PitchCard.objects.filter(pitch=self.other).delete()
+        output = StringIO()
+        call_command("reconcile_popularity", stdout=output)
+        self.assertEqual(output.getvalue().strip(), "Fixed 2 pitch cards")
+        self.assertEqual(
+            (self.popularity(self.pitch), self.popularity(self.other)), (1, 0)
+        )
+
+    def test_index_shows_the_most_booked_pitches(self):
+        pitches = [PitchFactory() for _ in range(3)]
+        for count, pitch in enumerate(pitches, 1):
+            for _ in range(count):
+                OrderFactory(renter=self.user, pitch=pitch, status="c")
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["pitch_list"], pitches[::-1])
@@ -4,7 +4,12 @@ from django.test import TestCase
 from django.utils import timezone
 from pitch.factory import PitchFactory, UserFactory, OrderFactory, VoucherFactory
 import datetime
-from pitch.forms import RentalPitchModelForm, CancelOrderModelForm, CommentForm
+from pitch.forms import (
+    RentalPitchModelForm,
+    CancelOrderModelForm,
+    CommentForm,
+    SearchForm,
+)
 from account.forms import RegisterForm
 
 
@@ -96,6 +101,33 @@ class RentalPitchFormTest(TestCase):
         )
         self.assertFalse(form.is_valid())
 
+    def test_cancelled_order_does_not_block(self):
+        start = timezone.now() + datetime.timedelta(hours=6)
+        end = start + datetime.timedelta(hours=1)
+        OrderFactory(
+            renter=self.user,
+            pitch=self.pitch,
+            time_start=start,
+            status="d",
+        )
+        form = RentalPitchModelForm(
+            data={"time_start": start, "time_end": end}, pitch=self.pitch
+        )
+        self.assertTrue(form.is_valid())
+
+    def test_adjacent_order_does_not_block(self):
+        start = timezone.now() + datetime.timedelta(hours=8)
+        end = start + datetime.timedelta(hours=1)
+        OrderFactory(
+            renter=self.user,
+            pitch=self.pitch,
+            time_start=end,
+        )
+        form = RentalPitchModelForm(
+            data={"time_start": start, "time_end": end}, pitch=self.pitch
+        )
+        self.assertTrue(form.is_valid())
+
     def test_voucher_is_invalid(self):
         start = timezone.now() + datetime.timedelta(hours=1)
         end = start + datetime.timedelta(hours=1)
@@ -221,3 +253,25 @@ class CommentFormTest(TestCase):
     def test_comment_form_rating_out_of_range(self):
         form = CommentForm(data={"comment": "This is a comment.", "rating": 6})
         self.assertFalse(form.is_valid())
+
+
+class SearchFormTest(TestCase):
+    def test_search_form_without_window(self):
+        form = SearchForm(data={"size": "1"})
+        self.assertTrue(form.is_valid())
+
+    def test_search_form_with_window(self):
+        form = SearchForm(
+            data={"time_start": "2030-01-01 18:00", "time_end": "2030-01-01 19:30"}
+        )
+        self.assertTrue(form.is_valid())
+
+    def test_search_form_window_needs_both_ends(self):
+        form = SearchForm(data={"time_start": "2030-01-01 18:00"})
+        self.assertFalse(form.is_valid())
+
+    def test_search_form_window_end_before_start(self):
+        form = SearchForm(
+            data={"time_start": "2030-01-01 18:00", "time_end": "2030-01-01 17:00"}
+        )
+        self.assertFalse(form.is_valid())
@@ -0,0 +1,170 @@
+import math
+import os
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from pitch.factory import PitchFactory
+from pitch.geo import KM_PER_DEGREE, covering_cells, geocode, geohash, read_geocodes
+from pitch.models import Pitch
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    chord = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * 6371.0 * math.asin(math.sqrt(chord))
+
+
+class GeohashTest(TestCase):
+    def test_geohash(self):
+        self.assertEqual(geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(geohash(21.0285, 105.8542), "w7er8u0e")
+
+    def test_cells_cover_the_circle(self):
+        rnd = random.Random(1)
+        for latitude, longitude, radius in (
+            (21.0285, 105.8542, 0.5),
+            (21.0285, 105.8542, 5),
+            (-33.9, 18.4, 20),
+            (10.0, 179.99, 3),
+        ):
+            cells = covering_cells(latitude, longitude, radius)
+            self.assertLessEqual(len(cells), 9)
+            for _ in range(200):
+                # Points on the edge of the radius, in every direction.
+                angle = rnd.uniform(0, 2 * math.pi)
+                lat = latitude + radius / KM_PER_DEGREE * math.sin(angle)
+                lon = longitude + radius / KM_PER_DEGREE * math.cos(angle) / math.cos(
+                    math.radians(latitude)
+                )
+                lon = (lon + 180) % 360 - 180
+                self.assertTrue(
+                    any(geohash(lat, lon).startswith(cell) for cell in cells)
+                )
+
+    def test_huge_radius_is_not_narrowed(self):
+        self.assertIsNone(covering_cells(21.0, 105.8, 10000))
+
+
+class GeocodeTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.table = os.path.join(directory, "geocodes.csv")
+        with open(self.table, "w", encoding="utf-8") as table:
+            table.write(
+                "address,latitude,longitude\n"
+                "Hà Nội,21.0285,105.8542\n"
+                '"Cầu Giấy, Hà Nội",21.0362,105.7906\n'
+            )
+
+    def test_most_specific_entry_wins(self):
+        geocodes = read_geocodes(self.table)
+        self.assertEqual(
+            geocode("12 Xuân Thủy, Quận Cầu Giấy, Hà Nội", geocodes),
+            (21.0362, 105.7906),
+        )
+        self.assertEqual(geocode("1 Tràng Tiền, Hà Nội", geocodes), (21.0285, 105.8542))
+        self.assertIsNone(geocode("Đà Nẵng", geocodes))
+
+    def test_command_fills_missing_coordinates(self):
+        located = PitchFactory(address="Số 5, quận Cầu Giấy, Hà Nội")
+        unknown = PitchFactory(address="Đà Nẵng")
+        kept = PitchFactory(address="Hà Nội", latitude=1, longitude=2)
+        out = StringIO()
+        call_command("geocode_pitches", table=self.table, stdout=out)
+        self.assertIn("Located 1 pitches, 1 addresses", out.getvalue())
+        located.refresh_from_db()
+        self.assertEqual((located.latitude, located.longitude), (21.0362, 105.7906))
+        self.assertEqual(located.geocell, geohash(21.0362, 105.7906))
+        unknown.refresh_from_db()
+        self.assertIsNone(unknown.latitude)
+        kept.refresh_from_db()
+        self.assertEqual(kept.geocell, geohash(1, 2))
+
+    def test_new_address_clears_the_coordinates(self):
+        pitch = PitchFactory(address="Cầu Giấy, Hà Nội", latitude=1, longitude=2)
+        pitch = Pitch.objects.get(pk=pitch.pk)
+        pitch.title = "Renamed"
+        pitch.save()
+        self.assertEqual(pitch.geocell, geohash(1, 2))
+        pitch.address = "Đà Nẵng"
+        pitch.save()
+        pitch.refresh_from_db()
+        self.assertEqual((pitch.latitude, pitch.longitude, pitch.geocell), (None,) * 3)
+
+        pitch.address, pitch.latitude, pitch.longitude = "Hà Nội", 3, 4
+        pitch.save()
+        pitch.refresh_from_db()
+        self.assertEqual(pitch.geocell, geohash(3, 4))
+
+
+class NearSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(2)
+        for _ in range(60):
+            PitchFactory(
+                latitude=21.0285 + rnd.uniform(-0.04, 0.04),
+                longitude=105.8542 + rnd.uniform(-0.04, 0.04),
+                size=rnd.choice(["1", "2"]),
+            )
+        PitchFactory()
+
+    def search(self, **params):
+        response = self.client.get(reverse("search"), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def expected(self, radius, size=None):
+        pitches = Pitch.objects.filter(latitude__isnull=False)
+        if size:
+            pitches = pitches.filter(size=size)
+        found = [
+            (haversine(21.03, 105.85, pitch.latitude, pitch.longitude), pitch.pk)
+            for pitch in pitches
+        ]
+        return [pk for distance, pk in sorted(found) if distance <= radius]
+
+    def test_nearest_first_within_the_radius(self):
+        pks = []
+        response = self.search(near="21.03,105.85", radius=4)
+        while True:
+            pks += [pitch.pk for pitch in response.context["page_obj"]]
+            if "next" not in response.context["page_links"]:
+                break
+            response = self.client.get(
+                reverse("search") + response.context["page_links"]["next"]
+            )
+        self.assertEqual(pks, self.expected(4))
+        self.assertGreater(len(pks), 10)
+
+    def test_combines_with_the_filters(self):
+        response = self.search(near="21.03, 105.85", radius=3, size="2")
+        self.assertEqual(
+            [pitch.pk for pitch in response.context["page_obj"]],
+            self.expected(3, "2")[:10],
+        )
+
+    def test_invalid_location(self):
+        response = self.search(near="somewhere")
+        self.assertIn("near", response.context["form"].errors)
+        response = self.search(near="91,105")
+        self.assertIn("near", response.context["form"].errors)
+
+    def test_api_orders_by_distance(self):
+        response = self.client.get(
+            reverse("api-search-pitches"), {"near": "21.03,105.85", "radius": 4}
+        )
+        self.assertEqual(
+            [pitch["id"] for pitch in response.data["results"]],
+            self.expected(4)[:10],
+        )
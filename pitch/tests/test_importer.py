@@ -0,0 +1,450 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+import openpyxl
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from pitch.factory import PitchFactory, UserFactory
+from pitch.importer import (
+    IMPORT_JOB_MAX_ATTEMPTS,
+    assign_ids,
+    import_pitch_chunks,
+    import_pitch_frame,
+    natural_key,
+    pitch_key,
+    read_pitch_chunks,
+    validate_pitch_chunks,
+    validate_pitch_frame,
+)
+from pitch.models import Image, ImportJob, Pitch
+
+
+def pitch_row(**kwargs):
+    row = {
+        "address": "1 Pitch street",
+        "title": "Imported pitch",
+        "description": "Imported",
+        "phone": "0912345678",
+        "size": "1",
+        "surface": "a",
+        "price": 100000,
+        "image1": "uploads/1.jpg",
+        "image2": "uploads/2.jpg",
+        "image3": None,
+    }
+    row.update(kwargs)
+    return row
+
+
+class ValidatePitchFrameTest(TestCase):
+    def test_reports_each_invalid_row(self):
+        df = pd.DataFrame(
+            [
+                pitch_row(),
+                pitch_row(title=None, price=None),
+                pitch_row(size="9", price=-1),
+                pitch_row(title="x" * 201),
+            ]
+        )
+        valid, errors = validate_pitch_frame(df)
+        self.assertEqual(list(valid.index), [0])
+        self.assertEqual(errors[1], "Required fields cannot be empty: title, price")
+        self.assertEqual(
+            errors[2],
+            "Size: Value '9' is not a valid choice.; "
+            "Price: '-1' must be a whole number between 0 and 2000000000.",
+        )
+        self.assertIn("Title: Ensure this value has at most 200 characters", errors[3])
+
+    def test_numeric_cells_are_read_as_text(self):
+        valid, errors = validate_pitch_frame(
+            pd.DataFrame([pitch_row(size=2.0, phone=912345678.0)])
+        )
+        self.assertTrue(errors.empty)
+        self.assertEqual(valid.iloc[0]["size"], "2")
+        self.assertEqual(valid.iloc[0]["phone"], "912345678")
+
+
+class ImportPitchFrameTest(TestCase):
+    def test_imports_in_batches(self):
+        df = pd.DataFrame(
+            [pitch_row(title="Pitch %d" % i) for i in range(5)]
+            + [pitch_row(surface="z")]
+        )
+        result = import_pitch_frame(df, batch_size=2)
+        self.assertEqual((result.pitches, result.failed_pitches), (5, 1))
+        self.assertEqual(result.images, 10)
+        self.assertEqual(
+            result.errors, ["Error at row 7: Surface: Value 'z' is not a valid choice."]
+        )
+        self.assertEqual(Pitch.objects.count(), 5)
+        pitch = Pitch.objects.get(title="Pitch 3")
+        self.assertEqual(
+            sorted(pitch.image.values_list("image", flat=True)),
+            ["uploads/1.jpg", "uploads/2.jpg"],
+        )
+        self.assertEqual(pitch.card.banner_url, "/media/uploads/1.jpg")
+
+    def test_ids_are_read_back_by_import_token(self):
+        # Two chunks with the same keys whose rows interleave, as concurrent
+        # imports' inserts can.
+        rows = [("A", "1 street"), ("B", "1 street"), ("A", "1 street")]
+        inserted = {"first": [], "second": []}
+        for title, address in rows:
+            for token in inserted:
+                inserted[token].append(
+                    Pitch.objects.create(
+                        title=title,
+                        address=address,
+                        price=1,
+                        import_token=token,
+                    ).pk
+                )
+        for token, pks in inserted.items():
+            pitches = [Pitch(title=title, address=address) for title, address in rows]
+            assign_ids(pitches, token)
+            self.assertEqual([pitch.pk for pitch in pitches], pks)
+        with self.assertRaises(DatabaseError):
+            assign_ids([Pitch(title="C", address="1 street")], "first")
+
+    def test_chunks_insert_with_their_own_token(self):
+        import_pitch_frame(pd.DataFrame([pitch_row(), pitch_row()]), batch_size=1)
+        tokens = list(Pitch.objects.values_list("import_token", flat=True))
+        self.assertEqual(len(set(tokens)), 2)
+        self.assertNotIn(None, tokens)
+
+    def test_image_errors_keep_the_pitch(self):
+        result = import_pitch_frame(pd.DataFrame([pitch_row(image2="x" * 101)]))
+        self.assertEqual((result.pitches, result.images), (1, 1))
+        self.assertEqual(result.failed_images, 1)
+        self.assertTrue(result.image_errors[0].startswith("Error at row 2, image2:"))
+        self.assertEqual(Image.objects.count(), 1)
+
+
+class UpsertPitchFrameTest(TestCase):
+    def setUp(self):
+        import_pitch_frame(
+            pd.DataFrame(
+                [
+                    pitch_row(title="Pitch A"),
+                    pitch_row(title="Pitch B", image3="uploads/3.jpg"),
+                ]
+            )
+        )
+
+    def test_only_changed_rows_are_written(self):
+        df = pd.DataFrame(
+            [
+                pitch_row(title="Pitch A"),
+                pitch_row(
+                    title="Pitch B", price=200000, image2=None, image3="uploads/3.jpg"
+                ),
+                pitch_row(title="Pitch C"),
+            ]
+        )
+        with CaptureQueriesContext(connection) as queries:
+            result = import_pitch_frame(df, key=("title", "address"))
+        self.assertEqual((result.pitches, result.updated, result.unchanged), (1, 1, 1))
+        self.assertEqual((result.images, result.removed_images), (2, 1))
+        update = "UPDATE %s" % connection.ops.quote_name("pitches")
+        updates = [q["sql"] for q in queries if q["sql"].startswith(update)]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(Pitch.objects.count(), 3)
+        pitch = Pitch.objects.get(title="Pitch B")
+        self.assertEqual(pitch.price, 200000)
+        self.assertEqual(pitch.card.banner_url, "/media/uploads/1.jpg")
+        self.assertEqual(
+            sorted(pitch.image.values_list("image", flat=True)),
+            ["uploads/1.jpg", "uploads/3.jpg"],
+        )
+
+    def test_resync_is_idempotent(self):
+        df = pd.DataFrame([pitch_row(title="Pitch A"), pitch_row(title="Pitch B")])
+        import_pitch_frame(df, key=("title", "address"))
+        images = list(Image.objects.order_by("pk").values_list("pk", flat=True))
+        result = import_pitch_frame(df, key=("title", "address"))
+        self.assertEqual((result.updated, result.unchanged), (0, 2))
+        self.assertEqual((result.images, result.removed_images), (0, 0))
+        self.assertEqual(
+            list(Image.objects.order_by("pk").values_list("pk", flat=True)), images
+        )
+
+    def test_repeated_key_keeps_the_last_row(self):
+        df = pd.DataFrame(
+            [
+                pitch_row(title="Pitch D", price=1),
+                pitch_row(title="Pitch E"),
+                pitch_row(title="pitch đ", price=2),
+            ]
+        )
+        result = import_pitch_frame(df, key=("title",))
+        self.assertEqual(Pitch.objects.get(title="pitch đ").price, 2)
+        self.assertFalse(Pitch.objects.filter(title="Pitch D").exists())
+        self.assertEqual(result.failed_pitches, 1)
+        self.assertEqual(
+            result.errors,
+            ["Error at row 2: Repeated by row 4, which is imported instead."],
+        )
+
+    def test_empty_image_columns_keep_the_images(self):
+        df = pd.DataFrame([pitch_row(title="Pitch B", image1=None, image2=None)])
+        result = import_pitch_frame(df, key=("title", "address"))
+        self.assertEqual((result.unchanged, result.removed_images), (1, 0))
+        self.assertEqual(Image.objects.filter(pitch__title="Pitch B").count(), 3)
+
+    def test_new_address_drops_the_coordinates(self):
+        Pitch.objects.filter(title__in=["Pitch A", "Pitch B"]).update(
+            latitude=21.03, longitude=105.78, geocell="w7er8u0d"
+        )
+        df = pd.DataFrame(
+            [
+                pitch_row(title="Pitch A", address="2 Pitch street"),
+                pitch_row(title="Pitch B", price=200000),
+            ]
+        )
+        result = import_pitch_frame(df, key=("title",))
+        self.assertEqual(result.updated, 2)
+        moved = Pitch.objects.get(title="Pitch A")
+        self.assertEqual(moved.address, "2 Pitch street")
+        self.assertEqual((moved.latitude, moved.longitude, moved.geocell), (None,) * 3)
+        kept = Pitch.objects.get(title="Pitch B")
+        self.assertEqual(
+            (kept.latitude, kept.longitude, kept.geocell), (21.03, 105.78, "w7er8u0d")
+        )
+
+    def test_key_ignores_case_and_accents(self):
+        self.assertEqual(
+            pitch_key(Pitch(title="Sân Mỹ Đình"), ("title",)), ("san my dinh",)
+        )
+
+    def test_unknown_key_field(self):
+        with self.assertRaises(ValueError):
+            natural_key(["title", "colour"])
+
+
+class ReadPitchChunksTest(TestCase):
+    def workbook(self, rows):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = "PitchData"
+        sheet.append(list(pitch_row().keys()))
+        for row in rows:
+            sheet.append(list(row.values()) if row else [])
+        content = io.BytesIO()
+        workbook.save(content)
+        return content.getvalue()
+
+    def test_xlsx_chunks_keep_row_numbers(self):
+        upload = SimpleUploadedFile(
+            "pitches.xlsx",
+            self.workbook([pitch_row(), pitch_row(), None, pitch_row(size="9")]),
+        )
+        chunks = list(read_pitch_chunks(upload, chunk_size=2))
+        self.assertEqual([list(chunk.index) for chunk in chunks], [[0, 1], [3]])
+        result = import_pitch_chunks(chunks)
+        self.assertEqual(result.pitches, 2)
+        self.assertEqual(
+            result.errors, ["Error at row 5: Size: Value '9' is not a valid choice."]
+        )
+
+    def test_spooled_upload_is_read_from_disk(self):
+        upload = TemporaryUploadedFile("pitches.xlsx", None, 0, None)
+        upload.write(self.workbook([pitch_row()] * 3))
+        upload.flush()
+        self.addCleanup(upload.close)
+        chunks = list(read_pitch_chunks(upload, chunk_size=2))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 3)
+
+    def test_csv_chunks(self):
+        content = pd.DataFrame([pitch_row(phone="0912345678")] * 5).to_csv(index=False)
+        upload = SimpleUploadedFile("pitches.csv", content.encode("utf-8-sig"))
+        chunks = list(read_pitch_chunks(upload, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(list(chunks[2].index), [4])
+        self.assertEqual(chunks[0]["phone"][0], "0912345678")
+        self.assertEqual(import_pitch_chunks(chunks).pitches, 5)
+
+
+class ValidatePitchChunksTest(TestCase):
+    def chunks(self):
+        df = pd.DataFrame(
+            [pitch_row(), pitch_row(size="9"), pitch_row(image1="x" * 101)] * 2
+        )
+        return [df.iloc[:3], df.iloc[3:]]
+
+    def test_reports_every_error_without_writing(self):
+        result = validate_pitch_chunks(self.chunks(), workers=1)
+        self.assertEqual((result.pitches, result.failed_pitches), (4, 2))
+        self.assertEqual((result.images, result.failed_images), (6, 2))
+        self.assertEqual(
+            result.errors,
+            [
+                "Error at row 3: Size: Value '9' is not a valid choice.",
+                "Error at row 6: Size: Value '9' is not a valid choice.",
+            ],
+        )
+        self.assertEqual(Pitch.objects.count(), 0)
+
+    def test_process_pool_matches_inline_run(self):
+        inline = validate_pitch_chunks(self.chunks(), workers=1)
+        pooled = validate_pitch_chunks(self.chunks(), workers=2)
+        self.assertEqual(vars(pooled), vars(inline))
+
+
+class UploadPitchDataViewTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        admin = UserFactory(is_superuser=True, is_staff=True)
+        self.client.login(username=admin.username, password="admin@123")
+
+    def upload(self, name, content):
+        return self.client.post(
+            reverse("upload_pitch_data"),
+            {"excel_file": SimpleUploadedFile(name, content)},
+        )
+
+    def workbook(self, rows):
+        content = io.BytesIO()
+        pd.DataFrame(rows).to_excel(content, sheet_name="PitchData", index=False)
+        return content.getvalue()
+
+    def test_upload_queues_a_job(self):
+        response = self.upload("pitches.xlsx", self.workbook([pitch_row()]))
+        job = ImportJob.objects.get()
+        self.assertRedirects(
+            response, reverse("upload_pitch_data") + "?job=%d" % job.pk
+        )
+        self.assertEqual(job.status, "p")
+        self.assertEqual(Pitch.objects.count(), 0)
+        self.assertContains(
+            self.client.get(response.url),
+            reverse("import_job_status", args=[job.pk]),
+        )
+
+    def test_same_file_is_queued_once(self):
+        content = self.workbook([pitch_row()])
+        self.upload("pitches.xlsx", content)
+        self.upload("pitches.xlsx", content)
+        self.assertEqual(ImportJob.objects.count(), 1)
+
+    def test_worker_imports_the_job(self):
+        self.upload("pitches.xlsx", self.workbook([pitch_row(), pitch_row(size="")]))
+        call_command("run_import_jobs", stdout=io.StringIO())
+        job = ImportJob.objects.get()
+        response = self.client.get(reverse("import_job_status", args=[job.pk]))
+        data = response.json()
+        self.assertEqual((data["status"], data["percent"]), ("d", 100))
+        self.assertEqual((data["pitches"], data["failed_pitches"]), (1, 1))
+        self.assertEqual(
+            data["errors"],
+            [
+                "PitchData import: Error at row 3: "
+                "Required fields cannot be empty: size"
+            ],
+        )
+        self.assertEqual(Pitch.objects.count(), 1)
+
+    def test_job_resumes_from_its_checkpoint(self):
+        rows = [pitch_row(title="Pitch %d" % i) for i in range(5)]
+        content = pd.DataFrame(rows).to_csv(index=False).encode()
+        self.upload("pitches.csv", content)
+        job = ImportJob.objects.get()
+        # A worker died after committing the first three rows.
+        import_pitch_frame(pd.DataFrame(rows[:3]))
+        ImportJob.objects.filter(pk=job.pk).update(
+            status="r", next_row=3, pitches=3, total_rows=5
+        )
+        call_command("run_import_jobs", chunk_size=2, stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.pitches, job.next_row), ("d", 5, 5))
+        self.assertEqual(
+            sorted(Pitch.objects.values_list("title", flat=True)),
+            ["Pitch %d" % i for i in range(5)],
+        )
+        self.assertEqual(Image.objects.count(), 10)
+
+    def test_database_errors_leave_the_job_pending(self):
+        self.client.post(
+            reverse("upload_pitch_data"),
+            {"excel_file": SimpleUploadedFile("p.xlsx", self.workbook([pitch_row()]))},
+        )
+        with mock.patch(
+            "pitch.importer.checkpoint",
+            side_effect=OperationalError(1213, "Deadlock found"),
+        ):
+            call_command("run_import_jobs", stdout=io.StringIO())
+            job = ImportJob.objects.get()
+            self.assertEqual((job.status, job.attempts), ("p", 1))
+            self.assertEqual(job.errors, [])
+
+            ImportJob.objects.update(
+                attempts=IMPORT_JOB_MAX_ATTEMPTS - 1, lease_until=timezone.now()
+            )
+            call_command("run_import_jobs", stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "f")
+        self.assertIn("Deadlock found", job.errors[0])
+
+    def test_upsert_job_updates_existing_pitches(self):
+        import_pitch_frame(pd.DataFrame([pitch_row()]))
+        self.client.post(
+            reverse("upload_pitch_data"),
+            {
+                "excel_file": SimpleUploadedFile(
+                    "pitches.xlsx", self.workbook([pitch_row(price=300000)])
+                ),
+                "upsert": "1",
+            },
+        )
+        call_command("run_import_jobs", stdout=io.StringIO())
+        job = ImportJob.objects.get()
+        self.assertEqual((job.mode, job.pitches, job.updated_pitches), ("u", 0, 1))
+        self.assertEqual(Pitch.objects.get().price, 300000)
+
+    def test_dry_run_reports_without_importing(self):
+        response = self.client.post(
+            reverse("upload_pitch_data"),
+            {
+                "excel_file": SimpleUploadedFile(
+                    "pitches.xlsx", self.workbook([pitch_row(), pitch_row(price=-1)])
+                ),
+                "dry_run": "1",
+            },
+        )
+        self.assertContains(response, "PitchData valid: 1 records.")
+        self.assertContains(
+            response,
+            "PitchData import: Error at row 3: Price: &#x27;-1&#x27; must be a whole",
+        )
+        self.assertFalse(ImportJob.objects.exists())
+        self.assertEqual(Pitch.objects.count(), 0)
+
+    def test_dry_run_validates_in_the_request_process(self):
+        with mock.patch(
+            "pitch.views.validate_pitch_chunks", wraps=validate_pitch_chunks
+        ) as validate:
+            response = self.client.post(
+                reverse("upload_pitch_data"),
+                {
+                    "excel_file": SimpleUploadedFile(
+                        "pitches.xlsx", self.workbook([pitch_row()])
+                    ),
+                    "dry_run": "1",
+                },
+            )
+        self.assertEqual(validate.call_args.kwargs["workers"], 1)
+        self.assertContains(response, "PitchData valid: 1 records.")
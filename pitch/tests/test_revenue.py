@@ -0,0 +1,107 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from pitch.custom_fnc import last_month_range, query_statistic
+from pitch.factory import OrderFactory, PitchFactory, UserFactory
+from pitch.models import Order, PitchDailyRevenue
+
+
+def rollup(pitch):
+    return sorted(
+        PitchDailyRevenue.objects.filter(pitch=pitch).values_list(
+            "day", "status", "revenue", "count_order"
+        )
+    )
+
+
+class PitchDailyRevenueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.pitch = PitchFactory(price=100)
+        cls.other_pitch = PitchFactory(price=100)
+        cls.start = timezone.localtime().replace(
+            hour=9, minute=0, second=0, microsecond=0
+        ) + datetime.timedelta(days=2)
+        cls.day = cls.start.date()
+
+    def test_created_orders_are_added(self):
+        OrderFactory(renter=self.user, pitch=self.pitch, time_start=self.start)
+        OrderFactory(
+            renter=self.user,
+            pitch=self.pitch,
+            time_start=self.start + datetime.timedelta(hours=2),
+        )
+        self.assertEqual(rollup(self.pitch), [(self.day, "o", 200, 2)])
+
+    def test_status_change_moves_the_order(self):
+        order = OrderFactory(renter=self.user, pitch=self.pitch, time_start=self.start)
+        order = Order.objects.get(pk=order.pk)
+        order.status = "c"
+        order.save()
+        self.assertEqual(rollup(self.pitch), [(self.day, "c", 100, 1)])
+
+    def test_moving_to_another_pitch_and_day(self):
+        order = OrderFactory(renter=self.user, pitch=self.pitch, time_start=self.start)
+        order.pitch = self.other_pitch
+        order.time_start += datetime.timedelta(days=1)
+        order.time_end += datetime.timedelta(days=1)
+        order.cost = 150
+        order.save()
+        self.assertEqual(rollup(self.pitch), [])
+        self.assertEqual(
+            rollup(self.other_pitch),
+            [(self.day + datetime.timedelta(days=1), "o", 150, 1)],
+        )
+
+    def test_deleted_order_is_removed(self):
+        order = OrderFactory(renter=self.user, pitch=self.pitch, time_start=self.start)
+        order.delete()
+        self.assertEqual(rollup(self.pitch), [])
+
+    def test_save_without_loaded_values_recounts_the_day(self):
+        order = OrderFactory(renter=self.user, pitch=self.pitch, time_start=self.start)
+        unloaded = Order(
+            **{
+                f.attname: getattr(order, f.attname)
+                for f in Order._meta.concrete_fields
+            }
+        )
+        unloaded.status = "c"
+        unloaded.save()
+        self.assertEqual(rollup(self.pitch), [(self.day, "c", 100, 1)])
+
+    def test_rebuild_matches_incremental_rollup(self):
+        for hours in range(0, 6, 2):
+            OrderFactory(
+                renter=self.user,
+                pitch=self.pitch,
+                time_start=self.start + datetime.timedelta(hours=hours),
+                status="c" if hours else "o",
+            )
+        expected = rollup(self.pitch)
+        PitchDailyRevenue.objects.all().delete()
+        call_command("rebuild_revenue_rollup", stdout=StringIO())
+        self.assertEqual(rollup(self.pitch), expected)
+
+    def test_query_statistic_reads_last_month(self):
+        first_day, last_day = last_month_range()
+        time_start = timezone.make_aware(
+            datetime.datetime.combine(last_day, datetime.time(10))
+        )
+        OrderFactory(renter=self.user, pitch=self.pitch, time_start=time_start)
+        OrderFactory(renter=self.user, pitch=self.other_pitch, time_start=self.start)
+        pitches = list(query_statistic())
+        self.assertEqual([pitch.pk for pitch in pitches], [self.pitch.pk])
+        self.assertEqual(pitches[0].revenues, 100)
+        self.assertEqual(pitches[0].count, 1)
+
+    def test_last_month_range_in_january(self):
+        self.assertEqual(
+            last_month_range(datetime.date(2024, 1, 15)),
+            (datetime.date(2023, 12, 1), datetime.date(2023, 12, 31)),
+        )
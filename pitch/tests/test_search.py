@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from pitch.factory import PitchFactory
+from pitch.models import Pitch
+from pitch.search import keyset_page
+
+
+class KeysetPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated prices, so the pk has to break the ties.
+        for index in range(25):
+            PitchFactory(price=100000 * (index % 4))
+
+    def walk(self, pitches, per_page=10):
+        pages, cursor = [], None
+        while True:
+            page = keyset_page(pitches, cursor, per_page)
+            pages.append([pitch.pk for pitch in page])
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_the_ordering_once(self):
+        for order in (("price", "pk"), ("-price", "pk")):
+            pitches = Pitch.objects.order_by(*order)
+            pages = self.walk(pitches)
+            self.assertEqual([len(page) for page in pages], [10, 10, 5])
+            self.assertEqual(sum(pages, []), list(pitches.values_list("pk", flat=True)))
+
+    def test_previous_goes_back_a_page(self):
+        pitches = Pitch.objects.order_by("-price", "pk")
+        first = keyset_page(pitches)
+        self.assertFalse(first.has_previous())
+        second = keyset_page(pitches, first.next_cursor)
+        third = keyset_page(pitches, second.next_cursor)
+        back = keyset_page(pitches, third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertTrue(back.has_next())
+        start = keyset_page(pitches, back.previous_cursor)
+        self.assertEqual(list(start), list(first))
+        self.assertFalse(start.has_previous())
+
+    def test_deep_pages_are_one_query(self):
+        pitches = Pitch.objects.order_by("price", "pk")
+        page = keyset_page(pitches, per_page=5)
+        for _ in range(4):
+            with self.assertNumQueries(1):
+                page = keyset_page(pitches, page.next_cursor, 5)
+
+    def test_tampered_cursor_gives_the_first_page(self):
+        pitches = Pitch.objects.order_by("price", "pk")
+        cursor = keyset_page(pitches).next_cursor
+        page = keyset_page(pitches, cursor[:-2] + "xx")
+        self.assertEqual(list(page), list(pitches[:10]))
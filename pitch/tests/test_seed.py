@@ -0,0 +1,77 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase
+
+from pitch.models import (
+    Comment,
+    Favorite,
+    Image,
+    Order,
+    Pitch,
+    PitchDailyRevenue,
+    PitchDaySlots,
+    PitchRating,
+)
+
+
+def seed(**options):
+    call_command(
+        "seed",
+        users=20,
+        pitches=5,
+        orders=200,
+        comments=40,
+        favorites=30,
+        vouchers=2,
+        days=30,
+        stdout=StringIO(),
+        **options,
+    )
+
+
+class SeedCommandTest(TestCase):
+    def test_generates_the_requested_dataset(self):
+        seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Pitch.objects.count(), 5)
+        self.assertEqual(Image.objects.count(), 15)
+        self.assertEqual(Order.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Comment.objects.filter(parent__isnull=False).count(), 12)
+        self.assertEqual(Favorite.objects.count(), 30)
+        # No pitch is booked twice for the same hour.
+        self.assertFalse(
+            Order.objects.values("pitch", "time_start")
+            .annotate(n=Count("id"))
+            .filter(n__gt=1)
+            .exists()
+        )
+        self.assertTrue(PitchDaySlots.objects.exists())
+        self.assertEqual(
+            sum(PitchDailyRevenue.objects.values_list("count_order", flat=True)), 200
+        )
+        self.assertEqual(
+            sum(PitchRating.objects.values_list("count_comment", flat=True)), 28
+        )
+
+    def test_same_seed_gives_the_same_data(self):
+        def snapshot():
+            # Keys continue after existing rows, so compare them by offset.
+            first_pitch = Pitch.objects.order_by("pk")[0].pk
+            first_user = User.objects.order_by("pk")[0].pk
+            return [
+                (pitch_id - first_pitch, renter_id - first_user, time_start, status)
+                for pitch_id, renter_id, time_start, status in Order.objects.order_by(
+                    "pk"
+                ).values_list("pitch_id", "renter_id", "time_start", "status")
+            ]
+
+        seed(seed=7)
+        first = snapshot()
+        Pitch.objects.all().delete()
+        User.objects.all().delete()
+        seed(seed=7)
+        self.assertEqual(snapshot(), first)
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from pitch import textindex
+from pitch.factory import PitchFactory
+from pitch.textindex import (
+    TextIndex,
+    fold,
+    rebuild_search_index,
+    search_index,
+    tokenize,
+)
+
+
+class TokenizeTest(TestCase):
+    def test_folds_vietnamese_marks(self):
+        self.assertEqual(fold("Sân bóng Đà Nẵng"), "san bong da nang")
+
+    def test_indexes_adjacent_syllables(self):
+        self.assertEqual(
+            tokenize("Sân bóng, Mỹ Đình"),
+            ["san", "bong", "my", "dinh", "san bong", "bong my", "my dinh"],
+        )
+
+
+class TextIndexTest(TestCase):
+    def setUp(self):
+        self.index = TextIndex()
+        self.index.add(1, "Sân bóng Mỹ Đình", "Cỏ nhân tạo, gần sân vận động")
+        self.index.add(2, "Sân Hoàng Mai", "Có bãi đỗ xe, bóng đá mini")
+        self.index.add(3, "Hoang Mai arena", "Natural grass")
+
+    def ids(self, index, query):
+        return [pitch_id for pitch_id, _ in index.search(query, 10)]
+
+    def test_ranks_by_bm25(self):
+        self.assertEqual(self.ids(self.index, "san bong"), [1, 2])
+        self.assertEqual(self.ids(self.index, "hoàng mai"), [3, 2])
+        self.assertEqual(self.ids(self.index, "stadium"), [])
+
+    def test_updates_and_removals(self):
+        self.index.add(3, "Sân bóng Cầu Giấy", "")
+        self.index.remove(1)
+        self.assertEqual(self.ids(self.index, "san bong"), [3, 2])
+        self.assertEqual(self.ids(self.index, "arena"), [])
+
+    def test_snapshot_round_trip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "index")
+        self.index.save(path)
+        loaded = TextIndex.load(path)
+        self.assertEqual(
+            loaded.search("san bong", 10), self.index.search("san bong", 10)
+        )
+        # Changes after loading hide the mapped postings of that pitch.
+        loaded.add(2, "Hoang Mai", "")
+        self.assertEqual(self.ids(loaded, "san bong"), [1])
+        self.assertEqual(self.ids(loaded, "hoang mai"), [2, 3])
+
+
+class SearchEngineTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(
+            PITCH_SEARCH_ENGINE="bm25",
+            PITCH_SEARCH_INDEX=os.path.join(directory, "index"),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(setattr, textindex, "_index", None)
+        textindex._index = None
+        self.near = PitchFactory(title="Sân bóng Mỹ Đình", price=300000)
+        self.far = PitchFactory(title="Sân Cầu Giấy", price=100000)
+        rebuild_search_index()
+
+    def search(self, q, **filters):
+        response = self.client.get(reverse("search"), {"q": q, **filters})
+        return list(response.context["page_obj"])
+
+    def test_search_view_ranks_by_score(self):
+        self.assertEqual(self.search("san bong my dinh"), [self.near, self.far])
+        self.assertEqual(self.search("cau giay"), [self.far])
+
+    def test_pitch_saves_update_the_loaded_index(self):
+        search_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.far.title = "Sân bóng Mỹ Đình 2"
+            self.far.save()
+        self.assertEqual(self.search("cau giay"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.near.delete()
+        self.assertEqual(self.search("my dinh"), [self.far])
+
+    def test_filters_apply_before_the_hit_limit(self):
+        with mock.patch("pitch.search.MAX_HITS", 1):
+            self.assertEqual(self.search("san bong", price=200000), [self.far])
+
+    def test_missing_snapshot_searches_the_database(self):
+        os.remove(textindex.index_path())
+        self.assertEqual(self.search("Cầu Giấy"), [self.far])
+        self.assertIsNone(textindex._index)
+        self.assertFalse(os.path.exists(textindex.index_path()))
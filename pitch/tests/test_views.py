@@ -1,15 +1,20 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.test import Client
 from django.urls import reverse
 from pitch.factory import PitchFactory, UserFactory, OrderFactory
+from pitch.export import order_rows, purge_exports
 from django.utils import timezone
 import datetime
 from django.core import mail
 from django.contrib.auth.models import User
-from account.models import EmailVerify
+from account.models import EmailVerify, EmailOutbox
 import uuid
-from pitch.models import Order, Comment, AccessComment
-from django.db import connections
+from pitch.models import Order, Comment, AccessComment, ExportJob
 
 
 class HomeViewTest(TestCase):
@@ -39,9 +44,6 @@ class SearchViewTest(TestCase):
             PitchFactory(size="3") if x < 10 else PitchFactory(surface="m")
             for x in range(0, 20)
         ]
-        cursor = connections["default"].cursor()
-        cursor.execute("ALTER TABLE pitches ADD FULLTEXT(title, description)")
-        cursor.close()
 
     def test_redirect(self):
         response = self.client.get(reverse("search"))
@@ -79,6 +81,25 @@ class SearchViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context["page_obj"]), 0)
 
+    def test_search_keywords_are_bound_parameters(self):
+        response = self.client.get(reverse("search"), {"q": "x' OR '1'='1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page_obj"]), 0)
+
+    def test_search_next_page_keeps_the_filters(self):
+        response = self.client.get(reverse("search"), {"price": "1000000"})
+        self.assertIn("price=1000000", response.context["page_links"]["next"])
+        response = self.client.get(
+            reverse("search") + response.context["page_links"]["next"]
+        )
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        self.assertEqual(list(response.context["page_links"]), ["previous"])
+
+    def test_search_ordered_by_price(self):
+        response = self.client.get(reverse("search"), QUERY_STRING="size=3")
+        prices = [pitch.price for pitch in response.context["page_obj"]]
+        self.assertEqual(prices, sorted(prices))
+
 
 class DetailPitchViewTest(TestCase):
     @classmethod
@@ -120,7 +141,7 @@ class DetailPitchViewTest(TestCase):
         )
         self.assertTrue(order.exists())
         self.assertEqual(order[0].status, "o")
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
 
 
 class ListMyOrderViewTest(TestCase):
@@ -210,7 +231,7 @@ class DetailOrderViewTest(TestCase):
             data={"status": "o"},
         )
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
         self.assertEqual(Order.objects.get(pk=self.orders[0].id).status, "d")
 
 
@@ -261,7 +282,7 @@ class RegisterViewTest(TestCase):
         user = User.objects.get(email=email)
         self.assertIsNotNone(user)
         self.assertEqual(user.is_active, 0)
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
 
     def test_verify_email(self):
         username = "user"
@@ -489,3 +510,171 @@ class CommentViewTest(TestCase):
             ).exists()
         )
         self.assertEqual(Comment.objects.filter(renter=self.user).count(), 1)
+
+
+class ExportOrderAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserFactory(is_superuser=True, is_staff=True)
+        cls.user = UserFactory()
+        cls.pitch = PitchFactory(title="Export pitch", price=100)
+        cls.orders = [
+            OrderFactory(
+                renter=cls.user,
+                pitch=cls.pitch,
+                time_start=timezone.now() + datetime.timedelta(days=1, hours=2 * i),
+            )
+            for i in range(3)
+        ]
+
+    def test_export_streams_csv(self):
+        self.client.login(username=self.admin.username, password="admin@123")
+        response = self.client.post(
+            reverse("admin:pitch_order_changelist"),
+            {
+                "action": "export_as_csv",
+                "_selected_action": [order.id for order in self.orders],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn(".csv", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(
+            lines[0], "\ufeffid,renter,price,pitch,time_start,time_end,cost"
+        )
+        self.assertEqual(len(lines), 4)
+        self.assertIn(self.user.username, lines[1])
+        self.assertIn("Export pitch(", lines[1])
+
+    def test_rows_use_one_query(self):
+        with self.assertNumQueries(1):
+            rows = list(order_rows(Order.objects.all()))
+        self.assertEqual(len(rows), 3)
+
+    def test_rows_are_read_in_pk_chunks(self):
+        with self.assertNumQueries(2):
+            rows = list(order_rows(Order.objects.order_by("-pk"), chunk_size=2))
+        self.assertEqual([row[0] for row in rows], [order.pk for order in self.orders])
+
+
+class ExportJobTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserFactory(is_superuser=True, is_staff=True)
+        cls.user = UserFactory()
+        cls.pitch = PitchFactory(price=100)
+        cls.orders = [
+            OrderFactory(
+                renter=cls.user,
+                pitch=cls.pitch,
+                time_start=timezone.now() + datetime.timedelta(days=1, hours=2 * i),
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.login(username=self.admin.username, password="admin@123")
+
+    def queue(self):
+        return self.client.post(
+            reverse("admin:pitch_order_changelist"),
+            {
+                "action": "export_in_background",
+                "_selected_action": [order.id for order in self.orders],
+            },
+        )
+
+    def test_action_returns_before_export(self):
+        response = self.queue()
+        self.assertEqual(response.status_code, 302)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, "p")
+        self.assertFalse(job.file)
+
+    def test_identical_exports_share_a_job(self):
+        self.queue()
+        self.queue()
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.assertEqual(
+            ExportJob.objects.get().params,
+            {"pks": sorted(order.id for order in self.orders)},
+        )
+
+    def test_finished_export_is_not_reused(self):
+        self.queue()
+        call_command("run_export_jobs", workers=1, pause_ms=0, stdout=StringIO())
+        self.queue()
+        self.assertEqual(
+            list(ExportJob.objects.order_by("id").values_list("status", flat=True)),
+            ["d", "p"],
+        )
+
+    def test_select_across_exports_the_filtered_orders(self):
+        other = OrderFactory(renter=self.user, pitch=PitchFactory())
+        self.client.post(
+            reverse("admin:pitch_order_changelist")
+            + "?pitch__id__exact=%d" % self.pitch.pk,
+            {
+                "action": "export_in_background",
+                "select_across": "1",
+                "_selected_action": [self.orders[0].id],
+            },
+        )
+        job = ExportJob.objects.get()
+        self.assertEqual(
+            job.params, {"filters": {"pitch__id__exact": str(self.pitch.pk)}}
+        )
+        call_command("run_export_jobs", workers=1, pause_ms=0, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.total, 5)
+        self.assertNotIn("\n%d," % other.id, job.file.read().decode("utf-8-sig"))
+
+    def test_old_exports_are_purged(self):
+        self.queue()
+        call_command("run_export_jobs", workers=1, pause_ms=0, stdout=StringIO())
+        job = ExportJob.objects.get()
+        path = job.file.path
+        ExportJob.objects.update(
+            finished_date=timezone.now() - datetime.timedelta(days=8)
+        )
+        self.assertEqual(purge_exports(), 1)
+        self.assertFalse(ExportJob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_run_and_download(self):
+        self.queue()
+        job = ExportJob.objects.get()
+        call_command(
+            "run_export_jobs", workers=1, chunk_size=2, pause_ms=0, stdout=StringIO()
+        )
+        job.refresh_from_db()
+        self.assertEqual(job.status, "d")
+        self.assertEqual((job.total, job.processed), (5, 5))
+
+        response = self.client.get(
+            reverse("admin:pitch_exportjob_progress", args=[job.pk])
+        )
+        self.assertEqual(response.json()["percent"], 100)
+        self.assertEqual(
+            response.json()["download"],
+            reverse("admin:pitch_exportjob_download", args=[job.pk]),
+        )
+
+        response = self.client.get(response.json()["download"])
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertIn(self.user.username, lines[1])
+
+    def test_download_of_unfinished_job(self):
+        self.queue()
+        job = ExportJob.objects.get()
+        response = self.client.get(
+            reverse("admin:pitch_exportjob_download", args=[job.pk])
+        )
+        self.assertEqual(response.status_code, 404)
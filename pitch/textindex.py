@@ -0,0 +1,232 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from pitch.models import Pitch
+
+K1 = 1.2
+B = 0.75
+# Title words count this many times over description words.
+TITLE_WEIGHT = 2
+MAGIC = b"PTI1"
+HEADER = struct.Struct("<4sI")
+WORD = re.compile(r"\w+")
+FOLD = str.maketrans({"đ": "d", "Đ": "d"})
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def fold(text):
+    """Lowercase and strip the Vietnamese tone and vowel marks."""
+    text = unicodedata.normalize("NFD", text.translate(FOLD).lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    # Vietnamese words are runs of syllables, so adjacent syllables are indexed
+    # as a pair too; "san bong" then ranks "Sân bóng" above a stray "sân".
+    syllables = WORD.findall(fold(text or ""))
+    return syllables + ["%s %s" % pair for pair in zip(syllables, syllables[1:])]
+
+
+def pitch_terms(title, description):
+    return Counter(tokenize(title) * TITLE_WEIGHT + tokenize(description))
+
+
+class TextIndex:
+    """BM25 inverted index of pitch titles and descriptions.
+
+    A loaded snapshot is read in place from a memory map; later changes go to
+    an in-memory overlay and hide the snapshot postings of the pitches they
+    touch, until the next snapshot folds them in.
+    """
+
+    def __init__(self):
+        self.lengths = {}
+        self.total_length = 0
+        self.terms = {}
+        self.postings = None
+        self.stale = set()
+        self.overlay = {}
+        self.overlay_terms = {}
+        self.lock = threading.Lock()
+        self.mapped = None
+
+    def add(self, pitch_id, title, description):
+        terms = pitch_terms(title, description)
+        with self.lock:
+            self._remove(pitch_id)
+            for term, count in terms.items():
+                self.overlay.setdefault(term, {})[pitch_id] = count
+            self.overlay_terms[pitch_id] = list(terms)
+            self.lengths[pitch_id] = sum(terms.values())
+            self.total_length += self.lengths[pitch_id]
+
+    def remove(self, pitch_id):
+        with self.lock:
+            self._remove(pitch_id)
+
+    def _remove(self, pitch_id):
+        if pitch_id in self.lengths:
+            self.total_length -= self.lengths.pop(pitch_id)
+        if self.postings is not None:
+            self.stale.add(pitch_id)
+        for term in self.overlay_terms.pop(pitch_id, ()):
+            docs = self.overlay[term]
+            del docs[pitch_id]
+            if not docs:
+                del self.overlay[term]
+
+    def term_postings(self, term):
+        postings = []
+        if term in self.terms:
+            offset, count = self.terms[term]
+            pairs = self.postings[2 * offset : 2 * (offset + count)]
+            postings += [
+                (pairs[i], pairs[i + 1])
+                for i in range(0, len(pairs), 2)
+                if pairs[i] not in self.stale
+            ]
+        postings += self.overlay.get(term, {}).items()
+        return postings
+
+    def search(self, query, limit, candidates=None):
+        """The ``limit`` best (pitch_id, score) pairs for ``query``, among the
+        ``candidates`` ids when given.
+        """
+        scores = {}
+        with self.lock:
+            if not self.lengths:
+                return []
+            count = len(self.lengths)
+            average = self.total_length / count
+            for term in set(tokenize(query)):
+                postings = self.term_postings(term)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for pitch_id, frequency in postings:
+                    if candidates is not None and pitch_id not in candidates:
+                        continue
+                    norm = K1 * (1 - B + B * self.lengths[pitch_id] / average)
+                    scores[pitch_id] = scores.get(pitch_id, 0) + idf * (
+                        frequency * (K1 + 1) / (frequency + norm)
+                    )
+        best = heapq.nlargest(
+            limit, scores.items(), key=lambda item: (item[1], -item[0])
+        )
+        return [(pitch_id, round(score, 6)) for pitch_id, score in best]
+
+    def save(self, path):
+        """Write a compacted snapshot: a JSON header with the document lengths
+        and term offsets, then every posting as a (pitch_id, tf) uint32 pair.
+        """
+        with self.lock:
+            merged = {}
+            for term in set(self.terms) | set(self.overlay):
+                merged[term] = sorted(self.term_postings(term))
+            lengths = sorted(self.lengths.items())
+        terms, pairs, offset = {}, [], 0
+        for term in sorted(merged):
+            terms[term] = [offset, len(merged[term])]
+            offset += len(merged[term])
+            for pitch_id, frequency in merged[term]:
+                pairs += [pitch_id, frequency]
+        header = json.dumps(
+            {"lengths": lengths, "terms": terms}, separators=(",", ":")
+        ).encode()
+        # Pad so the postings start on a 4-byte boundary.
+        header += b" " * (-(HEADER.size + len(header)) % 4)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        partial = "%s.%d.tmp" % (path, os.getpid())
+        with open(partial, "wb") as snapshot:
+            snapshot.write(HEADER.pack(MAGIC, len(header)))
+            snapshot.write(header)
+            snapshot.write(struct.pack("<%dI" % len(pairs), *pairs))
+        # Workers that already mapped the old file keep reading it.
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, "rb") as snapshot:
+            mapped = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError("%s is not a pitch search index" % path)
+        header = json.loads(mapped[HEADER.size : HEADER.size + size])
+        index.lengths = dict(map(tuple, header["lengths"]))
+        index.total_length = sum(index.lengths.values())
+        index.terms = header["terms"]
+        index.postings = memoryview(mapped)[HEADER.size + size :].cast("I")
+        index.mapped = mapped
+        return index
+
+    @classmethod
+    def build(cls, batch_size=2000):
+        index = cls()
+        pitches = Pitch.objects.order_by().values_list("pk", "title", "description")
+        for pitch_id, title, description in pitches.iterator(batch_size):
+            index.add(pitch_id, title, description)
+        return index
+
+
+def index_path():
+    return getattr(
+        settings,
+        "PITCH_SEARCH_INDEX",
+        os.path.join(settings.BASE_DIR, "var", "pitch_search.idx"),
+    )
+
+
+def rebuild_search_index():
+    index = TextIndex.build()
+    index.save(index_path())
+    return len(index.lengths)
+
+
+def search_index():
+    """The worker's index, reloaded whenever a newer snapshot is written.
+
+    None until rebuild_search_index has written the first snapshot; building
+    it here would hold up the request and every other search behind it.
+    """
+    global _index, _index_mtime
+    path = index_path()
+    with _index_lock:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if _index is None or mtime != _index_mtime:
+            _index, _index_mtime = TextIndex.load(path), mtime
+        return _index
+
+
+def refresh_pitch_text(pitch, deleted=False):
+    # Only a loaded index is kept current; one loaded later starts from the
+    # snapshot that the rebuild_search_index job keeps fresh.
+    if _index is None:
+        return
+    index, pitch_id = _index, pitch.pk
+    if deleted:
+        transaction.on_commit(lambda: index.remove(pitch_id))
+    else:
+        title, description = pitch.title, pitch.description
+        transaction.on_commit(lambda: index.add(pitch_id, title, description))
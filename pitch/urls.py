@@ -8,6 +8,11 @@ urlpatterns = [
     path("ordered-detail/<int:pk>", views.order_cancel, name="order-detail"),
     path("search/", views.search_view, name="search"),
     path("upload-pitch-data/", views.upload_pitch_data, name="upload_pitch_data"),
+    path(
+        "upload-pitch-data/jobs/<int:pk>/",
+        views.import_job_status,
+        name="import_job_status",
+    ),
     path(
         "pitch/<int:pk>/toggle_favorite/", views.toggle_favorite, name="toggle_favorite"
     ),
@@ -1,10 +1,9 @@
 import re
-import pandas as pd
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, redirect
 from django.utils.translation import gettext
 from django.views import generic
-from account.mail import send_mail_custom
+from account.mail import queue_mail_custom, queue_mass_mail_custom
 from pitch.models import (
     Pitch,
     Order,
@@ -12,20 +11,21 @@ from pitch.models import (
     PitchRating,
     AccessComment,
     Favorite,
-    Image,
+    ImportJob,
+    PitchCard,
 )
-from django.db.models import Count
 from pitch.forms import RentalPitchModelForm, CancelOrderModelForm
 import datetime
 from django.contrib.auth.models import User
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth.decorators import login_required
-from pitch.custom_fnc import convert_timedelta
+from pitch.booking import book_pitch, SlotUnavailable
+from pitch.importer import queue_import, read_pitch_chunks, validate_pitch_chunks
+from pitch.search import filter_pitches, keyset_page
 from django.contrib.auth.mixins import LoginRequiredMixin
-from account.mail import send_mail_custom
+from account.mail import queue_mail_custom
 from django.utils.translation import gettext_lazy as _
 from project1.settings import HOST
-from django.db.models import Q
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
 from .forms import SearchForm, CommentForm
@@ -34,29 +34,19 @@ from django.shortcuts import render
 from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.contrib.admin.views.decorators import staff_member_required
-from django.core.exceptions import ValidationError
 
 
 # Create your views here.
 def index(request):
-    pitches = (
-        Pitch.objects.all()
-        .annotate(num_orders=Count("order", filter=Q(order__status="c")))
-        .order_by("-num_orders")[:3]
-        .prefetch_related("image")
-    )
-    for pitch in pitches:
-        if pitch.image.all().exists():
-            pitch.banner = pitch.image.all()[0].image.url
-        else:
-            pitch.banner = "/media/uploads/default-image.jpg"
-        pitch.surface = pitch.get_label_grass()
-        pitch.size = pitch.get_label_size()
+    # Served from the popularity index; the counters follow the orders.
+    cards = PitchCard.objects.select_related("pitch").order_by(
+        "-popularity", "pitch_id"
+    )[:3]
+    pitches = [card.pitch for card in cards]
     context = {"pitch_list": pitches}
     return render(request, "index.html", context=context)
 
 
-@transaction.atomic
 @login_required
 def pitch_detail(request, pk):
     context = {}
@@ -115,9 +105,10 @@ def pitch_detail(request, pk):
             data.ip = request.META.get("REMOTE_ADDR")
             data.pitch_id = pk
             data.renter = request.user
-            data.save()
-            pitch_rating.create_avg_rating(data.rating)
-            access_comment.counting_left()
+            with transaction.atomic():
+                data.save()
+                pitch_rating.create_avg_rating(data.rating)
+                access_comment.counting_left()
             return HttpResponseRedirect(pitch.get_absolute_url())
         else:
             context["comment_form"] = comment_form
@@ -126,11 +117,12 @@ def pitch_detail(request, pk):
         comment = Comment.objects.get(pitch=pitch, id=comment_id)
         comment_form = CommentForm(request.POST, instance=comment)
         if comment_form.is_valid():
-            pitch_rating.update_avg_rating(
-                comment_form.cleaned_data["rating"] - comment.rating
-            )
-            data = comment_form.save(commit=False)
-            data.save()
+            with transaction.atomic():
+                pitch_rating.update_avg_rating(
+                    comment_form.cleaned_data["rating"] - comment.rating
+                )
+                data = comment_form.save(commit=False)
+                data.save()
             return HttpResponseRedirect(pitch.get_absolute_url())
         else:
             context["edit_comment_form"] = comment_form
@@ -143,41 +135,41 @@ def pitch_detail(request, pk):
             email = request.user.email
             username = request.user.username
 
-            cost = convert_timedelta(time_end - time_start) * (pitch.price)
-            if voucher:
-                cost -= voucher.discount
+            def notify(order):
+                link = HOST + reverse_lazy("order-detail", kwargs={"pk": order.id})
+                queue_mail_custom(
+                    gettext("Notice to order a pitch from Pitch App"),
+                    [email],
+                    None,
+                    "email/notify_order_pitch.html",
+                    link=link,
+                    username=username,
+                    time_start=time_start,
+                    time_end=time_end,
+                    pitch_title=pitch.title,
+                    price=pitch.price,
+                    cost=order.cost,
+                )
 
             try:
-                with transaction.atomic():
-                    order = Order.objects.create(
-                        pitch=pitch,
-                        time_start=time_start,
-                        time_end=time_end,
-                        renter=request.user,
-                        price=pitch.price,
-                        cost=cost,
-                        voucher=voucher,
-                    )
-                    access_comment.counting_created()
-                    link = HOST + reverse_lazy("order-detail", kwargs={"pk": order.id})
-
-                    send_mail_custom(
-                        gettext("Notice to order a pitch from Pitch App"),
-                        [email],
-                        None,
-                        "email/notify_order_pitch.html",
-                        link=link,
-                        username=username,
-                        time_start=time_start,
-                        time_end=time_end,
-                        pitch_title=pitch.title,
-                        price=pitch.price,
-                        cost=cost,
-                    )
-
-                    return HttpResponseRedirect(
-                        reverse_lazy("order-detail", kwargs={"pk": order.id})
-                    )
+                order = book_pitch(
+                    pitch,
+                    request.user,
+                    time_start,
+                    time_end,
+                    voucher=voucher,
+                    on_booked=notify,
+                )
+
+                return HttpResponseRedirect(
+                    reverse_lazy("order-detail", kwargs={"pk": order.id})
+                )
+            except SlotUnavailable:
+                form.add_error(
+                    "time_end",
+                    _("This time someone ordered! Please choose another time."),
+                )
+                context["form"] = form
             except Exception:
                 return HttpResponse(_("Something went wrong, please come back."))
 
@@ -231,7 +223,7 @@ def order_cancel(request, pk):
             try:
                 with transaction.atomic():
                     order.save()
-                    send_mail_custom(
+                    queue_mass_mail_custom(
                         _("Notice of customer order cancellation from Pitch App"),
                         emails,
                         None,
@@ -272,51 +264,36 @@ def search_view(request):
     price = request.GET.get("price")
     size = request.GET.get("size")
     surface = request.GET.get("surface")
-    results = []
     ask = [query, address, price, size, surface]
-    queryFilter = ""
-    if surface:
-        queryFilter += "surface = '%s'" % surface
-    if size:
-        if queryFilter != "":
-            queryFilter += " and "
-        queryFilter += "size = '%s'" % size
-    if price:
-        if queryFilter != "":
-            queryFilter += " and "
-        queryFilter += " price <= %s" % price
-    if address:
-        if queryFilter != "":
-            queryFilter += " and "
-        queryFilter += "address = '%s'" % address
-    if query:
-        if queryFilter != "":
-            queryFilter += " and "
-        queryFilter += "MATCH(title,description) AGAINST('%s') > 0.01 " % query
-
-    if len(queryFilter) > 0:
-        queryFilter = "SELECT * FROM pitches WHERE " + queryFilter
+    if form.is_valid():
+        data = form.cleaned_data
     else:
-        queryFilter = "SELECT * FROM pitches "
-
-    results = Pitch.objects.raw(queryFilter).prefetch_related("image")
-
-    for pitch in results:
-        if pitch.image.all().exists():
-            pitch.banner = pitch.image.all()[0].image.url
-        else:
-            pitch.banner = "/media/uploads/default-image.jpg"
-        pitch.surface = pitch.get_label_grass()
-        pitch.size = pitch.get_label_size()
-    paginator = Paginator(results, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+        # Search by the fields that are valid, but never by half a window.
+        data = {
+            name: value
+            for name, value in form.cleaned_data.items()
+            if name not in ("time_start", "time_end")
+        }
+    results = filter_pitches(data).select_related("card")
+    page_obj = keyset_page(results, request.GET.get("cursor"), 10)
+
+    # The page links keep the filters and only swap the cursor.
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    links = {}
+    for name, cursor in (
+        ("previous", page_obj.previous_cursor),
+        ("next", page_obj.next_cursor),
+    ):
+        if cursor:
+            params["cursor"] = cursor
+            links[name] = "?" + params.urlencode()
 
     context = {
         "query": ask,
         "form": form,
         "page_obj": page_obj,
-        "is_paginated": True,
+        "page_links": links,
     }
 
     return render(request, "pitch/pitch_search.html", context)
@@ -326,108 +303,58 @@ def search_view(request):
 def upload_pitch_data(request):
     if request.method == "POST":
         excel_file = request.FILES["excel_file"]
-        if excel_file.name.endswith(".xlsx"):
-            try:
-                df_pitch_data = pd.read_excel(excel_file, sheet_name="PitchData")
-            except Exception as e:
-                messages.error(request, f"Error reading sheets: {str(e)}")
-                return HttpResponseRedirect(request.path_info)
-
-            success_count_data = 0
-            failure_count_data = 0
-            success_count_images = 0
-            failure_count_images = 0
-            error_details_data = []
-            error_details_images = []
-            for index, row in df_pitch_data.iterrows():
-                try:
-                    required_fields = ["title", "address", "size", "surface", "price"]
-                    missing_fields = [
-                        field
-                        for field in required_fields
-                        if pd.isnull(row[field]) or row[field] == ""
-                    ]
-                    if missing_fields:
-                        failure_count_data += 1
-                        error_details_data.append(
-                            f"Error at row {index + 2}: Required fields cannot be empty: {', '.join(missing_fields)}"
-                        )
-                    else:
-                        pitch = Pitch(
-                            title=row["title"],
-                            description=row["description"],
-                            price=row["price"],
-                            address=row["address"],
-                            phone=row["phone"],
-                            size=row["size"],
-                            surface=row["surface"],
-                        )
-                        try:
-                            pitch.full_clean()
-                            pitch.save()
-                            for i in range(1, 4):
-                                image_url = row[f"image{i}"]
-                                if image_url and isinstance(image_url, str):
-                                    try:
-                                        image = Image(image=image_url, pitch=pitch)
-                                        image.full_clean()
-                                        image.save()
-                                        success_count_images += 1
-                                    except ValidationError as e:
-                                        failure_count_images += 1
-                                        field_errors = []
-                                        for field, errors in e.message_dict.items():
-                                            field_errors.append(
-                                                f"{field.capitalize()}: {', '.join(errors)}"
-                                            )
-                                        error_details_images.append(
-                                            f"Error at row {index + 2}, image{i}: {'; '.join(field_errors)}"
-                                        )
-                            success_count_data += 1
-                        except ValidationError as e:
-                            failure_count_data += 1
-                            field_errors = []
-                            for field, errors in e.message_dict.items():
-                                field_errors.append(
-                                    f"{field.capitalize()}: {', '.join(errors)}"
-                                )
-
-                            error_details_data.append(
-                                f"Error at row {index + 2}: {'; '.join(field_errors)}"
-                            )
-                except Exception as e:
-                    failure_count_data += 1
-                    error_details_data.append(f"Error at row {index + 2}: {str(e)}")
-
-            if failure_count_data > 0:
-                for error_detail in error_details_data:
-                    messages.error(request, f"PitchData import: {error_detail}")
-
-            if failure_count_images > 0:
-                for error_detail in error_details_images:
-                    messages.error(request, f"PitchImages import: {error_detail}")
-
-            messages.success(
-                request,
-                f"PitchData import successful: {success_count_data} records added.",
-            )
-            messages.success(
-                request,
-                f"PitchImages import successful: {success_count_images} records added.",
-            )
-            messages.error(
-                request, f"Import failed (PitchData): {failure_count_data} records."
-            )
-            messages.error(
-                request, f"Import failed (PitchImages): {failure_count_images} records."
-            )
-
-            return HttpResponseRedirect(request.path_info)
+        if excel_file.name.lower().endswith((".xlsx", ".csv")):
+            if request.POST.get("dry_run"):
+                # Validated in this process: a pool per request would fork
+                # workers off the web server. import_pitches keeps the pool.
+                report = validate_pitch_chunks(read_pitch_chunks(excel_file), workers=1)
+                return render(
+                    request,
+                    "admin/upload_pitch_data.html",
+                    {"report": report, "file_name": excel_file.name},
+                )
+            mode = "u" if request.POST.get("upsert") else "i"
+            job, created = queue_import(excel_file, request.user, mode)
+            if created:
+                messages.success(request, f"Import job #{job.pk} has been queued.")
+            else:
+                messages.info(request, f"This file is already import job #{job.pk}.")
+            return HttpResponseRedirect(f"{request.path_info}?job={job.pk}")
         else:
-            messages.error(request, "Please upload a valid Excel file.")
+            messages.error(request, "Please upload a valid Excel or CSV file.")
             return HttpResponseRedirect(request.path_info)
 
-    return render(request, "admin/upload_pitch_data.html")
+    job = None
+    if request.GET.get("job", "").isdigit():
+        job = ImportJob.objects.filter(pk=request.GET["job"]).first()
+    return render(request, "admin/upload_pitch_data.html", {"job": job})
+
+
+@staff_member_required
+def import_job_status(request, pk):
+    try:
+        job = ImportJob.objects.get(pk=pk)
+    except ImportJob.DoesNotExist:
+        raise Http404(gettext("Import job not found."))
+    return JsonResponse(
+        {
+            "id": job.pk,
+            "status": job.status,
+            "mode": job.mode,
+            "status_display": job.get_status_display(),
+            "percent": job.percent,
+            "total_rows": job.total_rows,
+            "next_row": job.next_row,
+            "pitches": job.pitches,
+            "images": job.images,
+            "failed_pitches": job.failed_pitches,
+            "failed_images": job.failed_images,
+            "updated_pitches": job.updated_pitches,
+            "unchanged_pitches": job.unchanged_pitches,
+            "removed_images": job.removed_images,
+            "errors": job.errors,
+        }
+    )
 
 
 @login_required
@@ -447,17 +374,8 @@ def toggle_favorite(request, pk):
 
 def favorite_pitches(request):
     favorite_pitches = Favorite.objects.filter(renter=request.user).select_related(
-        "pitch"
+        "pitch__card"
     )
-
-    for favorite in favorite_pitches:
-        pitch = favorite.pitch
-        if pitch.image.all().exists():
-            pitch.banner = pitch.image.all()[0].image.url
-        else:
-            pitch.banner = "/media/uploads/default-image.jpg"
-        pitch.surface = pitch.get_label_grass()
-        pitch.size = pitch.get_label_size()
     paginator = Paginator(favorite_pitches, 10)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
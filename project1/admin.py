@@ -1,14 +1,15 @@
-from datetime import date
 from django.shortcuts import render
 from django.urls import path
 from django.contrib import admin
 from pitch.custom_fnc import (
     create_day_of_month,
     create_empty_day_of_month,
+    last_month_range,
     query_statistic,
 )
 from django.core.paginator import Paginator
-from pitch.models import Order, Pitch
+from pitch.models import Pitch
+from pitch.revenue import daily_revenue
 from project1.settings import HOST
 
 
@@ -16,7 +17,7 @@ class MyAdminSite(admin.AdminSite):
     def statistic(self, request):
         "Monthly revenue including Course information, Total amount, Number of pitch bookings"
 
-        last_month = date.today().month - 1
+        last_month = last_month_range()[0].month
         pitches = query_statistic()
         paginator = Paginator(pitches, 10)
         page_number = request.GET.get("page")
@@ -35,19 +36,10 @@ class MyAdminSite(admin.AdminSite):
 
     def statistics_pitch(self, request, pk):
         pitch = Pitch.objects.get(pk=pk)
-        last_month = date.today().month - 1
-        year = date.today().year
-        orders = Order.objects.raw(
-            """SELECT 1 as id, day(time_start) as date, sum(cost) as revenue from orders 
-                where pitch_id = %d and 
-                      month(time_start) = %d and 
-                      year(time_start) = %d 
-                group by date"""
-            % (pk, last_month, year)
-        )
+        first_day, last_day = last_month_range()
         data = create_empty_day_of_month()
-        for order in orders:
-            data[order.date - 1] = int(order.revenue)
+        for day, revenue in daily_revenue(pk, first_day, last_day).items():
+            data[day.day - 1] = int(revenue)
 
         context = dict(
             **self.each_context(request),
@@ -56,7 +48,7 @@ class MyAdminSite(admin.AdminSite):
             labels=create_day_of_month(),
             data=data,
             pitch=pitch,
-            last_month=last_month,
+            last_month=first_day.month,
         )
 
         return render(request, "admin/statistic_pitch.html", context=context)
@@ -187,7 +187,15 @@ EMAIL_HOST_PASSWORD = os.getenv("PASS")
 DEFAULT_FROM_EMAIL = os.getenv("MAIL")
 EMAIL_FILE_PATH = "/tmp/app-messages"
 
-CRONJOBS = [("*/1 * * * *", "pitch.cron.mail_schedule_job")]
+CRONJOBS = [
+    ("*/1 * * * *", "pitch.cron.mail_schedule_job"),
+    ("*/1 * * * *", "django.core.management.call_command", ["dispatch_mail"]),
+    ("*/1 * * * *", "django.core.management.call_command", ["run_export_jobs"]),
+    ("*/1 * * * *", "django.core.management.call_command", ["run_import_jobs"]),
+    ("0 * * * *", "django.core.management.call_command", ["reconcile_popularity"]),
+    ("*/5 * * * *", "django.core.management.call_command", ["rebuild_search_index"]),
+    ("30 * * * *", "django.core.management.call_command", ["geocode_pitches"]),
+]
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 